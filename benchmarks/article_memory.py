@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# Memory of a realistic pool of articles: the arXiv and APS fixtures are parsed repeatedly
+# (with distinct urls) until the pool has the requested size, the retained memory is measured
+# with tracemalloc before and after sanitizing all fields.
+# run with python benchmarks/article_memory.py [size] from project dir
+import gc
+import sys
+import tracemalloc
+import feedparser as fp
+from pathlib import Path
+from journalfeed.Article import Article
+from journalfeed.aps import pr_summary_extract
+from journalfeed.helpers import parsed_datetime
+
+fixtures = Path(__file__).parent / "fixtures"
+
+
+def entries():
+    """The fields of the articles in the fixtures, parsed once"""
+    ret = []
+    for name in ["arxiv_0.atom", "arxiv_100.atom"]:
+        for e in fp.parse((fixtures / name).read_bytes()).entries:
+            ret.append((e.title, e.link, parsed_datetime(e.published_parsed),
+                        [a["name"] for a in e.authors], e.summary, "arXiv"))
+    for journal in ["prl", "prb"]:
+        for e in fp.parse((fixtures / "aps_{}.xml".format(journal)).read_bytes()).entries:
+            ret.append((e.title, e.link, parsed_datetime(e.updated_parsed),
+                        e.author.replace(" and ", ", ").split(", "), pr_summary_extract(e.summary), journal))
+    return ret
+
+
+def pool(fields, size):
+    """Create size articles, the strings are copied like they are when every article is parsed from a feed"""
+    articles = []
+    while len(articles) < size:
+        for title, url, date, authors, summary, journal in fields:
+            if len(articles) == size:
+                break
+            i = str(len(articles))
+            articles.append(Article((title+i)[:-len(i)], url+"#"+i, date.replace(), [(a+i)[:-len(i)] for a in authors],
+                                    (summary+i)[:-len(i)], (journal+i)[:-len(i)]))
+    return articles
+
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    fields = entries()
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    articles = pool(fields, size)
+    gc.collect()
+    raw = tracemalloc.get_traced_memory()[0] - before
+    for a in articles:
+        a.title, a.authors, a.summary, a.journal
+    gc.collect()
+    sanitized = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    print("articles:              {:8d}".format(len(articles)))
+    print("raw pool [bytes/article]:       {:8.0f}".format(raw / len(articles)))
+    print("sanitized pool [bytes/article]: {:8.0f}".format(sanitized / len(articles)))
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+# Compare the streaming feed parser (feeds.parse) with feedparser on a 100 entry arXiv page
+# and the full APS and Science feeds of the fixtures (see make_fixtures.py).
+# run with python benchmarks/feed_parse.py from project dir
+import time
+import tracemalloc
+from pathlib import Path
+import feedparser as fp
+from journalfeed import feeds
+
+fixtures = Path(__file__).parent / "fixtures"
+
+
+def measure(func, content, repeat=10):
+    tracemalloc.start()
+    func(content)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func(content)
+    return (time.perf_counter() - start) / repeat, peak, result
+
+
+if __name__ == "__main__":
+    print("{:20s} {:>7s} {:>21s} {:>21s}".format("feed", "entries", "time [ms]", "peak [KiB]"))
+    for name in ["arxiv_0.atom", "aps_prl.xml", "science_science.xml"]:
+        content = (fixtures / name).read_bytes()
+        fp_time, fp_peak, expected = measure(lambda c: fp.parse(c), content)
+        new_time, new_peak, parsed = measure(lambda c: feeds.parse(c), content)
+        assert [e.title for e in parsed.entries] == [e.title for e in expected.entries]
+        print("{:20s} {:7d} {:10.2f} {:10.2f} {:10.0f} {:10.0f}".format(name, len(parsed.entries), 1e3*fp_time,
+                                                                       1e3*new_time, fp_peak/1024, new_peak/1024))
+    print("(feedparser, feeds.parse)")
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# Write the feed fixtures of the benchmarks (benchmarks/fixtures), they follow the structure of the real
+# arXiv (Atom), APS and Science (RSS) feeds and doi.org (citeproc json) responses.
+# The titles and abstracts are taken from the elc reference corpus, such that they contain realistic math.
+# run with python benchmarks/make_fixtures.py from project dir, the output is deterministic
+import datetime
+import json
+import random
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+root = Path(__file__).parent
+corpus = [c["input"] for c in json.loads((root.parent / "tests" / "fixtures" / "elc_corpus.json").read_text())]
+names = ["Alice Smith", "Bob Jones", "Carol Müller-Lee", "D. Nguyen", "Emma O'Brien", "Fang Li", "Gábor Kovács",
+         "Hiro Tanaka", "Ines García", "Jan de Vries", "Karin Åström", "Luca Rossi", "Mira Patel", "Nils Berg"]
+enddate = datetime.date(2024, 1, 15)
+
+
+def title(rng):
+    return rng.choice(corpus).split(". ")[0][:160]
+
+
+def summary(rng):
+    return " ".join(rng.sample(corpus, 4))
+
+
+def authors(rng, n=None):
+    return rng.sample(names, n or rng.randint(1, 8))
+
+
+def date(rng, days=7):
+    return enddate - datetime.timedelta(days=rng.randint(0, days))
+
+
+def arxiv_page(rng, start, total, page_size=100):
+    entries = []
+    dates = sorted((date(rng) for _ in range(page_size)), reverse=True)
+    for i, d in enumerate(dates):
+        arxiv_id = "2401.{:05d}".format(start+i)
+        entries.append("""  <entry>
+    <id>http://arxiv.org/abs/{id}v1</id>
+    <updated>{d}T18:00:00Z</updated>
+    <published>{d}T18:00:00Z</published>
+    <title>{title}</title>
+    <summary>{summary}</summary>
+{authors}
+    <link href="http://arxiv.org/abs/{id}v1" rel="alternate" type="text/html"/>
+    <link title="pdf" href="http://arxiv.org/pdf/{id}v1" rel="related" type="application/pdf"/>
+    <arxiv:primary_category xmlns:arxiv="http://arxiv.org/schemas/atom" term="cond-mat.str-el" scheme="http://arxiv.org/schemas/atom"/>
+    <category term="cond-mat.str-el" scheme="http://arxiv.org/schemas/atom"/>
+  </entry>""".format(id=arxiv_id, d=d.isoformat(), title=escape(title(rng)), summary=escape(summary(rng)),
+                     authors="\n".join("    <author>\n      <name>{}</name>\n    </author>".format(escape(a))
+                                       for a in authors(rng))))
+    return """<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom">
+  <link href="http://arxiv.org/api/query" rel="self" type="application/atom+xml"/>
+  <title type="html">ArXiv Query: search_query=cat:cond-mat*</title>
+  <id>http://arxiv.org/api/benchmark</id>
+  <updated>{d}T00:00:00-05:00</updated>
+  <opensearch:totalResults xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/">{total}</opensearch:totalResults>
+  <opensearch:startIndex xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/">{start}</opensearch:startIndex>
+  <opensearch:itemsPerPage xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/">{page_size}</opensearch:itemsPerPage>
+{entries}
+</feed>
+""".format(d=enddate.isoformat(), total=total, start=start, page_size=page_size, entries="\n".join(entries))
+
+
+def aps_feed(rng, journal, n=40):
+    items = []
+    for i in range(n):
+        a = authors(rng)
+        creator = a[0] if len(a) == 1 else ", ".join(a[:-1])+" and "+a[-1]
+        url = "http://link.aps.org/doi/10.1103/{}.{}.{:06d}".format(journal, 132, rng.randint(0, 999999))
+        items.append("""<item rdf:about="{url}">
+<title>{title}</title>
+<link>{url}</link>
+<description>&lt;p&gt;{summary}&lt;/p&gt;&lt;p&gt;[Phys. Rev. 132, 0 (2024)] Published {d}&lt;/p&gt;</description>
+<dc:creator>{creator}</dc:creator>
+<dc:date>{d}T10:00:00-05:00</dc:date>
+<dc:title>{title}</dc:title>
+</item>""".format(url=url, title=escape(title(rng)), summary=escape(escape(summary(rng))),
+                  creator=escape(creator), d=date(rng).isoformat()))
+    return """<?xml version="1.0" encoding="UTF-8"?>
+<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#" xmlns="http://purl.org/rss/1.0/" xmlns:dc="http://purl.org/dc/elements/1.1/">
+<channel rdf:about="http://feeds.aps.org/rss/recent/{journal}.xml">
+<title>Recent Articles in {journal}</title>
+<link>http://journals.aps.org/{journal}/</link>
+<description>Recent articles</description>
+</channel>
+{items}
+</rdf:RDF>
+""".format(journal=journal, items="\n".join(items))
+
+
+def science_feed(rng, journal, publication, dois, n=30):
+    items = []
+    for i in range(n):
+        doi = "10.1126/{}.adk{:04d}".format(journal, rng.randint(0, 9999))
+        kind = rng.choice(["Research Article", "Research Article", "Review", "Perspective", "Editorial"])
+        if kind in ["Research Article", "Review"]:
+            dois.append(doi)
+        items.append("""<item rdf:about="https://www.science.org/doi/abs/{doi}?af=R">
+<title>{title}</title>
+<link>https://www.science.org/doi/abs/{doi}?af=R</link>
+<description>{publication}, Volume 383, Issue 6679, January 2024. &lt;br/&gt;</description>
+{creators}
+<dc:date>{d}T08:00:00Z</dc:date>
+<dc:identifier>doi:{doi}</dc:identifier>
+<dc:type>{kind}</dc:type>
+<prism:doi>{doi}</prism:doi>
+<prism:publicationName>{publication}</prism:publicationName>
+<prism:url>https://www.science.org/doi/abs/{doi}?af=R</prism:url>
+</item>""".format(doi=doi, title=escape(title(rng)), publication=publication, kind=kind, d=date(rng).isoformat(),
+                  creators="\n".join("<dc:creator>{}</dc:creator>".format(escape(a)) for a in authors(rng))))
+    return """<?xml version="1.0" encoding="UTF-8"?>
+<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#" xmlns="http://purl.org/rss/1.0/" xmlns:dc="http://purl.org/dc/elements/1.1/" xmlns:prism="http://prismstandard.org/namespaces/basic/2.0/">
+<channel rdf:about="https://www.science.org/action/showFeed?type=etoc&amp;feed=rss&amp;jc={journal}">
+<title>{publication}: Table of Contents</title>
+<link>https://www.science.org/journal/{journal}</link>
+<description>The table of contents</description>
+</channel>
+{items}
+</rdf:RDF>
+""".format(journal=journal, publication=publication, items="\n".join(items))
+
+
+def citeproc(rng, doi):
+    return {"DOI": doi, "type": "journal-article", "title": title(rng), "publisher": "American Association for the Advancement of Science (AAAS)",
+            "author": [{"given": a.split()[0], "family": a.split()[-1]} for a in authors(rng)],
+            "abstract": "<jats:p>"+escape(summary(rng))+"</jats:p>"}
+
+
+if __name__ == "__main__":
+    rng = random.Random(0)
+    fixtures = root / "fixtures"
+    fixtures.mkdir(exist_ok=True)
+    for start in [0, 100]:
+        (fixtures / "arxiv_{}.atom".format(start)).write_text(arxiv_page(rng, start, 200))
+    for journal in ["prl", "prb"]:
+        (fixtures / "aps_{}.xml".format(journal)).write_text(aps_feed(rng, journal))
+    dois = []
+    for journal, publication in [("science", "Science"), ("sciadv", "Science Advances")]:
+        (fixtures / "science_{}.xml".format(journal)).write_text(science_feed(rng, journal, publication, dois))
+    (fixtures / "doi_citeproc.json").write_text(json.dumps({doi: citeproc(rng, doi) for doi in dois}, indent=1))
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# Compare the linear math scanner (find_all_math, curly_brace_balance) with the previous backtracking regex
+# on worst-case abstracts: unclosed \[ and \( (the regex scans the rest of the string for every character),
+# many unclosed environments and long brace-heavy math.
+# run with python benchmarks/math_scan.py [length] from project dir
+import re
+import sys
+import time
+from journalfeed.LaTeX import find_all_math, curly_brace_balance, elc
+
+legacy_matchers = ["(\\\\begin\\{(?P<env>equation|align)\\*?\\})(.+?)(\\\\end\\{(?P=env)\\*?\\})",
+                   "(\\\\\\[)((?:.(?!\\\\\\]))*.)(\\\\\\])", "(\\\\\\()((?:.(?!\\\\\\)))*.)(\\\\\\))",
+                   "(\\$\\$)([^\\$]+)(\\$\\$)", "(\\$)([^\\$]+)(\\$)"]
+legacy_regex = re.compile("("+"|".join(legacy_matchers)+")", flags=re.DOTALL)
+
+
+def legacy_find_all_math(s):
+    math_matches = legacy_regex.findall(s)
+    math_matches = [[j for j in i if j != ""] for i in math_matches]
+    for i in math_matches:
+        if len(i) == 5:
+            del i[2]
+    return math_matches
+
+
+def legacy_curly_brace_balance(expression):
+    if len(re.findall("\\\\\\{", expression)) != len(re.findall("\\\\\\}", expression)):
+        return False
+    opened = 0
+    for c in expression:
+        if c == '{':
+            opened += 1
+        elif c == '}':
+            if opened > 0:
+                opened -= 1
+            else:
+                return False
+    return opened == 0
+
+
+def inputs(n):
+    """Abstracts of about n characters"""
+    return {
+        "unclosed \\[": "\\[ x = " + "a b " * (n // 4),
+        "unclosed \\(": "We find \\(" + "E = mc^2, " * (n // 10),
+        "many \\[": "\\[ a " * (n // 5),
+        "many \\begin": "\\begin{equation} x " * (n // 19),
+        "many $": "$a$ costs \\$5, " * (n // 15),
+        "braces": "$" + "{x_{1}^{2}}" * (n // 11) + "$",
+    }
+
+
+def measure(func, s, repeat=3):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func(s)
+    return (time.perf_counter() - start) / repeat, result
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    print("{:14s} {:>12s} {:>12s} {:>12s} {:>12s}".format("input", "regex [ms]", "scanner [ms]",
+                                                         "braces [ms]", "elc [ms]"))
+    for name, s in inputs(n).items():
+        legacy_time, legacy = measure(legacy_find_all_math, s)
+        new_time, new = measure(find_all_math, s)
+        assert legacy == new
+        legacy_braces_time, legacy_balanced = measure(legacy_curly_brace_balance, s)
+        braces_time, balanced = measure(curly_brace_balance, s)
+        assert legacy_balanced == balanced
+        elc_time, _ = measure(elc, s, repeat=1)
+        print("{:14s} {:12.1f} {:12.1f} {:5.1f} {:6.1f} {:12.1f}".format(name, 1e3*legacy_time, 1e3*new_time,
+                                                                      1e3*legacy_braces_time, 1e3*braces_time, 1e3*elc_time))
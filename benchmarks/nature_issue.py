@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# Compare the single pass nature issue parser with the previous BeautifulSoup tree walk.
+# run with python benchmarks/nature_issue.py from project dir
+import time
+import tracemalloc
+from pathlib import Path
+import bs4
+import dateutil.parser
+from journalfeed.helpers import check_words
+from journalfeed.nature import parse_issue, url_base
+
+fixture = Path(__file__).parent.parent / "tests" / "fixtures" / "nature_current_issue.html"
+
+
+def legacy_parse(content, journal):
+    """The extraction of nature.get_articles before the IssueParser (without Article construction)"""
+    articles = []
+    soup = bs4.BeautifulSoup(content, "html.parser")
+    section_tags = soup.find_all('section', {'data-container-type': check_words('issue-section-list')})
+    for sec in section_tags:
+        sec_title = sec.find('h2')
+        if isinstance(sec_title, bs4.element.Tag) and sec_title.contents[0] == "Research":
+            subsecs = soup.find('ul', {'class': check_words('app-article-list-row')}).find_all("li", recursive=False)
+            for subsec in subsecs:
+                subsec_title = subsec.find('h3', {'class': check_words('c-section-heading')})
+                if isinstance(subsec_title, bs4.element.Tag) and any(s in subsec_title.contents[0]
+                                                                   for s in ["Research", "Articles", "Letters", "Reviews"]):
+                    for article in sec.find_all('article'):
+                        try:
+                            url = url_base+article.find('a', {'itemprop': check_words('url')})['href']
+                        except TypeError:
+                            continue
+                        title = article.find('h3', {'itemprop': check_words('name headline')}).text.strip()
+                        date = dateutil.parser.parse( article.find('time', {'itemprop': check_words('datePublished')}).text.strip() ).date()
+                        authors = article.find_all('li', {'itemprop': check_words('creator')})
+                        authors = [a.text.replace(",", "").replace("&\xa0", "").strip() for a in authors]
+                        try:
+                            abstract = article.find('div', attrs={'itemprop': check_words('description')}).find("p").text.strip()
+                        except AttributeError:
+                            abstract = "No Abstract found"
+                        articles.append((title.replace("\n", ""), url, date, authors, abstract))
+    return articles
+
+
+def measure(func, content, repeat=20):
+    tracemalloc.start()
+    func(content)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func(content)
+    return (time.perf_counter() - start) / repeat, peak, result
+
+
+if __name__ == "__main__":
+    content = fixture.read_bytes()
+    legacy_time, legacy_peak, legacy = measure(lambda c: legacy_parse(c, "nature"), content)
+    new_time, new_peak, new = measure(lambda c: parse_issue(c, "nature", ensure_latex=False), content)
+    new = [(a.raw_title, a.url, a.date, list(a.raw_authors), a.raw_summary) for a in new]
+    # the old parser adds the articles once per matching subsection
+    assert [a for i, a in enumerate(legacy) if a not in legacy[:i]] == new
+    print(f"articles:    {len(legacy):5d} {len(new):5d} (legacy, single pass)")
+    print(f"time [ms]:   {1e3*legacy_time:5.1f} {1e3*new_time:5.1f}")
+    print(f"peak [KiB]:  {legacy_peak/1024:5.0f} {new_peak/1024:5.0f}")
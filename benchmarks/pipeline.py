@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# Offline benchmark of the parse -> sanitize -> filter -> render pipeline on the feed fixtures
+# (benchmarks/fixtures, see make_fixtures.py, and the nature issue of tests/fixtures).
+# Reports the articles per second and the peak memory of every stage and compares them with the
+# stored baseline (benchmarks/baseline.json), a stage that got slower or needs more memory than
+# the tolerance allows is marked as regression.
+# run with python benchmarks/pipeline.py [--save] [--check] from project dir
+import argparse
+import atexit
+import datetime
+import gc
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+root = Path(__file__).parent
+fixtures = root / "fixtures"
+baseline_file = root / "baseline.json"
+
+# isolate the benchmark from the cache, the abstracts and the config of the user
+_tmp = tempfile.mkdtemp(prefix="journalfeed-bench-")
+atexit.register(shutil.rmtree, _tmp, ignore_errors=True)
+for var in ["XDG_CACHE_HOME", "XDG_DATA_HOME", "XDG_CONFIG_HOME"]:
+    os.environ[var] = os.path.join(_tmp, var.lower())
+os.environ["JOURNALFEED_OFFLINE"] = "1"
+
+from journalfeed import arxiv, aps, nature, science, doi, cache
+from journalfeed.config import load_filter
+from journalfeed.Article import sanitize_articles
+from journalfeed.LaTeX import curly_brace_balance, sanitizer
+
+enddate = datetime.date(2024, 1, 15)
+startdate = enddate - datetime.timedelta(days=7)
+arxiv_startdate = enddate - datetime.timedelta(days=8)
+
+
+class FixtureResponse:
+    """The part of a requests response used by doi.fetch_abstract"""
+    def __init__(self, data):
+        self.data = data
+        self.content = json.dumps(data).encode()
+        self.status_code = 200
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.data
+
+
+class FixtureSession:
+    """Serve the recorded citeproc json in place of doi.org"""
+    def __init__(self, records):
+        self.records = records
+
+    def get(self, url, headers=None):
+        return FixtureResponse(self.records[url.split("doi.org/", 1)[1]])
+
+
+def fill_cache():
+    """Store the fixtures under the urls the sources request, returns the citeproc records"""
+    store = cache.default_cache
+    def put(url, path):
+        store._store(url, {}, {"url": url, "etag": None, "last_modified": None, "stored": time.time()},
+                     path.read_bytes())
+    for start in [0, 100]:
+        put(arxiv.query_url(start, enddate, arxiv_startdate, "cat:cond-mat*+OR+cat:quant-ph", ""),
+            fixtures / "arxiv_{}.atom".format(start))
+    for journal in ["prl", "prb"]:
+        put("http://feeds.aps.org/rss/recent/"+journal+".xml", fixtures / "aps_{}.xml".format(journal))
+    for journal in ["science", "sciadv"]:
+        put("https://www.science.org/action/showFeed?type=etoc&feed=rss&jc="+journal,
+            fixtures / "science_{}.xml".format(journal))
+    put(nature.url_base+"/nature/current-issue", root.parent / "tests" / "fixtures" / "nature_current_issue.html")
+    return json.loads((fixtures / "doi_citeproc.json").read_text())
+
+
+def resolve_dois(records):
+    session = FixtureSession(records)
+    return {d: doi.fetch_abstract(d, session) for d in records}
+
+
+def parse_all():
+    articles = []
+    articles += arxiv.get_articles(enddate=enddate, startdate=arxiv_startdate)
+    articles += aps.get_articles(enddate=enddate, startdate=startdate, journals=["prl", "prb"])
+    articles += nature.get_articles(enddate=enddate, startdate=startdate, journals=["nature"])
+    articles += science.get_articles(enddate=enddate, startdate=startdate, journals=["science", "sciadv"])
+    return articles
+
+
+def sanitize(articles):
+    for a in articles:
+        a.title, a.authors, a.summary, a.journal
+
+
+def balance(articles):
+    for a in articles:
+        curly_brace_balance(a.title)
+        curly_brace_balance(a.summary)
+
+
+def match(articles, _filter):
+    return [_filter.match(a) for a in articles]
+
+
+def legacy_match(articles, _filter):
+    return [a.match(_filter.journals, _filter.authors, _filter.title.res, _filter.summary.res) for a in articles]
+
+
+def render(articles):
+    return [a.latex(show_journal=True, reason="benchmark") for a in articles]
+
+
+def reset(articles):
+    """Forget the sanitized fields (and the math cache), such that sanitize starts cold"""
+    for a in articles:
+        a._title = a._authors = a._summary = a._journal = None
+    sanitizer().math_cache.clear()
+
+
+def measure(func, count, setup=None, repeat=5):
+    """Best time of repeat runs of func() and the peak memory of one run, returns articles/s and peak KiB"""
+    times = []
+    for i in range(repeat + 1):
+        if setup is not None:
+            setup()
+        gc.collect()
+        if i == 0:
+            # the first run only measures the memory, tracing slows everything down
+            tracemalloc.start()
+            func()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            continue
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return {"articles_per_s": round(count / min(times), 1), "peak_kib": round(peak / 1024, 1)}
+
+
+def run(repeat=5):
+    records = fill_cache()
+    abstracts = resolve_dois(records)
+    doi.default_store.abstracts = {d: a for d, a in abstracts.items() if a is not None}
+    _filter = load_filter()
+
+    articles = parse_all()
+    n = len(articles)
+    results = {}
+    results["doi"] = measure(lambda: resolve_dois(records), len(records), repeat=repeat)
+    results["parse"] = measure(parse_all, n, repeat=repeat)
+    results["sanitize"] = measure(lambda: sanitize(articles), n, setup=lambda: reset(articles), repeat=repeat)
+    results["sanitize_batch"] = measure(lambda: sanitize_articles(articles, min_batch=0), n,
+                                        setup=lambda: reset(articles), repeat=repeat)
+    sanitize(articles)
+    results["balance"] = measure(lambda: balance(articles), n, repeat=repeat)
+    results["filter"] = measure(lambda: match(articles, _filter), n, repeat=repeat)
+    results["legacy_filter"] = measure(lambda: legacy_match(articles, _filter), n, repeat=repeat)
+    results["render"] = measure(lambda: render(articles), n, repeat=repeat)
+    return n, results
+
+
+def compare(results, baseline, tolerance):
+    """Print the results next to the baseline, returns the names of the regressed stages"""
+    regressions = []
+    print("{:14s} {:>12s} {:>12s} {:>10s} {:>10s}".format("stage", "articles/s", "baseline", "peak KiB", "baseline"))
+    for stage, r in results.items():
+        b = baseline.get(stage)
+        flag = ""
+        if b is not None and (r["articles_per_s"] < b["articles_per_s"] * (1 - tolerance)
+                              or r["peak_kib"] > b["peak_kib"] * (1 + tolerance)):
+            flag = "  REGRESSION"
+            regressions.append(stage)
+        print("{:14s} {:12.1f} {:>12s} {:10.1f} {:>10s}{}".format(
+            stage, r["articles_per_s"], "-" if b is None else "{:.1f}".format(b["articles_per_s"]),
+            r["peak_kib"], "-" if b is None else "{:.1f}".format(b["peak_kib"]), flag))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmark of the journalfeed pipeline.")
+    parser.add_argument("--save", action="store_true", help="store the results as new baseline")
+    parser.add_argument("--check", action="store_true", help="exit with status 1 if a stage regressed")
+    parser.add_argument("--tolerance", type=float, default=0.3,
+                        help="allowed relative loss of throughput or gain of memory (default 0.3)")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    n, results = run(repeat=args.repeat)
+    try:
+        baseline = json.loads(baseline_file.read_text())
+    except (OSError, ValueError):
+        baseline = {"stages": {}}
+    print("{} articles, baseline from {} ({})".format(n, baseline.get("date", "-"), baseline.get("machine", "-")))
+    regressions = compare(results, baseline["stages"], args.tolerance)
+    if args.save:
+        baseline_file.write_text(json.dumps({"date": datetime.date.today().isoformat(),
+                                             "machine": platform.platform(),
+                                             "python": platform.python_version(),
+                                             "articles": n,
+                                             "stages": results}, indent=1)+"\n")
+    if args.check and regressions:
+        sys.exit(1)
@@ -15,25 +15,106 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from .LaTeX import elc
+from .LaTeX import elc, elc_batch, escape
+from .Filter import Filter
+from . import metrics
+import datetime
 import re
+import sys
+import time
+
+# the same date object is shared by all articles published on that date
+_dates = {}
 
 class Article:
     """
     Container for an article (title, url, date, authors, summary, journal)
+    The raw strings are kept and the latex compatible title, authors, summary and journal
+    are only created (using elc) when they are first used.
+    To keep large pools small the attributes are slotted, the authors are tuples,
+    and the journal names and dates are shared between the articles.
     """
-    def __init__(self, title, url, date, authors, summary, journal, ensure_latex=True):
-        def _elc(s):
-            if ensure_latex:
-                return elc(s)
-            else:
-                return s
-        self.title = _elc(title)
+    __slots__ = ("raw_title", "url", "doi", "date", "raw_authors", "raw_summary", "raw_journal", "ensure_latex",
+                 "_title", "_authors", "_summary", "_journal", "duplicate_of", "related")
+
+    def __init__(self, title, url, date, authors, summary, journal, ensure_latex=True, doi=None):
+        self.raw_title = title
         self.url = url
-        self.date = date
-        self.authors = [_elc(a) for a in authors]
-        self.summary = _elc(summary)
-        self.journal = _elc(journal)
+        self.doi = doi
+        self.date = _dates.setdefault(date, date)
+        self.raw_authors = tuple(authors)
+        self.raw_summary = summary
+        self.raw_journal = sys.intern(journal)
+        self.ensure_latex = ensure_latex
+        self._title = None
+        self._authors = None
+        self._summary = None
+        self._journal = None
+        # set by dedup.Deduplicator for articles that appear in several feeds
+        self.duplicate_of = None
+        self.related = ()
+
+    def add_related(self, article):
+        """Add an other version of this article (see dedup)"""
+        self.related += (article,)
+
+    def _elc(self, s):
+        if self.ensure_latex:
+            start = time.perf_counter()
+            s = elc(s)
+            metrics.default_metrics.add_span("sanitize", "", self.raw_journal, time.perf_counter() - start)
+        return s
+
+    @property
+    def title(self):
+        if self._title is None:
+            self._title = self._elc(self.raw_title)
+        return self._title
+
+    @property
+    def authors(self):
+        if self._authors is None:
+            self._authors = tuple(self._elc(a) for a in self.raw_authors)
+        return self._authors
+
+    @property
+    def summary(self):
+        if self._summary is None:
+            self._summary = self._elc(self.raw_summary)
+        return self._summary
+
+    @property
+    def journal(self):
+        if self._journal is None:
+            self._journal = sys.intern(self._elc(self.raw_journal))
+        return self._journal
+
+    @property
+    def key(self):
+        "Identifier of the article, the doi, the arXiv id (without version) or the url"
+        if self.doi:
+            return "doi:"+self.doi.lower()
+        m = re.match("https?://(?:export\\.)?arxiv\\.org/abs/(.+?)(?:v[0-9]+)?$", self.url)
+        if m is not None:
+            return "arxiv:"+m.group(1)
+        return self.url
+
+    def as_dict(self):
+        """The raw and the latex compatible fields (see snapshot), the date in ISO format"""
+        return {"key": self.key, "url": self.url, "doi": self.doi, "date": self.date.isoformat(),
+                "raw_title": self.raw_title, "raw_authors": self.raw_authors, "raw_summary": self.raw_summary,
+                "raw_journal": self.raw_journal, "ensure_latex": self.ensure_latex,
+                "title": self._title, "authors": self._authors, "summary": self._summary, "journal": self._journal}
+
+    @classmethod
+    def from_dict(cls, d):
+        """Restore an article from as_dict, without sanitizing it again"""
+        article = cls(d["raw_title"], d["url"], datetime.date.fromisoformat(d["date"]), d["raw_authors"],
+                      d["raw_summary"], d["raw_journal"], ensure_latex=d["ensure_latex"], doi=d["doi"])
+        article._title, article._summary = d["title"], d["summary"]
+        article._authors = None if d["authors"] is None else tuple(d["authors"])
+        article._journal = None if d["journal"] is None else sys.intern(d["journal"])
+        return article
 
     def author_string(self, max_authors=3):
         if max_authors < 2:
@@ -50,53 +131,100 @@ class Article:
         else:
             return authors[0]+", ..., and "+authors[-1]
 
-    def latex(self, max_authors=3, show_journal=False, show_summary=True):
+    def latex(self, max_authors=3, show_journal=False, show_summary=True, reason=None):
         """
         Create a latex compatible string for an article.
+        If given the reason (why the article was matched) is shown below the summary.
+        Duplicates (see dedup) are shown without summary, but with a link to the other version.
         """
         # write the title in a subsection and use href for url
-        ret = "\\subsection*{\\href{"+self.url+"}{"
-        ret += self.title+"}}\n"
+        ret = ["\\subsection*{\\href{", self.url, "}{", self.title, "}}\n"]
         # write the authors and date in a subsubsection
-        ret += "\\subsubsection*{"
-        ret += self.author_string(max_authors=max_authors).replace("...", "\\dots")
-        ret += " ("+self.date.isoformat()
+        ret += ["\\subsubsection*{", self.author_string(max_authors=max_authors).replace("...", "\\dots"),
+                " (", self.date.isoformat()]
         # if wished for also show the journal
         if show_journal:
-            ret += " "+self.journal
-        ret += ")}\n"
+            ret += [" ", self.journal]
+        ret.append(")}\n")
         # also add the summary/abstract
-        if show_summary:
-            ret += self.summary+"\n"
-        return ret+"\n"
+        if show_summary and self.duplicate_of is None:
+            ret += [self.summary, "\n"]
+        others = ([self.duplicate_of] if self.duplicate_of is not None else []) + list(self.related)
+        if len(others) > 0:
+            ret += ["Also in ", ", ".join("\\href{"+a.url+"}{"+a.journal+"}" for a in others), ".\n"]
+        if reason is not None:
+            ret += ["\\par{\\footnotesize\\itshape Matched by ", escape(reason), ".}\n"]
+        ret.append("\n")
+        return "".join(ret)
 
 
     def match_journal(self, journals):
         "Check wether article was published in one of the journals."
-        return self.journal.lower() in journals
+        return self.raw_journal.lower() in journals
 
     def match_title(self, res):
         "Check wether article was published in one of the journals (case insensitive)."
-        return not(all(re.search(r, self.title, re.IGNORECASE) is None for r in res))
+        return not(all(re.search(r, self.raw_title, re.IGNORECASE) is None for r in res))
 
     def match_summary(self, res):
         "Check wether article was published in one of the journals. (case insensitive)"
-        return not(all(re.search(r, self.summary, re.IGNORECASE) is None for r in res))
+        return not(all(re.search(r, self.raw_summary, re.IGNORECASE) is None for r in res))
 
 
     def match_authors(self, authors):
         "Check wether article was authored by one of the authors. Actually only checks wether the last name and the first letter of the first name are contained in any of the author strings."
         return any(any(a[0][0] in artauth and a[1] in artauth for a in authors)
-                   for artauth in self.authors)
+                   for artauth in self.raw_authors)
 
 
-    def match(self, journals, authors, title_res, summary_res):
+    def match(self, journals, authors=(), title_res=(), summary_res=()):
         """
-        Check whether article is matched by any of the filter rules.
+        Check whether article is matched by any of the filter rules (on the raw strings).
+        journals can also be a Filter (see config.load_filter), which is much faster.
         Default filters are
         - match_authors
         - match_title
         - match_summary
         - match_journal
         """
+        if isinstance(journals, Filter):
+            return journals.match(self) is not None
         return self.match_journal(journals) or self.match_authors(authors) or self.match_title(title_res) or self.match_summary(summary_res)
+
+
+def sanitize_articles(articles, workers=None, min_batch=1024, pool=None):
+    """
+    Create the latex compatible fields of all articles at once (see LaTeX.elc_batch),
+    large batches are spread over worker processes (of pool if given). Fields that are already known are kept,
+    the summary of duplicates (see dedup) is not shown and therefore not sanitized.
+    """
+    fields = []
+    strings = []
+    for a in articles:
+        if not a.ensure_latex:
+            continue
+        if a._title is None:
+            fields.append((a, "_title", 1))
+            strings.append(a.raw_title)
+        if a._authors is None:
+            fields.append((a, "_authors", len(a.raw_authors)))
+            strings += a.raw_authors
+        if a._summary is None and a.duplicate_of is None:
+            fields.append((a, "_summary", 1))
+            strings.append(a.raw_summary)
+        if a._journal is None:
+            fields.append((a, "_journal", 1))
+            strings.append(a.raw_journal)
+    if len(strings) == 0:
+        return
+    with metrics.span("sanitize", "batch"):
+        results = elc_batch(strings, workers=workers, min_batch=min_batch, pool=pool)
+    i = 0
+    for a, field, n in fields:
+        if field == "_authors":
+            a._authors = tuple(results[i:i+n])
+        elif field == "_journal":
+            a._journal = sys.intern(results[i])
+        else:
+            setattr(a, field, results[i])
+        i += n
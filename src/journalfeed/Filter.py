@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# journalfeed2pdf -- python script to get content from the web
+# Copyright (C) 2020 Benedikt Tissot
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import re
+
+
+class KeywordMatcher:
+    """
+    Case insensitive search for any of a list of regular expressions.
+    The expressions are combined into one alternation, if that is not possible
+    (e.g. they use backreferences) they are searched one after the other.
+    """
+    def __init__(self, res):
+        self.res = list(res)
+        self.combined = None
+        self.separate = []
+        if len(self.res) == 0:
+            return
+        if not any(re.search("\\\\[1-9]|\\(\\?P=", r) for r in self.res):
+            try:
+                self.combined = re.compile("|".join("(?P<k{}>{})".format(i, r) for i, r in enumerate(self.res)),
+                                           re.IGNORECASE)
+                return
+            except re.error:
+                pass
+        self.separate = [re.compile(r, re.IGNORECASE) for r in self.res]
+
+    def search(self, s):
+        """Return the expression that is found in s or None"""
+        if self.combined is not None:
+            m = self.combined.search(s)
+            # the group around each expression closes last, so it is the last group
+            return None if m is None else self.res[int(m.lastgroup[1:])]
+        for r, compiled in zip(self.res, self.separate):
+            if compiled.search(s) is not None:
+                return r
+        return None
+
+
+class Filter:
+    """
+    Compiled filter rules (see config.load_filter), built once and used to match all articles.
+    An article is matched if it was published in one of the journals, authored by one of the authors
+    or if one of the keyword expressions is found in the title (title and summary keywords)
+    or the summary (summary keywords).
+    """
+    def __init__(self, journals, authors, title_res, summary_res):
+        self.journals = frozenset(j.lower() for j in journals)
+        # authors are (first name, last name), they are indexed by the last name
+        self.authors = list(authors)
+        self.last_names = {}
+        for first, last in self.authors:
+            self.last_names.setdefault(last, []).append(first)
+        self.title = KeywordMatcher(title_res)
+        self.summary = KeywordMatcher(summary_res)
+
+    def match_author(self, author):
+        """Return the configured author that matches the author string or None"""
+        words = author.replace(",", " ").split()
+        for word in words + [w.strip(".") for w in words] + [p for w in words if "-" in w for p in w.split("-")]:
+            for first in self.last_names.get(word, ()):
+                # as before we only check the first letter of the first name
+                if first[0] in author:
+                    return first+" "+word
+        return None
+
+    def match(self, article):
+        """
+        Check whether article is matched by any of the filter rules (on the raw strings).
+        Returns the reason why the article matched (a string) or None.
+        """
+        if article.raw_journal.lower() in self.journals:
+            return "journal "+article.raw_journal
+        if self.last_names:
+            for author in article.raw_authors:
+                name = self.match_author(author)
+                if name is not None:
+                    return "author "+name
+        r = self.title.search(article.raw_title)
+        if r is not None:
+            return "title keyword "+r
+        r = self.summary.search(article.raw_summary)
+        if r is not None:
+            return "summary keyword "+r
+        return None
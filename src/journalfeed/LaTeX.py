@@ -15,21 +15,15 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import os
 import re  # used to better ensure compiling latex!
-from bs4 import BeautifulSoup  # used to get rid of HTML stuff
 
 # Here we can configure
 # environmants for math
 math_envs = ["equation", "align"]
-# we use non-greeedy (i.e. shortest repetition) "*?" to avoid combining math matches
-# additionally we use the negative lookahead for the other regexps
-# TODO consider simplifying this to non-greedy repetition
-math_matchers = ["(\\\\begin\\{(?P<env>"+"|".join(math_envs)+")\\*?\\})(.+?)(\\\\end\\{(?P=env)\\*?\\})",
-                 "(\\\\\\[)((?:.(?!\\\\\\]))*.)(\\\\\\])", "(\\\\\\()((?:.(?!\\\\\\)))*.)(\\\\\\))",
-                 "(\\$\\$)([^\\$]+)(\\$\\$)", "(\\$)([^\\$]+)(\\$)"]
-
-# TODO this could be more elegenat by only being one combined regex that always has the content in the same group!
-math_regex = re.compile("("+"|".join(math_matchers)+")", flags=re.DOTALL)
+# a math environment starts with \begin{env} (or \begin{env*}), \[, \(, $$ or $, see find_all_math
+math_begin_regex = re.compile("\\\\begin\\{("+"|".join(math_envs)+")\\*?\\}|\\\\[\\[(]|\\$")
+math_closing = {"\\[": "\\]", "\\(": "\\)"}
 
 # supports regexp (needs to be escaped accordingly)
 # the general sub before is applied before \\ are stripped
@@ -56,7 +50,7 @@ outside_math_sub = [("\\^", "{\\\\textasciicircum}"),
 prepend_backslash = ["emph\\{", "textit\\{", "textbf\\{", "_", "&", "$", "%"]
 # ensure no unescaped %
 for command in prepend_backslash:
-    outside_math_sub.append(((re.compile("\\\\*"+re.escape(command))), "\\\\"+command))
+    outside_math_sub.append(("\\\\*"+re.escape(command), "\\\\"+command))
 
 
 
@@ -123,19 +117,71 @@ inside_math_sub = [("\\\\\\\\", "\\\\ "),  # newline to space
                    ("([^\\\\]|^)((\\\\\\\\)+)([\\^_])$", "\\1\\2 \\\\\\4")]
 
 
-def find_all_math(s, math_regex=math_regex):
-    """Search for all valid latex environments, returns a list of list [[whole match, begin, content, end],...]"""
-    math_matches = math_regex.findall(s)
-    math_matches = [[j for j in i if j != ""] for i in math_matches]
-    for i in math_matches:
-        if len(i) == 5:
-            del i[2]
-    return math_matches
+class _Finder:
+    """str.find for (mostly) increasing start positions, an unsuccessful or distant search is not repeated"""
+    def __init__(self, s):
+        self.s = s
+        self.found = {}  # needle -> (start of the last search, its result)
+
+    def find(self, needle, start):
+        known = self.found.get(needle)
+        if known is not None and known[0] <= start and (known[1] == -1 or known[1] >= start):
+            return known[1]
+        i = self.s.find(needle, start)
+        self.found[needle] = (start, i)
+        return i
+
+
+def find_all_math(s):
+    """
+    Search for all valid latex environments, returns a list of list [[whole match, begin, content, end],...].
+    The environments are found from left to right, at every position \\begin{env}...\\end{env}, \\[...\\], \\(...\\),
+    $$...$$ and $...$ are tried in this order, with the shortest non empty content (without $ for $ and $$).
+    Every closing delimiter is searched at most once per occurrence, so this is linear in the length of s
+    even if many environments are not closed.
+    """
+    finder = _Finder(s)
+    matches = []
+    pos = 0
+    while True:
+        m = math_begin_regex.search(s, pos)
+        if m is None:
+            return matches
+        start = begin_end = m.end()
+        begin = m.group(0)
+        end = None
+        if begin == "$":
+            if s.startswith("$", start):
+                i = finder.find("$", start+1)
+                if i > start+1 and s.startswith("$", i+1):
+                    begin, begin_end, end, i = "$$", start+1, "$$", i
+            if end is None:
+                i = finder.find("$", start)
+                if i > start:
+                    end = "$"
+        elif begin in math_closing:
+            i = finder.find(math_closing[begin], start+1)
+            if i != -1:
+                end = math_closing[begin]
+        else:
+            # the first \\end{env} or \\end{env*}
+            ends = [(i, e) for e in ["\\end{"+m.group(1)+"}", "\\end{"+m.group(1)+"*}"]
+                    for i in [finder.find(e, start+1)] if i != -1]
+            if ends:
+                i, end = min(ends)
+        if end is None:
+            pos = m.start()+1
+        else:
+            pos = i+len(end)
+            matches.append([s[m.start():pos], begin, s[begin_end:i], end])
+
 
 def curly_brace_balance(expression):
-    # the amount of escaped brackets should match
-    if len(re.findall("\\\\\\{", expression)) != len(re.findall("\\\\\\}", expression)):
+    # the amount of escaped and of all brackets should match
+    if expression.count("\\{") != expression.count("\\}") or expression.count("{") != expression.count("}"):
         return False
+    if "{" not in expression:
+        return True
     # additionally check whether for every opened curly braked there is a closing curly bracket
     opened = 0
     for c in expression:
@@ -146,67 +192,208 @@ def curly_brace_balance(expression):
                 opened -= 1
             else:
                 return False
-    return opened == 0
-
-
-
-def elc(s, general_sub=general_sub,
-        outside_math_sub=outside_math_sub,
-        inside_math_sub=inside_math_sub,
-        math_command_whitlist_regex = "("+"|".join(math_command_whitelist)+")",
-        math_env_whitelist=math_env_whitelist):
-    """Ensure Latex compatibility of a string s"""
-    # first use BeautifulSoup to get rid of html artefacts
-    # using html because beautifulsoup also strips <expecation values> in this form
-    ret = BeautifulSoup(s, "html.parser").get_text(strip=True)
-    # require is used in math by MATHJAX to load additional packages
-    # Strip it because we use real latex and strip all unknown commands in the following
-    ret = re.sub("\\$\\\\require\\{[^\\]\\}]+\\}\\$", "", ret)
-
-    # strip escaped $ signs to not accidentaly use them in math matches
-    ret = re.sub("\\\\\\$", "ESCAPEDDOLLAR", ret)
-
-    # curly braces need to be balanced, else we have a problem with latex
-    if not curly_brace_balance(ret):
-        return "Curly braces not balanced."
-
-    math_matches = find_all_math(ret)
-    for i, match in enumerate(math_matches):
-        if not curly_brace_balance(match[0]):
-            return "Curly braces not balanced in inline math."
-        ret = ret.replace(match[0], "MATH{}MATH".format(i))
-        for find, replace in inside_math_sub:
-            match[2] = re.sub(find, replace, match[2])
-        # try to clever strip "bad" backslashes:
+    return True
+
+
+
+def escape(s):
+    """Escape the latex special characters of a plain string (e.g. a regular expression)"""
+    return re.sub("[\\\\{}$&#^_%~]", lambda m: {"\\": "\\textbackslash{}", "^": "\\textasciicircum{}",
+                                                 "~": "\\textasciitilde{}"}.get(m.group(0), "\\"+m.group(0)), s)
+
+
+def _replacement(template):
+    """Literal replacements are passed on as they are, templates are only expanded for actual matches"""
+    if "\\" not in template:
+        return template
+    return lambda m: m.expand(template)
+
+
+def _compile(rules):
+    """Precompile a list of (regex, replacement) rules, rules that cannot change a string are dropped"""
+    return [(re.compile(find), _replacement(replace)) for find, replace in rules
+            if not (isinstance(find, str) and find == replace and re.escape(find) == find)]
+
+
+class Sanitizer:
+    """
+    Ensure Latex compatibility of strings, see elc.
+    All rule tables are compiled once when the sanitizer is created, afterwards call it for every string.
+    """
+    def __init__(self, general_sub=general_sub,
+                 outside_math_sub=outside_math_sub,
+                 inside_math_sub=inside_math_sub,
+                 general_sub_before=general_sub_before,
+                 math_command_whitlist_regex="("+"|".join(math_command_whitelist)+")",
+                 math_env_whitelist=math_env_whitelist,
+                 cache_size=2**14):
+        self.general_sub = _compile(general_sub)
+        self.general_sub_before = _compile(general_sub_before)
+        self.inside_math_sub = _compile(inside_math_sub)
+        # all outside math rules are combined into one alternation, that replaces the matches with placeholders
+        # (as the placeholders are alphanumeric this is the same as applying one rule after the other)
+        self.outside_math_find = re.compile("|".join("(?P<OUTSIDE{}OUTSIDE>{})".format(i, getattr(find, "pattern", find))
+                                                     for i, (find, _) in enumerate(outside_math_sub)))
+        # the replacements are inserted literally when restoring the placeholders
+        self.outside_math_replace = [re.compile("x").sub(replace, "x") for _, replace in outside_math_sub]
+        self.require = re.compile("\\$\\\\require\\{[^\\]\\}]+\\}\\$")
         # first insert a space if the command is directly followed by a \\ or a number
-        match[2] = re.sub(math_command_whitlist_regex+"(\\\\|[0-9]|/)", "\\1 \\2", match[2])
+        self.command_space = re.compile(math_command_whitlist_regex+"(\\\\|[0-9]|/)")
         # after a command a (backslash or number or slash)
         # whitespace, super-, subscript, slash, a bracket or the end of the string are allowed
-        match[2] = re.sub("\\\\"+math_command_whitlist_regex+"(\\s|\\^|_|\\{|\\}|\\(|\\)|\\[|\\]|=|\\Z)", "\\\\\\\\\\1\\2", match[2])
-        regex = "(\\\\begin\\{(?P<env>"+"|".join(math_env_whitelist)+")\\*?\\})(.+(?!(?P=env)))(\\\\end\\{(?P=env)\\*?\\})"
-        match[2] = re.sub(regex, "\\\\\\1\\3\\\\\\4", match[2])
-        match[2] = re.sub("\\\\([a-zA-Z0-9])", "\\1", match[2])
+        self.command_keep = re.compile("\\\\"+math_command_whitlist_regex+"(\\s|\\^|_|\\{|\\}|\\(|\\)|\\[|\\]|=|\\Z)")
+        self.env_keep = re.compile("(\\\\begin\\{(?P<env>"+"|".join(math_env_whitelist)+")\\*?\\})(.+(?!(?P=env)))(\\\\end\\{(?P=env)\\*?\\})")
+        self.strip_backslash = re.compile("\\\\([a-zA-Z0-9])")
+        self.command_space_replace = _replacement("\\1 \\2")
+        self.command_keep_replace = _replacement("\\\\\\\\\\1\\2")
+        self.env_keep_replace = _replacement("\\\\\\1\\3\\\\\\4")
+        self.strip_backslash_replace = _replacement("\\1")
+        self.cache_size = cache_size
+        self.math_cache = {}
+        # strings of letters, digits, spaces and simple punctuation are not changed (except for stripping)
+        # this is the common case for journals and authors
+        self.simple = re.compile("(?:[^\\W_]|[ .,'-])*")
+        self.placeholder = re.compile("OUTSIDE([0-9]+)OUTSIDE|MATH([0-9]+)MATH")
+
+    def math(self, content):
+        """Sanitize the content of a math environment (cached, the same math appears in many abstracts)"""
+        ret = self.math_cache.get(content)
+        if ret is None:
+            ret = content
+            for find, replace in self.inside_math_sub:
+                ret = find.sub(replace, ret)
+            # try to clever strip "bad" backslashes:
+            ret = self.command_space.sub(self.command_space_replace, ret)
+            ret = self.command_keep.sub(self.command_keep_replace, ret)
+            ret = self.env_keep.sub(self.env_keep_replace, ret)
+            ret = self.strip_backslash.sub(self.strip_backslash_replace, ret)
+            if len(self.math_cache) >= self.cache_size:
+                self.math_cache.clear()
+            self.math_cache[content] = ret
+        return ret
 
-    for i, finrep in enumerate(outside_math_sub):
-        ret = re.sub(finrep[0], "OUTSIDE{}OUTSIDE".format(i), ret)
+    def __call__(self, s):
+        """Ensure Latex compatibility of a string s"""
+        if self.simple.fullmatch(s) and "mathbit" not in s:
+            return s.strip()
+        # first use BeautifulSoup to get rid of html artefacts
+        # using html because beautifulsoup also strips <expecation values> in this form
+        # without tags and entities this is the same as stripping whitespace
+        if "<" in s or "&" in s:
+            # imported here, most strings do not need it
+            from bs4 import BeautifulSoup
+            ret = BeautifulSoup(s, "html.parser").get_text(strip=True)
+        else:
+            ret = s.strip()
+        # require is used in math by MATHJAX to load additional packages
+        # Strip it because we use real latex and strip all unknown commands in the following
+        ret = self.require.sub("", ret)
 
-    for find, replace in general_sub_before:
-        ret = re.sub(find, replace, ret)
+        # strip escaped $ signs to not accidentaly use them in math matches
+        ret = ret.replace("\\$", "ESCAPEDDOLLAR")
 
-    ret = ret.replace("\\", "")
+        # curly braces need to be balanced, else we have a problem with latex
+        if not curly_brace_balance(ret):
+            return "Curly braces not balanced."
 
-    for i, finrep in enumerate(outside_math_sub):
-        ret = re.sub("OUTSIDE{}OUTSIDE".format(i), finrep[1], ret)
+        math_matches = find_all_math(ret)
+        math = []
+        for i, match in enumerate(math_matches):
+            if not curly_brace_balance(match[0]):
+                return "Curly braces not balanced in inline math."
+            ret = ret.replace(match[0], "MATH{}MATH".format(i))
+            content = self.math(match[2])
+            math.append("$"+content+"$" if content != "" else "?empty math?")
+
+        ret = self.outside_math_find.sub(lambda m: m.lastgroup, ret)
+
+        for find, replace in self.general_sub_before:
+            ret = find.sub(replace, ret)
+
+        ret = ret.replace("\\", "")
+
+        # restore all placeholders in a single pass
+        def restore(m):
+            if m.group(1) is not None:
+                table, i = self.outside_math_replace, int(m.group(1))
+            else:
+                table, i = math, int(m.group(2))
+            return table[i] if i < len(table) else m.group(0)
+        ret = self.placeholder.sub(restore, ret)
+
+        for find, replace in self.general_sub:
+            ret = find.sub(replace, ret)
+
+        ret = ret.replace("ESCAPEDDOLLAR", "\\$")
+
+        return ret.strip()
+
+
+# created on first use (see sanitizer), compiling the rules takes a while
+default_sanitizer = None
+
+def sanitizer():
+    """The default Sanitizer"""
+    global default_sanitizer
+    if default_sanitizer is None:
+        default_sanitizer = Sanitizer()
+    return default_sanitizer
+
+
+def elc(s, **tables):
+    """
+    Ensure Latex compatibility of a string s.
+    The rule tables (see Sanitizer) can be overwritten by keyword arguments,
+    but it is much faster to create a Sanitizer once for custom tables.
+    """
+    if tables:
+        return Sanitizer(**tables)(s)
+    return sanitizer()(s)
+
+
+def _elc_chunk(strings):
+    sanitize = sanitizer()
+    return [sanitize(s) for s in strings]
 
-    for i, match in enumerate(math_matches):
-        if match[2] != "":
-            ret = ret.replace("MATH{}MATH".format(i), "$"+match[2]+"$")
-        else:
-            ret = ret.replace("MATH{}MATH".format(i), "?empty math?")
 
-    for find, replace in general_sub:
-        ret = re.sub(find, replace, ret)
+def process_pool(workers=None):
+    """
+    A pool of workers processes (default: one per cpu) for elc_batch, e.g. shared by all batches of a run,
+    or None if workers <= 1. The workers are started by a fork server, not forked from this
+    (multi-threaded) process, and the caller shuts the pool down.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1:
+        return None
+    # multiprocessing is only imported for large batches
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context)
 
-    ret = re.sub("ESCAPEDDOLLAR", "\\$", ret)
 
-    return ret.strip()
+def elc_batch(strings, workers=None, chunksize=64, min_batch=1024, pool=None):
+    """
+    Ensure Latex compatibility of many strings, the results are returned in order.
+    Batches of at least min_batch strings are sanitized in chunks by pool (see process_pool,
+    by default a pool of workers processes for this batch), smaller batches or workers <= 1
+    are sanitized in this process.
+    The results are the same as [elc(s) for s in strings].
+    """
+    strings = list(strings)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if (pool is None and workers <= 1) or len(strings) < max(min_batch, 1):
+        return _elc_chunk(strings)
+    from concurrent.futures.process import BrokenProcessPool
+    chunks = [strings[i:i+chunksize] for i in range(0, len(strings), chunksize)]
+    try:
+        if pool is not None:
+            return [ret for chunk in pool.map(_elc_chunk, chunks) for ret in chunk]
+        with process_pool(min(workers, len(chunks))) as pool:
+            return [ret for chunk in pool.map(_elc_chunk, chunks) for ret in chunk]
+    except (OSError, BrokenProcessPool):
+        # e.g. no permission to create processes
+        return _elc_chunk(strings)
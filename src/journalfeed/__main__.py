@@ -15,111 +15,298 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-import sys
+import argparse
 import datetime
-from journalfeed.Article import Article
+import sys
 from journalfeed.config import load_config
-import journalfeed.arxiv as arxiv
-import journalfeed.nature as nature
-import journalfeed.science as science
-import journalfeed.aps as aps
+from journalfeed.writer import Digest, write_digests
+from journalfeed.helpers import batched, parallel_map
+from journalfeed.snapshot import write_snapshot, read_snapshot
+from pathlib import Path
+import journalfeed.metrics as metrics
 
 # see arxiv API for options, here we search for cond-mat and quant-ph articles
 # (logical +OR+)
 # we get the arxiv articles for one week
 # (starting 8 days ago..., such that we do not miss articles due to not all articles published today)
 
+# the sections of the digest, the journal is shown if it is not clear from the section
+section_journals = {"APS Journals": lambda article: True,
+                    "Nature": lambda article: article.raw_journal.lower() != "nature",
+                    "Science": lambda article: article.raw_journal.lower() != "science",
+                    "arXiv": lambda article: False}
+# the source of every section
+section_sources = [("APS Journals", "aps"), ("Nature", "nature"), ("Science", "science"), ("arXiv", "arxiv")]
+
+subcommands = ["fetch", "render", "serve"]
+# the articles sanitized at once, enough strings for the worker processes (see LaTeX.elc_batch)
+sanitize_batch = 1024
+
+
+def add_fetch_arguments(parser):
+    parser.add_argument("enddate", nargs="?", type=datetime.date.fromisoformat, help="YYYY-MM-DD, defaults to today")
+    parser.add_argument("timedelta", nargs="?", type=int, default=7, help="amount of days before enddate to include")
+    parser.add_argument("--since-last-run", action="store_true",
+                        help="only fetch and show articles that were not part of a previous run")
+    parser.add_argument("--offline", action="store_true",
+                        help="only use the cached responses of previous runs (also JOURNALFEED_OFFLINE=1)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="processes used to sanitize large sections (default: one per cpu, 1 to disable)")
+    parser.add_argument("--harvest", action="store_true",
+                        help="harvest the arxiv_sets of sources.json into a local mirror and query it locally "
+                        "instead of paging through the arXiv API, for long windows (also arxiv_harvest in sources.json)")
+    parser.add_argument("--deadline", type=float, default=900, metavar="SECONDS",
+                        help="stop fetching after SECONDS (default 900, 0 for no limit), sources that did not "
+                        "finish in time (or within their time budget in sources.json) are marked as incomplete")
+
+
+def add_render_arguments(parser):
+    parser.add_argument("--explain", action="store_true",
+                        help="show which filter rule matched below every matched article")
+    parser.add_argument("--pdf", action="store_true",
+                        help="also compile the tex file to a pdf (skipped if the tex file did not change)")
+    parser.add_argument("--engine", default="lualatex",
+                        help="the LaTeX engine used for --pdf (default lualatex)")
+    parser.add_argument("--unmatched", choices=["full", "titles", "separate", "omit"], default="full",
+                        help="show the unmatched articles in full (default), only their titles, "
+                        "in a separate document (OUTPUT-unmatched.tex) or not at all")
+    parser.add_argument("--max-unmatched", type=int, metavar="N",
+                        help="show at most N unmatched articles")
+    parser.add_argument("--profile-dirs", nargs="+", metavar="DIR",
+                        help="write one digest OUTPUT-<name of DIR>.tex for each configuration directory "
+                        "(with filter.json and config.json), the articles are only fetched once")
+
+
+def add_profiling_arguments(parser):
+    parser.add_argument("--profile", action="store_true",
+                        help="print the time spent per stage, source and journal and the counters to stderr")
+    parser.add_argument("--metrics", metavar="FILE",
+                        help="write the timings and counters to FILE (Prometheus textfile if it ends with .prom, else json)")
+    parser.add_argument("--cprofile", metavar="FILE",
+                        help="profile the main thread with cProfile, dump the stats to FILE and print the hottest functions")
+
+
+def add_serve_arguments(parser):
+    parser.add_argument("--host", default="127.0.0.1", help="the address to listen on (default 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8017, help="the port to listen on (default 8017)")
+    parser.add_argument("--socket", metavar="PATH", help="listen on the unix socket PATH instead")
+    parser.add_argument("--days", dest="timedelta", type=int, default=7, metavar="N",
+                        help="amount of days to include (default 7)")
+    parser.add_argument("--offline", action="store_true",
+                        help="only use the cached responses of previous runs (also JOURNALFEED_OFFLINE=1)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="processes used to sanitize large sections (default: one per cpu, 1 to disable)")
+    parser.add_argument("--explain", action="store_true",
+                        help="show which filter rule matched below every matched article")
+    parser.add_argument("--unmatched", choices=["full", "titles", "omit"], default="full",
+                        help="show the unmatched articles in full (default), only their titles or not at all")
+    parser.add_argument("--max-unmatched", type=int, metavar="N",
+                        help="show at most N unmatched articles")
+
+
+def parse_args(argv=None):
+    """
+    Parse the command line, either of a full run (fetch and render)
+    or of the subcommands fetch (write a snapshot), render (read a snapshot) and serve (keep running).
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+    if len(argv) > 0 and argv[0] in subcommands:
+        parser = argparse.ArgumentParser(prog="journalfeed2tex",
+                                         description="Fetch the articles and render the digest separately.")
+        commands = parser.add_subparsers(dest="command", required=True)
+        fetch_parser = commands.add_parser("fetch", help="fetch and sanitize the articles and write them to a snapshot")
+        fetch_parser.add_argument("snapshot", help="the snapshot to write (JSON Lines, gzip compressed if it ends with .gz)")
+        add_fetch_arguments(fetch_parser)
+        add_profiling_arguments(fetch_parser)
+        render_parser = commands.add_parser("render", help="render the digest of a snapshot")
+        render_parser.add_argument("snapshot", help="the snapshot to read")
+        render_parser.add_argument("output", help="the tex file to write")
+        add_render_arguments(render_parser)
+        add_profiling_arguments(render_parser)
+        serve_parser = commands.add_parser("serve", help="keep running, refresh every source on its schedule "
+                                           "and serve the current digest over http")
+        add_serve_arguments(serve_parser)
+        args = parser.parse_args(argv)
+        check_profile_dirs(parser, args)
+        return args
+    parser = argparse.ArgumentParser(prog="journalfeed2tex",
+                                     description="Generate a latex document of the newest articles in the configured journals.",
+                                     epilog="Use journalfeed2tex fetch|render -h for the separate steps "
+                                     "and journalfeed2tex serve -h for the daemon.")
+    parser.add_argument("output", help="the tex file to write")
+    add_fetch_arguments(parser)
+    add_render_arguments(parser)
+    add_profiling_arguments(parser)
+    args = parser.parse_args(argv)
+    args.command = None
+    check_profile_dirs(parser, args)
+    return args
+
+
+def profile_name(config_dir):
+    """The name of a profile, its digest is written to OUTPUT-<name>.tex"""
+    return Path(config_dir).resolve().name
+
+
+def check_profile_dirs(parser, args):
+    """Exit with an error if two profiles have the same name, i.e. their digests would overwrite each other"""
+    names = [profile_name(config_dir) for config_dir in getattr(args, "profile_dirs", None) or []]
+    duplicates = sorted(set(name for name in names if names.count(name) > 1))
+    if len(duplicates) > 0:
+        parser.error("the profile directories must have different names, the digests of "
+                     + ", ".join(duplicates)+" would overwrite each other")
+
+
 def main():
-    sources, _filter, preamble = load_config()
-    standalone = True
+    args = parse_args()
+    if args.command == "serve":
+        # the daemon (and the sources) are only imported if we serve
+        from journalfeed.serve import serve
+        serve(args, [(name, source, section_journals[name]) for name, source in section_sources])
+        return
+    profiler = None
+    if args.cprofile is not None:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        with metrics.span("run"):
+            if args.command == "fetch":
+                startdate, enddate, sections, notes = fetch(args)
+                with metrics.span("snapshot"):
+                    write_snapshot(args.snapshot, sections, startdate, enddate, notes)
+            elif args.command == "render":
+                with metrics.span("snapshot"):
+                    startdate, enddate, sections, notes = read_snapshot(args.snapshot)
+                render(args, startdate, enddate, sections, notes)
+            else:
+                startdate, enddate, sections, notes = fetch(args)
+                render(args, startdate, enddate, sections, notes)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.cprofile)
+            import pstats
+            pstats.Stats(profiler, stream=sys.stderr).sort_stats("tottime").print_stats(20)
+        if args.profile:
+            sys.stderr.write(metrics.default_metrics.summary())
+        if args.metrics is not None:
+            metrics.default_metrics.write(args.metrics)
 
-    if len(sys.argv) < 2 or len(sys.argv) > 4:
-        print("Usage: python", sys.argv[0], "<output.tex> [enddate YYYY-MM-DD] [timedelta D]")
-        sys.exit(2)
-    else:
-        if any(sys.argv[1] == h for h in ["-h", "--help"]):
-            print("Usage: python", sys.argv[0], "<output.tex>")
-            sys.exit(1)
-        fname = sys.argv[1]
-    if len(sys.argv) >= 3:
-        enddate = datetime.date.fromisoformat(sys.argv[2])
+
+def fetch(args):
+    """
+    Fetch, deduplicate and sanitize the articles,
+    returns the start date, the end date, the sections and the notes on incomplete sections.
+    The articles of a section are iterators that have to be consumed in order (see writer.write_digests),
+    the run is recorded and the notes are complete once the last section is exhausted.
+    """
+    # the sources (and the network libraries) are only imported if we fetch, not for --help or render
+    from journalfeed.Article import sanitize_articles
+    from journalfeed.LaTeX import process_pool
+    from journalfeed.config import load_sources
+    from journalfeed.fetch import fetch_sources
+    import journalfeed.cache as cache
+    from journalfeed.state import ArticleIndex
+    from journalfeed.dedup import Deduplicator
+    import journalfeed.resilience as resilience
+
+    sources = load_sources()
+    if args.harvest:
+        sources["arxiv_harvest"] = True
+
+    if args.enddate is not None:
+        enddate = args.enddate
         print("Warning the dates be ignored for some journals!")
     else:
         enddate = datetime.date.today()
-
-    if len(sys.argv) == 4:
-        timedelta = datetime.timedelta(days=int(sys.argv[3]))
-    else:
-        timedelta = datetime.timedelta(days=7)
+    timedelta = datetime.timedelta(days=args.timedelta)
+    if args.offline:
+        cache.default_cache.offline = True
     startdate = enddate - timedelta
+    index = ArticleIndex()
+    arxiv_startdate = None
+    if args.since_last_run and index.last_run() is not None:
+        startdate = min(max(startdate, index.last_run()), enddate)
+        arxiv_startdate = startdate
+
+    # all sources are fetched at the same time, the sections are still processed in order
+    resilience.set_deadline(args.deadline or None)
+    articles = fetch_sources(sources, enddate=enddate, startdate=startdate, arxiv_startdate=arxiv_startdate,
+                             deadline=resilience.run_deadline)
+
+    # the reasons of incomplete sections, the arxiv section may still become incomplete while it is consumed
+    notes = {name: articles["status"][source] for name, source in section_sources if source in articles["status"]}
 
-    prarticles = aps.get_articles(journals=sources["aps_journals"],
-                                  enddate=enddate, startdate=startdate)
-    # if we are in the first week of the month
-    # else only include the weekly journal(s)
-    naturearticles = nature.get_articles(journals=sources["nature"]["weekly"],
-                                         enddate=enddate, startdate=startdate)
-    sciencearticles = science.get_articles(journals=sources["science"],
-                                           enddate=enddate, startdate=startdate)
-    if enddate.day <= 7:
-        # include the monthly journal(s) of nature and science families
-        # TODO startdate should then be the beginning of last month!
-        _start = datetime.date(startdate.year, startdate.month, 1)
-        naturearticles += nature.get_articles(journals=sources["nature"]["monthly"],
-                                              enddate=enddate, startdate=_start)
-
-    arxivarticles = arxiv.get_articles(query=sources["arxiv_query"])
-
-
-    with open(fname, "w") as file:
-        if standalone:
-            file.write(preamble)
-            file.write("\\begin{document}")
-        file.write("\\title{In the Journals}\n")
-        if startdate.month == enddate.month:
-            file.write("\\newcommand{{\\thedate}}{{{0:%d} to {1:%d %b. %Y}}}\n".format(startdate, enddate))
-        elif startdate.year == enddate.year:
-            file.write("\\newcommand{{\\thedate}}{{{0:%d %b.} to {1:%d %b. %Y}}}\n".format(startdate, enddate))
+    # one pool of sanitizing processes for all batches of the run
+    pool = process_pool(args.workers)
+
+    def finish():
+        if pool is not None:
+            pool.shutdown()
+        index.commit()
+        index.prune()
+        notes.update((name, articles["status"][source]) for name, source in section_sources
+                     if source in articles["status"])
+        if notes:
+            # the next --since-last-run should fetch the missing articles again
+            print("Warning the run is not recorded as some sources are incomplete")
         else:
-            file.write("\\newcommand{{\\thedate}}{{{0:%d %b. %Y} to {1:%d %b. %Y}}}\n".format(startdate, enddate))
-        file.write("\\date{\\thedate}\n\n")
-        file.write("\\maketitle\n\n")
+            index.record_run(enddate)
+        cache.default_cache.prune()
 
-        unmatchedarticles = []
+    # articles that appear in several feeds are only shown once (in the first section)
+    dedup = Deduplicator()
 
-        file.write("\\section{APS Journals}\n")
-        for article in prarticles:
-            if article.match(*_filter):
-                file.write(article.latex(show_journal=True))
-            else:
-                unmatchedarticles.append(article)
-        file.write("\\clearpage\n")
-        file.write("\\section{Nature}\n")
-        for article in naturearticles:
-            if article.match(*_filter):
-                file.write(article.latex(show_journal=article.journal.lower() != "nature"))
-            else:
-                unmatchedarticles.append(article)
-        file.write("\\clearpage\n")
-        file.write("\\section{Science}\n")
-        for article in sciencearticles:
-            if article.match(*_filter):
-                file.write(article.latex(show_journal=article.journal.lower() != "science"))
-            else:
-                unmatchedarticles.append(article)
-        file.write("\\clearpage\n")
-        file.write("\\section{arXiv}\n")
-        for article in arxivarticles:
-            if article.match(*_filter):
-                file.write(article.latex())
-            else:
-                unmatchedarticles.append(article)
-        file.write("\\clearpage\n")
-        file.write("\\section{Unmatched Articles}\n")
-        for article in unmatchedarticles:
-            file.write(article.latex(show_journal=True))
-        if standalone:
-            file.write("\\end{document}")
+    def section(source, last):
+        """
+        The articles of source, known articles are not sanitized again, the others are sanitized
+        in batches (large enough for the worker processes) while the arxiv pages are still fetched and written
+        """
+        for batch in batched(dedup.filter(index.prepare(articles[source], skip_known=args.since_last_run)),
+                             sanitize_batch):
+            sanitize_articles(batch, workers=args.workers, pool=pool)
+            for article in batch:
+                index.add(article)
+            yield from batch
+        if last:
+            finish()
+
+    sections = [(name, section(source, i == len(section_sources) - 1))
+                for i, (name, source) in enumerate(section_sources)]
+    return startdate, enddate, sections, notes
+
+
+def render(args, startdate, enddate, sections, notes=None):
+    """Write the digest (of every profile) of the sections and compile it if requested"""
+    from journalfeed.pdf import build_pdf, LatexError
+    standalone = True
+    fname = args.output
+    sections = [(name, articles, section_journals.get(name, lambda article: True)) for name, articles in sections]
+
+    # every profile (or the default configuration) gets its own digest of the shared articles
+    profiles = []
+    for config_dir in args.profile_dirs or [None]:
+        _, profile_filter, profile_preamble = load_config(config_dir)
+        if config_dir is None:
+            profiles.append(("", fname, profile_filter, profile_preamble))
+        else:
+            profile = profile_name(config_dir)
+            profiles.append((profile, str(Path(fname).with_name(Path(fname).stem+"-"+profile+".tex")),
+                             profile_filter, profile_preamble))
+
+    # the articles are read once for all profiles, the pdfs are compiled in parallel afterwards
+    digests = [Digest(profile_fname, profile_filter, profile_preamble, startdate, enddate, explain=args.explain,
+                      unmatched=args.unmatched, max_unmatched=args.max_unmatched, standalone=standalone, profile=name)
+               for name, profile_fname, profile_filter, profile_preamble in profiles]
+    write_digests(digests, sections, notes)
+    if args.pdf:
+        try:
+            parallel_map(lambda digest: [build_pdf(f, digest.preamble, engine=args.engine) for f in digest.files],
+                         digests)
+        except LatexError as e:
+            sys.exit(str(e))
 
 if __name__ == "__main__":
     main()
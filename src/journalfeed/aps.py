@@ -1,9 +1,8 @@
 #!/usr/bin/env python3
 
 import datetime
-import feedparser as fp
 from .Article import Article
-from .helpers import parsed_datetime
+from .helpers import parsed_datetime, parallel_map, parse_feed
 
 
 def pr_summary_extract(s):
@@ -15,9 +14,7 @@ def get_articles(enddate = datetime.date.today(),
                  startdate=datetime.date.today() - datetime.timedelta(days=7),
                  journals = ["prl"], **kwargs):
 
-    feeds = []
-    for pr in journals:
-        feeds.append(fp.parse("http://feeds.aps.org/rss/recent/"+pr+".xml"))
+    feeds = parallel_map(lambda pr: parse_feed("http://feeds.aps.org/rss/recent/"+pr+".xml", "aps", pr), journals)
 
     prarticles = []
     for feed in feeds:
@@ -1,58 +1,99 @@
 #!/usr/bin/env python3
 import datetime
-import feedparser as fp
-import time  # used for connections to arxiv
+import time
 from .Article import Article
-from .helpers import parsed_datetime
+from .helpers import parsed_datetime, parse_feed
+from . import cache
+from . import metrics
+from . import resilience
+from .resilience import backoff as jittered_backoff, CircuitOpen, Deadline, DeadlineExceeded
 
+page_size = 100
 
-def get_articles(enddate=datetime.date.today(),
-                 startdate=datetime.date.today() - datetime.timedelta(days=8),
-                 query="cat:cond-mat*+OR+cat:quant-ph", id_list="", **kwargs):
-    """get arxiv articles from startdate 00:00 to enddate 00:00.
-    If an id_list is provided start and end dates are ignored.
+
+def query_url(start, enddate, startdate, query, id_list):
+    """The url of the page of results starting at start"""
+    # either lastUpdatedDate or submittedDate
+    # We use the latter as we are only interested in new papers
+    # see https://github.com/ContentMine/getpapers/issues/180
+    # and https://github.com/ContentMine/getpapers/wiki/arxiv-query-format
+    url = "https://export.arxiv.org/api/query?"
+    if query != "":
+        url += "search_query=(" + query + ")+AND+"
+    if id_list != "":
+        url += "id_list=" + id_list
+    else:
+        url += "submittedDate:["+startdate.strftime("%Y%m%d")+"0000+TO+"+enddate.strftime("%Y%m%d")+"0000]"
+    url += "&start="+str(start)+"&max_results="+str(page_size)+"&sortBy=submittedDate&sortOrder=descending"
+    return url
+
+
+def iter_articles(enddate=datetime.date.today(),
+                  startdate=datetime.date.today() - datetime.timedelta(days=8),
+                  query="cat:cond-mat*+OR+cat:quant-ph", id_list="",
+                  max_pages=100, retries=5, backoff=3., max_backoff=30., deadline=None, **kwargs):
+    """Like get_articles, but yield the articles page by page as they arrive.
+    The amount of pages is planned from the total results of the first page (at most max_pages).
+    Empty or broken pages are retried up to retries times with exponential backoff (with jitter),
+    afterwards the error of the last failed request is raised (if any, else we are done).
+    No page is requested after the deadline (a resilience.Deadline), DeadlineExceeded is raised instead.
+    As the results are sorted by date, we stop once an article was submitted before startdate.
 
     Unsupported kwargs are passed on to the article contructor.
     """
-    feeds = []
-    cond = True
+    start = 0
+    pages = max_pages
     retry = 0
-    while cond and len(feeds) < 100:  # tenthousand entries is pretty long
-        # either lastUpdatedDate or submittedDate
-        # We use the latter as we are only interested in new papers
-        # see https://github.com/ContentMine/getpapers/issues/180
-        # and https://github.com/ContentMine/getpapers/wiki/arxiv-query-format
-        url = "https://export.arxiv.org/api/query?"
-        if query != "":
-            url += "search_query=(" + query + ")+AND+"
-        if id_list != "":
-            url += "id_list=" + id_list
-        else:
-            url += "submittedDate:["+startdate.strftime("%Y%m%d")+"0000+TO+"+enddate.strftime("%Y%m%d")+"0000]"
-        url += "&start="+str(100*len(feeds))+"&max_results=100&sortBy=submittedDate&sortOrder=descending"
-        feeds.append(fp.parse(url))
+    deadline = deadline or Deadline()
+    while start < pages * page_size:
+        if deadline.expired():
+            raise DeadlineExceeded("arxiv page "+str(start // page_size)+" not requested before the deadline")
+        # the cache ensures the 3 seconds arxiv asks users to wait between queries
+        feed = parse_feed(query_url(start, enddate, startdate, query, id_list), "arxiv", "arXiv")
+        # a failed request returns an empty feed
+        error = resilience.default_failures.pop("arxiv")
         try:
-            totalresults = int(feeds[-1]["feed"]["opensearch_totalresults"])
-            if totalresults == 0 or len(feeds[-1].entries) == 0:
-                # something has gone wrong
-                retry += 1
-                del feeds[-1]  # remove the last entry
-            else:
-                # it seems ok now reset the retry counter
-                retry = 0
-            if len(feeds) * 100 >= totalresults or retry > 20:
-                cond = False
-        except:
+            totalresults = int(feed["feed"]["opensearch_totalresults"])
+        except (KeyError, ValueError):
+            totalresults = 0
+        if totalresults == 0 or len(feed.entries) == 0:
+            # something has gone wrong (or there really are no results), retrying only helps online
+            if isinstance(error, (DeadlineExceeded, CircuitOpen)):
+                raise error
             retry += 1
-            del feeds[-1]  # remove the last entry
-        if cond:  # arxiv asks users to wait for 3 seconds between queries
-            time.sleep(3)
-
-    articles = []
-    for feed in feeds:
+            if retry > retries or cache.default_cache.offline:
+                if error is not None:
+                    raise error
+                return
+            metrics.count("retries", source="arxiv")
+            delay = jittered_backoff(retry-1, backoff, max_backoff)
+            remaining = deadline.remaining()
+            if remaining is not None and delay >= remaining:
+                raise DeadlineExceeded("no arxiv retry before the deadline")
+            time.sleep(delay)
+            continue
+        # it seems ok now reset the retry counter
+        retry = 0
+        if error is not None:
+            # an old cached page was used, the source stays marked (see fetch.guard)
+            resilience.failed("arxiv", error)
+        pages = min(max_pages, -(-totalresults // page_size))
+        start += page_size
         for e in feed.entries:
             published = parsed_datetime(e.published_parsed)
-            articles.append(Article(e.title.replace("\n", ""), e.link, published,
-                                         [a["name"].strip() for a in e.authors], e.summary,
-                                         "arXiv", **kwargs))
-    return articles
+            if id_list == "" and published < startdate:
+                return
+            yield Article(e.title.replace("\n", ""), e.link, published,
+                          [a["name"].strip() for a in e.authors], e.summary,
+                          "arXiv", **kwargs)
+
+
+def get_articles(enddate=datetime.date.today(),
+                 startdate=datetime.date.today() - datetime.timedelta(days=8),
+                 query="cat:cond-mat*+OR+cat:quant-ph", id_list="", **kwargs):
+    """get arxiv articles from startdate 00:00 to enddate 00:00.
+    If an id_list is provided start and end dates are ignored.
+
+    Unsupported kwargs are passed on to the article contructor.
+    """
+    return list(iter_articles(enddate=enddate, startdate=startdate, query=query, id_list=id_list, **kwargs))
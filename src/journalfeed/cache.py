@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+import hashlib
+import json
+import os
+import threading
+import time
+import requests
+from pathlib import Path
+from urllib.parse import urlsplit
+from .config import cache_dir
+from . import metrics
+from . import client
+from . import resilience
+
+# maximum amount of parallel connections and minimal pause (in seconds) between requests per host
+# arxiv asks users to wait for 3 seconds between queries
+host_limits = {"export.arxiv.org": (1, 3.0), "oaipmh.arxiv.org": (1, 3.0)}
+default_host_limit = (4, 0.0)
+
+
+class HostSlot:
+    """Limit the concurrent requests to a host and enforce a pause between consecutive requests"""
+    def __init__(self, connections, interval, host=""):
+        self.host = host
+        self.semaphore = threading.BoundedSemaphore(connections)
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.last = None
+
+    def __enter__(self):
+        with metrics.span("wait", self.host):
+            self.semaphore.acquire()
+            if self.interval > 0:
+                with self.lock:
+                    if self.last is not None:
+                        wait = self.last + self.interval - time.monotonic()
+                        if wait > 0:
+                            time.sleep(wait)
+        return self
+
+    def __exit__(self, *exc):
+        if self.interval > 0:
+            with self.lock:
+                self.last = time.monotonic()
+        self.semaphore.release()
+
+
+_host_slots = {}
+_host_slots_lock = threading.Lock()
+
+def host_slot(url):
+    """Get the (shared) HostSlot for the host of url, use it as context manager around a request"""
+    host = urlsplit(url).hostname
+    with _host_slots_lock:
+        if host not in _host_slots:
+            _host_slots[host] = HostSlot(*host_limits.get(host, default_host_limit), host=host)
+        return _host_slots[host]
+
+
+class CacheMiss(Exception):
+    """Raised in offline mode if a url is not in the cache"""
+
+
+class HTTPCache:
+    """
+    Persistent on-disk cache for GET requests (made with the shared client).
+    Every entry consists of the body and a json file with the url, ETag and Last-Modified headers,
+    that are used to revalidate the entry with a conditional request.
+    In offline mode only cached entries are served.
+    """
+    def __init__(self, path=None, max_size=200*1024**2, max_age=30*24*3600, offline=False):
+        self.path = Path(path) if path is not None else cache_dir() / "http"
+        self.max_size = max_size
+        self.max_age = max_age
+        self.offline = offline
+        self.lock = threading.Lock()
+
+    def _files(self, url, headers):
+        key = hashlib.sha256(json.dumps([url, headers], sort_keys=True).encode()).hexdigest()
+        return self.path / (key+".json"), self.path / (key+".body")
+
+    def _load(self, url, headers):
+        meta_file, body_file = self._files(url, headers)
+        try:
+            with meta_file.open("r") as f:
+                meta = json.load(f)
+            return meta, body_file.read_bytes()
+        except (OSError, ValueError):
+            return None, None
+
+    def _store(self, url, headers, meta, body):
+        meta_file, body_file = self._files(url, headers)
+        with self.lock:
+            self.path.mkdir(parents=True, exist_ok=True)
+            if body is not None:
+                # write to a temporary file first, such that no broken entries are left behind
+                tmp = body_file.with_suffix(".tmp{}".format(threading.get_ident()))
+                tmp.write_bytes(body)
+                os.replace(tmp, body_file)
+            with meta_file.open("w") as f:
+                json.dump(meta, f)
+
+    def get(self, url, headers=None, max_stale=0, source=None):
+        """
+        Get the body of url, use the cache if possible.
+        Entries younger than max_stale seconds are served without revalidation,
+        older ones are served if the request fails (also with a 5xx or 429 response),
+        which is recorded for source (see resilience.failed).
+        """
+        headers = dict(headers or {})
+        host = urlsplit(url).hostname
+        meta, body = self._load(url, headers)
+        if self.offline:
+            if body is None:
+                metrics.count("cache_misses", host=host)
+                raise CacheMiss(url)
+            metrics.count("cache_hits", host=host, kind="offline")
+            return body
+        if body is not None and time.time() - meta["stored"] < max_stale:
+            metrics.count("cache_hits", host=host, kind="fresh")
+            return body
+        request_headers = dict(headers)
+        if body is not None:
+            if meta.get("etag"):
+                request_headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                request_headers["If-Modified-Since"] = meta["last_modified"]
+        try:
+            with host_slot(url), metrics.span("request", host):
+                response = client.get(url, headers=request_headers)
+        except requests.RequestException as e:
+            if body is None:
+                raise
+            # better an old response than none (e.g. the host is down or the run is out of time)
+            return self._stale(url, body, source, e)
+        metrics.count("requests", host=host, status=response.status_code)
+        if (response.status_code >= 500 or response.status_code == 429) and body is not None:
+            return self._stale(url, body, source, "status "+str(response.status_code))
+        if response.status_code == 304 and body is not None:
+            metrics.count("cache_hits", host=host, kind="revalidated")
+            meta["stored"] = time.time()
+            self._store(url, headers, meta, None)
+            return body
+        response.raise_for_status()
+        metrics.count("bytes_downloaded", len(response.content), host=host)
+        meta = {"url": url,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "stored": time.time()}
+        self._store(url, headers, meta, response.content)
+        return response.content
+
+    def _stale(self, url, body, source, error):
+        metrics.count("cache_hits", host=urlsplit(url).hostname, kind="stale")
+        if source is not None:
+            resilience.failed(source, resilience.StaleResponse(str(error)+" for "+url))
+        return body
+
+    def prune(self):
+        """Evict entries older than max_age and afterwards the oldest entries until the cache is smaller than max_size"""
+        if not self.path.exists():
+            return
+        entries = []
+        now = time.time()
+        with self.lock:
+            for meta_file in self.path.glob("*.json"):
+                body_file = meta_file.with_suffix(".body")
+                try:
+                    with meta_file.open("r") as f:
+                        stored = json.load(f)["stored"]
+                    size = body_file.stat().st_size
+                except (OSError, ValueError, KeyError):
+                    stored, size = 0, 0
+                if now - stored > self.max_age:
+                    meta_file.unlink(missing_ok=True)
+                    body_file.unlink(missing_ok=True)
+                else:
+                    entries.append((stored, size, meta_file, body_file))
+            total = sum(e[1] for e in entries)
+            for stored, size, meta_file, body_file in sorted(entries):
+                if total <= self.max_size:
+                    break
+                meta_file.unlink(missing_ok=True)
+                body_file.unlink(missing_ok=True)
+                total -= size
+
+
+# the cache used by all sources, offline mode can also be enabled with the environment variable JOURNALFEED_OFFLINE
+default_cache = HTTPCache(offline=os.getenv("JOURNALFEED_OFFLINE", "") not in ["", "0"])
+
+def get(url, headers=None, max_stale=0, source=None):
+    """Get the body of url using the default cache"""
+    return default_cache.get(url, headers=headers, max_stale=max_stale, source=source)
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+import requests
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from . import resilience
+
+# urllib3 only decodes brotli if one of the brotli packages is installed
+try:
+    import brotli  # noqa: F401
+    accept_encoding = "gzip, deflate, br"
+except ImportError:
+    try:
+        import brotlicffi  # noqa: F401
+        accept_encoding = "gzip, deflate, br"
+    except ImportError:
+        accept_encoding = "gzip, deflate"
+
+
+class Client:
+    """
+    HTTP client shared by all sources (through the cache) and the doi resolution.
+    The connections are pooled per host and kept alive, responses are compressed
+    and every request has a connect and a read timeout (in seconds), shortened to the deadline of the run.
+    Requests to hosts that failed repeatedly fail fast (see resilience.CircuitBreaker).
+    """
+    def __init__(self, timeout=(10, 60), pool_connections=16, pool_maxsize=8):
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"Accept-Encoding": accept_encoding,
+                                     "User-Agent": "journalfeed (https://github.com/benneti/journalfeed2pdf)"})
+
+    def get(self, url, headers=None, timeout=None):
+        """GET url, the body is decompressed"""
+        # per host and port
+        host = urlsplit(url).netloc
+        resilience.check(host)
+        try:
+            response = self.session.get(url, headers=headers, timeout=resilience.timeout(timeout or self.timeout))
+        except (requests.ConnectionError, requests.Timeout):
+            resilience.default_breaker.failure(host)
+            raise
+        if response.status_code >= 500 or response.status_code == 429:
+            resilience.default_breaker.failure(host)
+        else:
+            resilience.default_breaker.success(host)
+        return response
+
+    def close(self):
+        self.session.close()
+
+
+default_client = Client()
+
+def get(url, headers=None, timeout=None):
+    """GET url with the default client"""
+    return default_client.get(url, headers=headers, timeout=timeout)
@@ -2,11 +2,21 @@
 import json # config file
 from os import getenv
 from pathlib import Path
-from xdg_base_dirs import xdg_config_home
+from .Filter import Filter
+from xdg_base_dirs import xdg_config_home, xdg_cache_home, xdg_data_home
 
 
-def load_config_file(name):
-    configPath = Path(xdg_config_home()) / "journalfeed"
+def cache_dir():
+    return Path(xdg_cache_home()) / "journalfeed"
+
+
+def data_dir():
+    return Path(xdg_data_home()) / "journalfeed"
+
+
+def load_config_file(name, config_dir=None):
+    """Load the config file name from config_dir (default XDG_CONFIG_HOME/journalfeed) or the default file"""
+    configPath = Path(config_dir) if config_dir is not None else Path(xdg_config_home()) / "journalfeed"
     configFile = configPath / name
     configDefault = Path(__file__).parent / name
     with configDefault.open("r") as f:
@@ -19,8 +29,8 @@ def load_config_file(name):
     return config
 
 
-def load_filter():
-    config = load_config_file("filter.json")
+def load_filter(config_dir=None):
+    config = load_config_file("filter.json", config_dir)
 
     # parse the config
     journals = []
@@ -33,11 +43,11 @@ def load_filter():
         a = a.split(" ")
         a = (a[0], a[-1])
         authors.append(a)
-    title_res = config["title"]
+    # the title is also searched for the summary keywords
+    title_res = config["title"] + config["summary"]
     summary_res = config["summary"]
-    title_res += summary_res
 
-    return [journals, authors, title_res, summary_res]
+    return Filter(journals, authors, title_res, summary_res)
 
 
 def load_sources():
@@ -56,16 +66,23 @@ def load_sources():
             "weekly": nature_weekly,
             "monthly": nature_monthly
         },
-        "science": science
+        "science": science,
+        # seconds per source, older configurations have none
+        "time_budgets": config.get("time_budgets", {}),
+        # seconds between the refreshes of serve or a daily "HH:MM" (UTC), see serve.next_refresh
+        "refresh": config.get("refresh", {}),
+        # the OAI-PMH sets with all results of arxiv_query, harvested into a local mirror if arxiv_harvest
+        "arxiv_sets": config.get("arxiv_sets", []),
+        "arxiv_harvest": config.get("arxiv_harvest", False)
     }
 
 
-def load_config():
-    config = load_config_file("config.json")
+def load_config(config_dir=None):
+    config = load_config_file("config.json", config_dir)
     latexclass = config["class"]
     options = config["class_options"]
     preamble = f"\\documentclass[{options}]{{{latexclass}}}"
     for line in config["preamble"]:
         preamble += "\n" + line
-    return [ load_sources(), load_filter(), preamble ]
+    return [ load_sources(), load_filter(config_dir), preamble ]
 
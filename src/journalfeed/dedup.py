@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+import re
+from . import metrics
+
+
+def normalized_title(title):
+    """
+    Lower case title without html tags, whitespace and punctuation (including the backslash and braces
+    of latex commands, the names are kept as e.g. $\\alpha$ and $\\beta$ differ)
+    """
+    title = re.sub("<[^>]*>", "", title)
+    return re.sub("[\\W_]+", "", title.lower())
+
+
+def author_names(authors):
+    """The set of (lower case) last names of the authors"""
+    names = set()
+    for author in authors:
+        words = re.sub("[^\\w\\s-]+", " ", author.lower()).split()
+        if len(words) > 0:
+            names.add(words[-1])
+    return frozenset(names)
+
+
+class Deduplicator:
+    """
+    Index of the articles seen so far, used to find articles that appear in several feeds
+    (e.g. an arXiv preprint and the published version, or the weekly and monthly Nature lists).
+    Articles are identified by Article.key and by the normalized title together with the set of author names.
+    """
+    def __init__(self):
+        self.keys = set()
+        self.titles = {}
+
+    def title_key(self, article):
+        title = normalized_title(article.raw_title)
+        names = author_names(article.raw_authors)
+        if title == "" or len(names) == 0:
+            return None
+        return title, names
+
+    def filter(self, articles):
+        """
+        Yield the articles that were not seen before (under the same key).
+        Articles with the same title and authors as an earlier article (but a different key) are yielded
+        with duplicate_of set to the earlier article, which in turn gets them added to its related articles.
+        """
+        for article in articles:
+            if article.key in self.keys:
+                metrics.count("articles_dropped", reason="duplicate")
+                continue
+            self.keys.add(article.key)
+            title_key = self.title_key(article)
+            if title_key is None:
+                yield article
+                continue
+            original = self.titles.get(title_key)
+            if original is None:
+                self.titles[title_key] = article
+            else:
+                article.duplicate_of = original
+                original.add_related(article)
+            yield article
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from bs4 import BeautifulSoup  # used to get rid of HTML stuff
+from .cache import host_slot, default_cache
+from .config import data_dir
+from . import metrics
+from . import client
+from . import resilience
+
+
+class AbstractStore:
+    """
+    Permanent doi -> abstract mapping (a json file in XDG_DATA_HOME/journalfeed),
+    the abstract of a doi does not change so every doi only needs to be fetched once.
+    Dois without abstract are stored with the time they were fetched instead
+    and are only fetched again after missing_ttl seconds (an abstract may still be added).
+    """
+    def __init__(self, path=None, missing_ttl=7*24*3600):
+        self.path = path if path is not None else data_dir() / "abstracts.json"
+        self.missing_ttl = missing_ttl
+        self.lock = threading.Lock()
+        self.abstracts = None
+
+    def _load(self):
+        if self.abstracts is None:
+            try:
+                with open(self.path, "r") as f:
+                    self.abstracts = json.load(f)
+            except (OSError, ValueError):
+                self.abstracts = {}
+        return self.abstracts
+
+    def get(self, doi):
+        """The abstract of doi or None"""
+        with self.lock:
+            abstract = self._load().get(doi)
+        return abstract if isinstance(abstract, str) else None
+
+    def missing(self, doi):
+        """Whether doi had no abstract within the last missing_ttl seconds"""
+        with self.lock:
+            fetched = self._load().get(doi)
+        return isinstance(fetched, (int, float)) and time.time() - fetched < self.missing_ttl
+
+    def update(self, abstracts, missing=()):
+        """Add the abstracts (dict doi -> abstract) and the missing dois without abstract and save the store"""
+        if len(abstracts) == 0 and len(missing) == 0:
+            return
+        with self.lock:
+            self._load().update(abstracts)
+            now = time.time()
+            self.abstracts.update((doi, now) for doi in missing)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            with open(tmp, "w") as f:
+                json.dump(self.abstracts, f)
+            os.replace(tmp, self.path)
+
+
+default_store = AbstractStore()
+
+
+def fetch_abstract(doi, session=None):
+    """
+    Fetch the abstract from doi.org for the given doi (with the default client), returns None if there is none
+    (also if doi.org does not know the doi), raises requests.RequestException if the request failed.
+    """
+    if session is None:
+        session = client.default_client
+    url = "https://doi.org/"+doi
+    with host_slot(url), metrics.span("request", "doi.org"):
+        response = session.get(url, headers={"Accept": "application/citeproc+json"})
+    metrics.count("requests", host="doi.org", status=response.status_code)
+    # an unknown (or withdrawn) doi has no abstract, asking again does not help
+    if response.status_code in (404, 410):
+        return None
+    response.raise_for_status()
+    metrics.count("bytes_downloaded", len(response.content), host="doi.org")
+    abstract = response.json().get("abstract")
+    if abstract is None:
+        return None
+    return BeautifulSoup(abstract, "html.parser").get_text(strip=True)
+
+
+def resolve_abstracts(dois, max_workers=4, store=default_store, source="science"):
+    """
+    Get the abstracts of all dois (dict doi -> abstract).
+    Unknown dois are fetched in parallel over the pooled connections of the default client and added to the store,
+    dois without abstract are missing in the result (and not fetched again for a while, see AbstractStore).
+    Failed requests are recorded for source (see resilience.failed), the abstracts are incomplete.
+    """
+    abstracts = {}
+    missing = []
+    known_missing = 0
+    for doi in dict.fromkeys(dois):
+        abstract = store.get(doi)
+        if abstract is not None:
+            abstracts[doi] = abstract
+        elif store.missing(doi):
+            known_missing += 1
+        else:
+            missing.append(doi)
+    metrics.count("abstract_store_hits", len(abstracts))
+    metrics.count("abstract_store_missing", known_missing)
+    # the store is all we have in offline mode
+    if len(missing) == 0 or default_cache.offline:
+        return abstracts
+
+    def fetch(doi):
+        try:
+            return fetch_abstract(doi), True
+        except (requests.RequestException, ValueError) as e:
+            # failed requests are tried again next time, the section is marked as incomplete
+            resilience.failed(source, e)
+            return None, False
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = dict(zip(missing, pool.map(fetch, missing)))
+    fetched = {doi: abstract for doi, (abstract, _) in results.items() if abstract is not None}
+    store.update(fetched, [doi for doi, (abstract, ok) in results.items() if ok and abstract is None])
+    abstracts.update(fetched)
+    return abstracts
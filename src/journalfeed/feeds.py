@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+import datetime
+import io
+import xml.etree.ElementTree as ET
+
+atom = "{http://www.w3.org/2005/Atom}"
+rss = "{http://purl.org/rss/1.0/}"
+rdf = "{http://www.w3.org/1999/02/22-rdf-syntax-ns#}"
+dc = "{http://purl.org/dc/elements/1.1/}"
+prism = "{http://prismstandard.org/namespaces/basic/2.0/}"
+opensearch = "{http://a9.com/-/spec/opensearch/1.1/}"
+
+
+class UnknownFeed(Exception):
+    """Raised if a feed is not an Atom or RSS 1.0 feed (or uses constructs we do not handle), see parse"""
+
+
+class FeedDict(dict):
+    """A dict whose keys are also attributes, like the results of feedparser"""
+    def __getattr__(self, key):
+        try:
+            return self[key]
+        except KeyError:
+            raise AttributeError(key)
+
+
+def parsed_date(s):
+    """The UTC time.struct_time of a W3C date (e.g. 2024-01-09T10:00:00-05:00) like feedparser"""
+    try:
+        date = datetime.datetime.fromisoformat(s.strip().replace("Z", "+00:00"))
+    except ValueError:
+        raise UnknownFeed("unknown date format "+s)
+    return date.utctimetuple() if date.tzinfo is not None else date.timetuple()
+
+
+def text(element):
+    """The stripped text of an element without children"""
+    if len(element) > 0:
+        raise UnknownFeed("markup in "+element.tag)
+    return (element.text or "").strip()
+
+
+# the fields of the entries we use, as in feedparser (tag -> key, dates are parsed)
+atom_fields = {atom+"title": "title", atom+"summary": "summary",
+               atom+"published": "published_parsed", atom+"updated": "updated_parsed"}
+rss_fields = {rss+"title": "title", rss+"link": "link", rss+"description": "summary",
+              dc+"date": "updated_parsed", dc+"type": "dc_type",
+              prism+"doi": "prism_doi", prism+"publicationName": "prism_publicationname"}
+
+
+def atom_entry(element, base):
+    entry = FeedDict()
+    for child in element:
+        key = atom_fields.get(child.tag)
+        if key is not None:
+            if child.get("type", "text") != "text":
+                raise UnknownFeed(child.get("type")+" content in "+child.tag)
+            entry[key] = parsed_date(text(child)) if key.endswith("_parsed") else text(child)
+        elif child.tag == atom+"author":
+            name = child.find(atom+"name")
+            entry.setdefault("authors", []).append(FeedDict(name=text(name) if name is not None else ""))
+        elif child.tag == atom+"link" and child.get("rel", "alternate") == "alternate" and "link" not in entry:
+            entry["link"] = child.get("href", "")
+    entry["summary_detail"] = FeedDict(base=base)
+    return entry
+
+
+def rss_entry(element, base):
+    entry = FeedDict()
+    for child in element:
+        key = rss_fields.get(child.tag)
+        if key is not None:
+            entry[key] = parsed_date(text(child)) if key.endswith("_parsed") else text(child)
+        elif child.tag == dc+"creator":
+            entry.setdefault("authors", []).append(FeedDict(name=text(child)))
+    entry["summary_detail"] = FeedDict(base=base)
+    return entry
+
+
+def iter_entries(content, base="", feed=None):
+    """
+    Yield the entries of an Atom (e.g. arXiv) or RSS 1.0 (e.g. APS and Science) feed one by one,
+    with only the fields we use (title, link, summary, authors, dates, dc_type, prism_doi and prism_publicationname),
+    missing fields are missing like in feedparser (e.g. authors),
+    the elements of an entry are dropped once it was read.
+    The fields of the feed we use (opensearch_totalresults) are added to feed.
+    Raises UnknownFeed (or ET.ParseError for broken xml) for other feeds.
+    """
+    root = None
+    for event, element in ET.iterparse(io.BytesIO(content), events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = element
+                if root.tag not in (atom+"feed", rdf+"RDF"):
+                    raise UnknownFeed("unknown root "+root.tag)
+            continue
+        if element.tag == atom+"entry":
+            yield atom_entry(element, base)
+        elif element.tag == rss+"item":
+            yield rss_entry(element, base)
+        elif element.tag == opensearch+"totalResults" and feed is not None:
+            feed["opensearch_totalresults"] = text(element)
+        else:
+            continue
+        element.clear()
+
+
+def parse(content, base=""):
+    """
+    Parse an Atom or RSS 1.0 feed into a result like that of feedparser.parse (only with the fields we use),
+    raises UnknownFeed for other (or broken) feeds.
+    """
+    feed = FeedDict()
+    try:
+        entries = list(iter_entries(content, base, feed))
+    except ET.ParseError as e:
+        raise UnknownFeed(str(e))
+    return FeedDict(feed=feed, entries=entries, bozo=False)
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+import datetime
+import functools
+import queue
+from concurrent.futures import ThreadPoolExecutor
+import concurrent.futures
+import journalfeed.arxiv as arxiv
+import journalfeed.nature as nature
+import journalfeed.science as science
+import journalfeed.aps as aps
+import journalfeed.harvest as harvest
+from journalfeed.resilience import Deadline, DeadlineExceeded, StaleResponse, default_failures
+
+
+def stream(pool, generator, *args, until=None, **kwargs):
+    """
+    Run the generator in the pool, the returned iterator yields the items as soon as they are available.
+    Exceptions of the generator are raised by the iterator, as is DeadlineExceeded
+    if no item arrived before the deadline until.
+    """
+    items = queue.Queue()
+    done = object()
+    def run():
+        try:
+            for item in generator(*args, **kwargs):
+                items.put((item, None))
+        except Exception as e:
+            items.put((done, e))
+        else:
+            items.put((done, None))
+    def iterate():
+        while True:
+            try:
+                item, error = items.get(timeout=None if until is None else until.remaining())
+            except queue.Empty:
+                raise DeadlineExceeded("no response before the deadline")
+            if error is not None:
+                raise error
+            if item is done:
+                return
+            yield item
+    pool.submit(run)
+    return iterate()
+
+
+def describe(error):
+    """Why a source is incomplete, shown in its section"""
+    if isinstance(error, DeadlineExceeded):
+        return "the source did not respond in time"
+    if isinstance(error, StaleResponse):
+        return "the source failed, older cached responses are shown"
+    return "the source failed ("+type(error).__name__+")"
+
+
+def result(future, deadline, source, status):
+    """
+    The result of the future if it is done before the deadline, else [].
+    The reason is recorded in status, also if some requests of the source failed (see resilience.Failures).
+    """
+    articles = []
+    try:
+        articles = future.result(timeout=deadline.remaining())
+    except concurrent.futures.TimeoutError:
+        error = DeadlineExceeded()
+    except Exception as e:
+        error = e
+    else:
+        error = default_failures.pop(source)
+        if error is None:
+            return articles
+    status[source] = describe(error)
+    print("Warning "+source+" is incomplete: "+status[source])
+    return articles
+
+
+def arxiv_articles(sources):
+    """The generator of the arxiv articles, harvest.iter_articles (of the arxiv_sets) if arxiv_harvest is set"""
+    if sources.get("arxiv_harvest"):
+        return functools.partial(harvest.iter_articles, sets=sources["arxiv_sets"])
+    return arxiv.iter_articles
+
+
+def results(futures, deadline, source, status):
+    """The concatenated results of the futures of a source (see result)"""
+    articles = []
+    for future in futures:
+        articles += result(future, deadline, source, status)
+    return articles
+
+
+def submit(pool, sources, source, enddate, startdate, **kwargs):
+    """Submit the requests of aps, nature or science to the pool, returns the futures of the article lists"""
+    if source == "aps":
+        return [pool.submit(aps.get_articles, journals=sources["aps_journals"],
+                            enddate=enddate, startdate=startdate, **kwargs)]
+    if source == "science":
+        return [pool.submit(science.get_articles, journals=sources["science"],
+                            enddate=enddate, startdate=startdate, **kwargs)]
+    futures = [pool.submit(nature.get_articles, journals=sources["nature"]["weekly"],
+                           enddate=enddate, startdate=startdate, **kwargs)]
+    # if we are in the first week of the month
+    # else only include the weekly journal(s)
+    if enddate.day <= 7:
+        # include the monthly journal(s) of nature and science families
+        # TODO startdate should then be the beginning of last month!
+        _start = datetime.date(startdate.year, startdate.month, 1)
+        futures.append(pool.submit(nature.get_articles, journals=sources["nature"]["monthly"],
+                                   enddate=enddate, startdate=_start, **kwargs))
+    return futures
+
+
+def guard(iterator, source, status):
+    """
+    Yield the items of iterator until it fails (or misses the deadline), the reason is recorded in status,
+    also if some requests of the source failed (see resilience.Failures).
+    """
+    try:
+        yield from iterator
+    except Exception as e:
+        error = e
+    else:
+        error = default_failures.pop(source)
+        if error is None:
+            return
+    status[source] = describe(error)
+    print("Warning "+source+" is incomplete: "+status[source])
+
+
+def fetch_sources(sources, enddate, startdate, arxiv_startdate=None, deadline=None, **kwargs):
+    """
+    Fetch the articles of all sources at the same time.
+    Returns a dict with the article lists of "aps", "nature" and "science",
+    an iterator over the "arxiv" articles, that yields them while the later pages are still fetched,
+    and a dict "status" with the reason for every incomplete source (once the arxiv iterator is exhausted).
+    The connections per host are limited by cache.host_slot (which also paces arxiv).
+    By default arxiv uses its own (8 day) window, arxiv_startdate overwrites its start.
+    With sources["arxiv_harvest"] the arxiv articles are queried from a local mirror (see harvest.iter_articles).
+    Every source gets at most sources["time_budgets"][source] seconds and none waits past the deadline
+    (a resilience.Deadline), what arrived until then is returned.
+
+    Unsupported kwargs are passed on to the article contructor.
+    """
+    deadline = deadline or Deadline()
+    budgets = {source: deadline.sub(sources.get("time_budgets", {}).get(source))
+               for source in ["aps", "nature", "science", "arxiv"]}
+    status = {}
+    # only the failures of this run count
+    for source in budgets:
+        default_failures.pop(source)
+    pool = ThreadPoolExecutor(max_workers=5)
+    if arxiv_startdate is not None:
+        kwargs_arxiv = dict(kwargs, startdate=arxiv_startdate, enddate=enddate)
+    else:
+        kwargs_arxiv = kwargs
+    arxivarticles = stream(pool, arxiv_articles(sources), query=sources["arxiv_query"], until=budgets["arxiv"],
+                           deadline=budgets["arxiv"], **kwargs_arxiv)
+    aps_futures = submit(pool, sources, "aps", enddate, startdate, **kwargs)
+    nature_futures = submit(pool, sources, "nature", enddate, startdate, **kwargs)
+    science_futures = submit(pool, sources, "science", enddate, startdate, **kwargs)
+    # do not wait for the arxiv pages (they are consumed by the iterator) or late sources
+    pool.shutdown(wait=False)
+    return {
+        "aps": results(aps_futures, budgets["aps"], "aps", status),
+        "nature": results(nature_futures, budgets["nature"], "nature", status),
+        "science": results(science_futures, budgets["science"], "science", status),
+        "arxiv": guard(arxivarticles, "arxiv", status),
+        "status": status
+    }
+
+
+def fetch_source(sources, source, enddate, startdate, deadline=None, **kwargs):
+    """
+    Fetch the articles of a single source (within its time budget and the deadline), e.g. to refresh it on its own.
+    Returns the list of articles (what arrived in time) and the reason if the source is incomplete, else None.
+    Unlike in fetch_sources, arxiv uses the window from startdate to enddate as well.
+    """
+    deadline = (deadline or Deadline()).sub(sources.get("time_budgets", {}).get(source))
+    status = {}
+    default_failures.pop(source)
+    pool = ThreadPoolExecutor(max_workers=3)
+    if source == "arxiv":
+        articles = list(guard(stream(pool, arxiv_articles(sources), query=sources["arxiv_query"], until=deadline,
+                                     deadline=deadline, enddate=enddate, startdate=startdate, **kwargs),
+                              source, status))
+    else:
+        articles = results(submit(pool, sources, source, enddate, startdate, **kwargs), deadline, source, status)
+    pool.shutdown(wait=False)
+    return articles, status.get(source)
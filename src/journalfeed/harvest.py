@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+import datetime
+import io
+import json
+import sqlite3
+import time
+import xml.etree.ElementTree as ET
+from urllib.parse import quote, urlsplit
+from .Article import Article
+from .config import data_dir
+from .query import matcher
+from .resilience import backoff, Deadline, DeadlineExceeded
+from . import cache
+from . import client
+from . import metrics
+from . import resilience
+
+# the OAI-PMH interface of arXiv, see https://info.arxiv.org/help/oa/index.html
+base_url = "https://oaipmh.arxiv.org/oai"
+oai = "{http://www.openarchives.org/OAI/2.0/}"
+arxiv_format = "{http://arxiv.org/OAI/arXiv/}"
+# the fields of the records, see query.fields
+record_fields = ["id", "datestamp", "created", "title", "authors", "abstract", "categories", "comments", "journal_ref"]
+
+
+class HarvestError(Exception):
+    """Raised for OAI-PMH errors (but an empty list)"""
+
+
+def list_url(setspec, from_date, token=None):
+    """The url of the first page of the records of setspec changed since from_date, or of the page of token"""
+    if token is not None:
+        return base_url+"?verb=ListRecords&resumptionToken="+quote(token, safe="")
+    return (base_url+"?verb=ListRecords&metadataPrefix=arXiv&set="+quote(setspec, safe=":")
+            +"&from="+from_date.isoformat())
+
+
+def child_text(element, tag):
+    child = element.find(arxiv_format+tag)
+    return "" if child is None or child.text is None else child.text
+
+
+def record(element):
+    """The record (a dict with the record_fields) of a record element, or only its id and deleted if it was deleted"""
+    header = element.find(oai+"header")
+    if header.get("status") == "deleted":
+        return {"id": header.findtext(oai+"identifier").rpartition(":")[2], "deleted": True}
+    metadata = element.find(oai+"metadata/"+arxiv_format+"arXiv")
+    authors = []
+    for author in metadata.iter(arxiv_format+"author"):
+        names = [child_text(author, "forenames"), child_text(author, "keyname"), child_text(author, "suffix")]
+        authors.append(" ".join(name.strip() for name in names if name.strip() != ""))
+    return {"id": child_text(metadata, "id").strip(), "datestamp": header.findtext(oai+"datestamp").strip(),
+            "created": child_text(metadata, "created").strip(), "title": child_text(metadata, "title").strip(),
+            "authors": authors, "abstract": child_text(metadata, "abstract").strip(),
+            "categories": child_text(metadata, "categories").strip(), "comments": child_text(metadata, "comments"),
+            "journal_ref": child_text(metadata, "journal-ref")}
+
+
+def parse_records(content):
+    """
+    The records of a ListRecords response (see record) and its resumption token (None on the last page),
+    the elements of a record are dropped once it was read.
+    """
+    records = []
+    token = None
+    for _, element in ET.iterparse(io.BytesIO(content)):
+        if element.tag == oai+"record":
+            records.append(record(element))
+            element.clear()
+        elif element.tag == oai+"resumptionToken":
+            token = (element.text or "").strip() or None
+        elif element.tag == oai+"error":
+            if element.get("code") == "noRecordsMatch":
+                return [], None
+            raise HarvestError(element.get("code", "")+": "+(element.text or "").strip())
+    return records, token
+
+
+def request(url, deadline, retries=5):
+    """
+    The body of an OAI-PMH request, 503 responses are retried after their Retry-After
+    (the flow control of arXiv) or with backoff, but not past the deadline.
+    """
+    host = urlsplit(url).hostname
+    for retry in range(retries+1):
+        if deadline.expired():
+            raise DeadlineExceeded("no OAI-PMH request before the deadline")
+        with cache.host_slot(url), metrics.span("request", host):
+            response = client.get(url)
+        metrics.count("requests", host=host, status=response.status_code)
+        if response.status_code != 503 or retry == retries:
+            break
+        try:
+            delay = float(response.headers["Retry-After"])
+            # flow control is not a failure of the host
+            resilience.default_breaker.success(urlsplit(url).netloc)
+        except (KeyError, ValueError):
+            delay = backoff(retry, 3.)
+        metrics.count("retries", source="arxiv")
+        remaining = deadline.remaining()
+        if remaining is not None and delay >= remaining:
+            raise DeadlineExceeded("no OAI-PMH retry before the deadline")
+        time.sleep(delay)
+    response.raise_for_status()
+    metrics.count("bytes_downloaded", len(response.content), host=host)
+    return response.content
+
+
+class Mirror:
+    """
+    Local copy (sqlite in XDG_DATA_HOME/journalfeed/arxiv.sqlite) of the arXiv records harvested with OAI-PMH,
+    together with the dates every set was harvested from and until.
+    """
+    def __init__(self, path=None):
+        if path is None:
+            path = data_dir() / "arxiv.sqlite"
+            path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(path))
+        self.db.execute("CREATE TABLE IF NOT EXISTS records (id TEXT PRIMARY KEY, datestamp TEXT, created TEXT, "
+                        "title TEXT, authors TEXT, abstract TEXT, categories TEXT, comments TEXT, journal_ref TEXT)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS records_created ON records (created)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS harvests (setspec TEXT PRIMARY KEY, start TEXT, until TEXT)")
+
+    def coverage(self, setspec):
+        """The first and the last date setspec was harvested for or None"""
+        row = self.db.execute("SELECT start, until FROM harvests WHERE setspec = ?", (setspec,)).fetchone()
+        return (None, None) if row is None else tuple(datetime.date.fromisoformat(d) for d in row)
+
+    def store(self, records):
+        """Add (or update) the records and remove the deleted ones"""
+        for r in records:
+            if r.get("deleted"):
+                self.db.execute("DELETE FROM records WHERE id = ?", (r["id"],))
+            else:
+                self.db.execute("INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                tuple(json.dumps(r[f]) if f == "authors" else r[f] for f in record_fields))
+        self.db.commit()
+
+    def record_harvest(self, setspec, start, until):
+        self.db.execute("INSERT OR REPLACE INTO harvests VALUES (?, ?, ?)",
+                        (setspec, start.isoformat(), until.isoformat()))
+        self.db.commit()
+
+    def records(self, startdate, enddate):
+        """Yield the records created from startdate until (excluding) enddate, the newest first"""
+        rows = self.db.execute("SELECT "+", ".join(record_fields)+" FROM records WHERE created >= ? AND created < ? "
+                               "ORDER BY created DESC, id DESC", (startdate.isoformat(), enddate.isoformat()))
+        for row in rows:
+            r = dict(zip(record_fields, row))
+            r["authors"] = json.loads(r["authors"])
+            yield r
+
+
+def sync(mirror, sets, startdate, deadline=None):
+    """
+    Harvest the records of the sets that changed since their last harvest (or since startdate,
+    if the mirror does not reach back that far) into the mirror, page by page.
+    Returns the amount of harvested records.
+    """
+    deadline = deadline or Deadline()
+    harvested = 0
+    for setspec in sets:
+        start, until = mirror.coverage(setspec)
+        if start is None or startdate < start:
+            start, from_date = startdate, startdate
+        else:
+            from_date = until
+        # the datestamps are in UTC, records of today are harvested again next time
+        today = datetime.datetime.now(datetime.timezone.utc).date()
+        token = None
+        while True:
+            with metrics.span("fetch", "arxiv", setspec):
+                content = request(list_url(setspec, from_date, token), deadline)
+            with metrics.span("parse", "arxiv", setspec):
+                records, token = parse_records(content)
+            mirror.store(records)
+            harvested += len(records)
+            metrics.count("records_harvested", len(records), set=setspec)
+            if token is None:
+                break
+        mirror.record_harvest(setspec, start, today)
+    return harvested
+
+
+def iter_articles(enddate=None, startdate=None, query="cat:cond-mat*+OR+cat:quant-ph", sets=(), deadline=None,
+                  mirror=None, **kwargs):
+    """
+    Like arxiv.iter_articles (from startdate, default 8 days before enddate, until enddate, default today),
+    but the OAI-PMH sets (which have to contain all results of the query) are harvested into the mirror first
+    (default Mirror()) and the query is evaluated locally (see query.matcher), offline only the mirror is used.
+
+    Unsupported kwargs are passed on to the article contructor.
+    """
+    enddate = enddate or datetime.date.today()
+    startdate = startdate or enddate - datetime.timedelta(days=8)
+    matches = matcher(query)
+    if len(sets) == 0:
+        raise HarvestError("no OAI-PMH sets to harvest (arxiv_sets in sources.json)")
+    mirror = mirror or Mirror()
+    if not cache.default_cache.offline:
+        sync(mirror, sets, startdate, deadline)
+    for r in mirror.records(startdate, enddate):
+        if matches(r):
+            yield Article(r["title"].replace("\n", ""), "http://arxiv.org/abs/"+r["id"],
+                          datetime.date.fromisoformat(r["created"]), r["authors"], r["abstract"], "arXiv", **kwargs)
@@ -1,7 +1,26 @@
 #!/usr/bin/env python3
 import datetime
-import requests
-from bs4 import BeautifulSoup  # used to get rid of HTML stuff
+from concurrent.futures import ThreadPoolExecutor
+from . import metrics
+
+def parallel_map(func, items, max_workers=8):
+    """Like map, but run func for all items in parallel threads. The order of the results is kept."""
+    items = list(items)
+    if len(items) <= 1:
+        return [func(i) for i in items]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as pool:
+        return list(pool.map(func, items))
+
+def batched(iterable, size):
+    """Yield lists of (at most) size items of iterable"""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
 
 def parsed_datetime(parsed_date):
     """Parse a feedparser date again to create a datetime object"""
@@ -10,11 +29,36 @@ def parsed_datetime(parsed_date):
 def check_words(words):
     return lambda x: x and frozenset(words.split()).intersection(x.split())
 
+def parse_feed(url, source="", journal=""):
+    """
+    Parse the feed at url, the feed is fetched through the cache.
+    Atom and RSS 1.0 feeds are parsed by feeds.parse, all others (and broken ones) by feedparser.
+    Like feedparser an empty feed is returned if the feed cannot be fetched, the error is recorded for source
+    (see resilience.Failures).
+    The time is added to the fetch and parse spans of source and journal (see metrics).
+    """
+    # the network libraries (and feedparser) are only imported once a feed is fetched
+    import requests
+    from . import cache
+    from . import feeds
+    from . import resilience
+    with metrics.span("fetch", source, journal):
+        try:
+            content = cache.get(url, source=source or None)
+        except (cache.CacheMiss, requests.RequestException) as e:
+            metrics.count("fetch_errors", source=source, journal=journal)
+            resilience.failed(source, e)
+            content = b""
+    with metrics.span("parse", source, journal):
+        try:
+            return feeds.parse(content, base=url)
+        except feeds.UnknownFeed:
+            if content != b"":
+                metrics.count("parser_fallbacks", source=source, journal=journal)
+            import feedparser as fp
+            return fp.parse(content, response_headers={"content-location": url})
+
 def abstract_from_doi(doi):
-    """Fetch the abstract from doi.org for the given doi"""
-    try:
-        response = requests.get("https://doi.org/"+doi, headers={"Accept": "application/citeproc+json"})
-        data = response.json()
-        return BeautifulSoup(data["abstract"], "html.parser").get_text(strip=True)
-    except:
-        return "no abstract found for doi:"+doi
+    """Fetch the abstract from doi.org for the given doi (see doi.resolve_abstracts to resolve many dois at once)"""
+    from .doi import resolve_abstracts
+    return resolve_abstracts([doi]).get(doi, "no abstract found for doi:"+doi)
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Metrics:
+    """
+    Thread safe collection of timing spans and counters of a run.
+    Spans are aggregated by (stage, source, journal) into the number of calls and the total (wall) time,
+    nested spans are included in the time of the outer span.
+    Counters are aggregated by name and labels.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started = time.time()
+            self.spans = {}
+            self.counters = {}
+
+    @contextmanager
+    def span(self, stage, source="", journal=""):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(stage, source, journal, time.perf_counter() - start)
+
+    def add_span(self, stage, source, journal, seconds):
+        key = (stage, source, journal)
+        with self.lock:
+            entry = self.spans.get(key)
+            if entry is None:
+                self.spans[key] = [1, seconds]
+            else:
+                entry[0] += 1
+                entry[1] += seconds
+
+    def count(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def as_dict(self):
+        with self.lock:
+            return {
+                "started": self.started,
+                "duration": time.time() - self.started,
+                "spans": [{"stage": stage, "source": source, "journal": journal, "count": c, "seconds": s}
+                          for (stage, source, journal), (c, s) in sorted(self.spans.items())],
+                "counters": [{"name": name, "labels": dict(labels), "value": v}
+                             for (name, labels), v in sorted(self.counters.items())]
+            }
+
+    def summary(self):
+        """Human readable table of the spans and counters"""
+        data = self.as_dict()
+        lines = ["{:10s} {:12s} {:22s} {:>7s} {:>10s}".format("stage", "source", "journal", "calls", "seconds")]
+        for s in data["spans"]:
+            lines.append("{:10s} {:12s} {:22s} {:7d} {:10.3f}".format(s["stage"], s["source"], s["journal"],
+                                                                     s["count"], s["seconds"]))
+        lines.append("")
+        for c in data["counters"]:
+            labels = ",".join(k+"="+str(v) for k, v in c["labels"].items())
+            lines.append("{:46s} {:>18}".format(c["name"]+("{"+labels+"}" if labels else ""), c["value"]))
+        lines.append("total {:.3f} s".format(data["duration"]))
+        return "\n".join(lines)+"\n"
+
+    def prometheus(self):
+        """The metrics in the Prometheus text exposition format (e.g. for the textfile collector)"""
+        def labels(d):
+            return "{"+",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')
+                                                 .replace("\n", "\\n")) for k, v in d.items())+"}"
+        data = self.as_dict()
+        lines = ["# TYPE journalfeed_span_seconds_total counter"]
+        for s in data["spans"]:
+            lines.append("journalfeed_span_seconds_total{} {}".format(
+                labels({"stage": s["stage"], "source": s["source"], "journal": s["journal"]}), s["seconds"]))
+        lines.append("# TYPE journalfeed_span_calls_total counter")
+        for s in data["spans"]:
+            lines.append("journalfeed_span_calls_total{} {}".format(
+                labels({"stage": s["stage"], "source": s["source"], "journal": s["journal"]}), s["count"]))
+        for name in dict.fromkeys(c["name"] for c in data["counters"]):
+            lines.append("# TYPE journalfeed_{}_total counter".format(name))
+            for c in data["counters"]:
+                if c["name"] == name:
+                    lines.append("journalfeed_{}_total{} {}".format(name, labels(c["labels"]), c["value"]))
+        lines.append("# TYPE journalfeed_run_duration_seconds gauge")
+        lines.append("journalfeed_run_duration_seconds {}".format(data["duration"]))
+        lines.append("# TYPE journalfeed_run_timestamp_seconds gauge")
+        lines.append("journalfeed_run_timestamp_seconds {}".format(data["started"]))
+        return "\n".join(lines)+"\n"
+
+    def write(self, path):
+        """Write the metrics to path, as Prometheus textfile if it ends with .prom and as json otherwise"""
+        path = str(path)
+        if path.endswith(".prom"):
+            content = self.prometheus()
+        else:
+            content = json.dumps(self.as_dict(), indent=1)+"\n"
+        # scrapers must never see a partial file
+        tmp = path+".tmp"
+        with open(tmp, "w") as f:
+            f.write(content)
+        os.replace(tmp, path)
+
+
+# the metrics of the current run, used by all modules
+default_metrics = Metrics()
+
+def span(stage, source="", journal=""):
+    """Context manager that adds the time spent inside to the span (stage, source, journal) of the default metrics"""
+    return default_metrics.span(stage, source, journal)
+
+def count(name, value=1, **labels):
+    """Add value to the counter name with the labels of the default metrics"""
+    default_metrics.count(name, value, **labels)
@@ -1,10 +1,159 @@
 #!/usr/bin/env python3
 import datetime
-import requests
-import bs4
+from html.parser import HTMLParser
 from .Article import Article
-from .helpers import check_words
+from .helpers import parallel_map
+from . import cache
+from . import metrics
+from . import resilience
 import dateutil.parser
+import requests
+
+url_base = "https://www.nature.com"
+# a subsection heading containing one of these words marks an issue with research articles
+research_words = ["Research", "Articles", "Letters", "Reviews"]
+# elements without end tag
+void_tags = frozenset(["area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track", "wbr"])
+
+
+class IssueParser(HTMLParser):
+    """
+    Single pass extraction of the research articles of a nature.com current-issue page.
+    Instead of building a tree only the stack of open tags is kept, and the text of the
+    interesting elements (headings, title, authors, date, abstract) is collected on the fly.
+    Every <article> in the "Research" issue section is visited once.
+    """
+    def __init__(self):
+        super().__init__()
+        # entries are [tag, role, collected text]
+        self.stack = []
+        self.capturing = 0
+        self.gate_ul = None  # None before, True inside and False after the first article list
+        self.has_research = False
+        self.section = None
+        self.article = None
+        self.articles = []
+
+    def role(self, tag, attrs):
+        """The role of a start tag for the extraction, or None"""
+        classes = (attrs.get("class") or "").split()
+        itemprop = (attrs.get("itemprop") or "").split()
+        if tag == "section" and "issue-section-list" in (attrs.get("data-container-type") or "").split():
+            return "section"
+        if tag == "ul" and self.gate_ul is None and "app-article-list-row" in classes:
+            self.gate_ul = True
+            return "gate"
+        if tag == "h3" and self.gate_ul is True and "c-section-heading" in classes:
+            return "subsection"
+        if self.section is None:
+            return None
+        if tag == "h2" and self.section["research"] is None:
+            return "heading"
+        if not self.section["research"]:
+            return None
+        if tag == "article":
+            return "article"
+        if self.article is None:
+            return None
+        if tag == "a" and "url" in itemprop and self.article["url"] is None:
+            self.article["url"] = url_base+attrs.get("href", "")
+        elif tag == "h3" and "name" in itemprop and "headline" in itemprop:
+            return "title"
+        elif tag == "time" and "datePublished" in itemprop:
+            return "date"
+        elif tag == "li" and "creator" in itemprop:
+            return "author"
+        elif tag == "div" and "description" in itemprop:
+            return "description"
+        elif tag == "p" and self.in_role("description"):
+            return "abstract"
+        return None
+
+    def in_role(self, role):
+        return any(entry[1] == role for entry in self.stack)
+
+    def handle_starttag(self, tag, attrs):
+        role = self.role(tag, dict(attrs))
+        if tag in void_tags:
+            return
+        if role == "section":
+            self.section = {"research": None}
+        elif role == "article":
+            self.article = {"url": None, "title": None, "date": None, "authors": [], "abstract": None}
+        text = [] if role in ("heading", "subsection", "title", "date", "author", "abstract") else None
+        if text is not None:
+            self.capturing += 1
+        self.stack.append([tag, role, text])
+
+    def handle_startendtag(self, tag, attrs):
+        self.role(tag, dict(attrs))
+
+    def handle_data(self, data):
+        if self.capturing:
+            for entry in self.stack:
+                if entry[2] is not None:
+                    entry[2].append(data)
+
+    def handle_endtag(self, tag):
+        # unclosed elements (e.g. <p> or <li>) are closed by the end tag of their parent
+        if not any(entry[0] == tag for entry in self.stack):
+            return
+        while True:
+            entry = self.stack.pop()
+            self.close_element(*entry)
+            if entry[0] == tag:
+                return
+
+    def close_element(self, tag, role, text):
+        if text is not None:
+            self.capturing -= 1
+            text = "".join(text)
+        if role == "gate":
+            self.gate_ul = False
+        elif role == "subsection":
+            if any(s in text for s in research_words):
+                self.has_research = True
+        elif role == "heading":
+            self.section["research"] = text.strip() == "Research"
+        elif role == "section":
+            self.section = None
+        elif role == "article":
+            if self.article["url"] is not None and self.article["date"] is not None:
+                self.articles.append(self.article)
+            self.article = None
+        elif role == "title" and self.article["title"] is None:
+            self.article["title"] = text.strip()
+        elif role == "date" and self.article["date"] is None:
+            self.article["date"] = text.strip()
+        elif role == "author":
+            self.article["authors"].append(text.replace(",", "").replace("&\xa0", "").strip())
+        elif role == "abstract" and self.article["abstract"] is None:
+            self.article["abstract"] = text.strip()
+
+
+def parse_issue(content, journal, **kwargs):
+    """
+    Extract the research articles of a nature.com current-issue page (bytes or str), every article only once.
+
+    Unsupported kwargs are passed on to the article contructor.
+    """
+    if isinstance(content, bytes):
+        content = content.decode("utf-8", errors="replace")
+    parser = IssueParser()
+    parser.feed(content)
+    parser.close()
+    if not parser.has_research:
+        return []
+    articles = []
+    urls = set()
+    for a in parser.articles:
+        if a["url"] in urls:
+            continue
+        urls.add(a["url"])
+        abstract = a["abstract"] if a["abstract"] is not None else "No Abstract found"
+        articles.append(Article((a["title"] or "").replace("\n", ""), a["url"],
+                                dateutil.parser.parse(a["date"]).date(), a["authors"], abstract, journal, **kwargs))
+    return articles
 
 
 def get_articles(enddate = datetime.date.today(),
@@ -15,40 +164,19 @@ def get_articles(enddate = datetime.date.today(),
 
     Unsupported kwargs are passed on to the article contructor.
     """
-    url_base = "https://www.nature.com"
+    def journal_articles(journal):
+        try:
+            with metrics.span("fetch", "nature", journal):
+                content = cache.get(url_base+"/"+journal+"/current-issue", source="nature")
+        except (cache.CacheMiss, requests.RequestException) as e:
+            metrics.count("fetch_errors", source="nature", journal=journal)
+            # the other journals are still shown, the section is marked as incomplete
+            resilience.failed("nature", e)
+            return []
+        with metrics.span("parse", "nature", journal):
+            return parse_issue(content, journal, **kwargs)
+
     articles = []
-    for journal in journals:
-        url = url_base+"/"+journal+"/current-issue"
-        response = requests.get(url)
-
-        soup = bs4.BeautifulSoup(response.content, "html.parser")
-
-        section_tags = soup.find_all('section', {'data-container-type': check_words('issue-section-list')})
-        if section_tags is None:
-            section_tags = soup.find('div', {'data-container-type': check_words('issue-section-list')})
-
-        if section_tags is not None:
-            for sec in section_tags:
-                sec_title = sec.find('h2')
-                if isinstance(sec_title, bs4.element.Tag) and sec_title.contents[0] == "Research":
-                    subsecs = soup.find('ul', {'class': check_words('app-article-list-row')}).find_all("li", recursive=False)
-                    for subsec in subsecs:
-                        subsec_title = subsec.find('h3', {'class': check_words('c-section-heading')})
-                        if isinstance(subsec_title, bs4.element.Tag) and any(s in subsec_title.contents[0]
-                                                                           for s in ["Research", "Articles", "Letters", "Reviews"]):
-                            for article in sec.find_all('article'):
-                                try:
-                                    url = url_base+article.find('a', {'itemprop': check_words('url')})['href']
-                                except TypeError:
-                                    continue
-                                title = article.find('h3', {'itemprop': check_words('name headline')}).text.strip()
-                                date = dateutil.parser.parse( article.find('time', {'itemprop': check_words('datePublished')}).text.strip() ).date()
-                                authors = article.find_all('li', {'itemprop': check_words('creator')})
-                                authors = [a.text.replace(",", "").replace("&\xa0", "").strip() for a in authors]
-                                try:
-                                    abstract = article.find('div', attrs={'itemprop': check_words('description')}).find("p").text.strip()
-                                except AttributeError:
-                                    abstract = "No Abstract found"
-                                articles.append(Article(title.replace("\n", ""), url,
-                                                        date, authors, abstract, journal, **kwargs))
+    for jarticles in parallel_map(journal_articles, journals):
+        articles += jarticles
     return articles
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+from .config import cache_dir
+from . import metrics
+
+# messages of LaTeX and its packages (e.g. hyperref) asking for another pass
+rerun_regex = re.compile("Rerun to get|Label\\(s\\) may have changed|Please rerun LaTeX|Rerun LaTeX")
+
+
+class LatexError(Exception):
+    """Raised if the LaTeX engine is missing or fails, the message ends with the tail of the log"""
+
+
+def sha256(s):
+    return hashlib.sha256(s.encode()).hexdigest()
+
+
+def needs_rerun(log):
+    return rerun_regex.search(log) is not None
+
+
+def _run(args, cwd=None, env=None):
+    try:
+        return subprocess.run(args, cwd=cwd, env=env, stdin=subprocess.DEVNULL,
+                              stdout=subprocess.PIPE, stderr=subprocess.STDOUT).returncode
+    except FileNotFoundError:
+        raise LatexError(args[0]+" not found, is LaTeX installed?")
+
+
+def _log_tail(log_file, lines=20):
+    try:
+        return "\n".join(log_file.read_text(errors="replace").splitlines()[-lines:])
+    except OSError:
+        return ""
+
+
+def preamble_format(preamble, engine="lualatex", path=None):
+    """
+    The name and directory of a format file with the preamble precompiled (using mylatexformat),
+    formats are cached by the hash of the preamble (i.e. of config.json) and the engine.
+    Returns None if the format cannot be created, e.g. as mylatexformat is not installed,
+    or if it was marked as broken (see build_pdf).
+    """
+    path = Path(path) if path is not None else cache_dir() / "formats"
+    name = "journalfeed-"+sha256(engine+"\n"+preamble)[:16]
+    if (path / (name+".broken")).exists():
+        return None
+    if (path / (name+".fmt")).exists():
+        metrics.count("format_cache_hits")
+        return name, path
+    if shutil.which("kpsewhich") is None or _run(["kpsewhich", "mylatexformat.ltx"]) != 0:
+        return None
+    path.mkdir(parents=True, exist_ok=True)
+    # the format is built in a directory of its own and moved into place once complete,
+    # runs building the same format at the same time do not see (or overwrite) a partial one
+    build = Path(tempfile.mkdtemp(prefix=name+"-", dir=path))
+    try:
+        # mylatexformat dumps everything up to \begin{document}
+        (build / (name+".tex")).write_text(preamble+"\n\\begin{document}\n\\end{document}\n")
+        with metrics.span("pdf", "format"):
+            returncode = _run([engine, "-ini", "-interaction=nonstopmode", "-halt-on-error", "-jobname="+name,
+                               "&"+engine, "mylatexformat.ltx", name+".tex"], build)
+        if returncode != 0 or not (build / (name+".fmt")).exists():
+            return None
+        os.replace(build / (name+".fmt"), path / (name+".fmt"))
+    finally:
+        shutil.rmtree(build, ignore_errors=True)
+    return name, path
+
+
+def build_pdf(tex_file, preamble, engine="lualatex", max_passes=4, format_path=None):
+    """
+    Compile tex_file (written with preamble) to a pdf next to it.
+    The preamble is loaded from a cached format (see preamble_format) if possible and only as many passes
+    as LaTeX asks for are run (at most max_passes). If neither the tex file nor the format changed since
+    the last build the pdf is kept. Returns the path of the pdf, raises LatexError on failure.
+    """
+    tex_file = Path(tex_file).resolve()
+    pdf_file = tex_file.with_suffix(".pdf")
+    log_file = tex_file.with_suffix(".log")
+    stamp_file = tex_file.with_suffix(".build.json")
+    fmt = preamble_format(preamble, engine, format_path)
+    stamp = {"tex": sha256(tex_file.read_text()), "engine": engine, "format": None if fmt is None else fmt[0]}
+    try:
+        if pdf_file.exists() and json.loads(stamp_file.read_text()) == stamp:
+            metrics.count("pdf_skipped")
+            return pdf_file
+    except (OSError, ValueError):
+        pass
+
+    args = [engine, "-interaction=nonstopmode", "-halt-on-error", tex_file.name]
+    env = None
+    if fmt is not None:
+        # the trailing separator keeps the default search path for formats
+        env = dict(os.environ, TEXFORMATS=str(fmt[1])+os.pathsep)
+        args.insert(1, "-fmt="+fmt[0])
+    for i in range(max_passes):
+        with metrics.span("pdf", "pass"):
+            returncode = _run(args, tex_file.parent, env)
+        metrics.count("latex_passes")
+        if returncode != 0 and fmt is not None and i == 0:
+            # the preamble may not work from a format, compile as usual
+            broken = fmt[1] / (fmt[0]+".broken")
+            args, env, fmt = [a for a in args if not a.startswith("-fmt=")], None, None
+            stamp["format"] = None
+            with metrics.span("pdf", "pass"):
+                returncode = _run(args, tex_file.parent, env)
+            metrics.count("latex_passes")
+            if returncode == 0:
+                # only the format was broken (else the document is), do not try it again
+                broken.touch()
+        if returncode != 0:
+            stamp_file.unlink(missing_ok=True)
+            raise LatexError(engine+" failed on "+str(tex_file)+":\n"+_log_tail(log_file))
+        try:
+            log = log_file.read_text(errors="replace")
+        except OSError:
+            log = ""
+        if not needs_rerun(log):
+            break
+    stamp_file.write_text(json.dumps(stamp))
+    return pdf_file
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+import fnmatch
+import re
+from urllib.parse import unquote_plus
+
+# the fields of the arXiv search API (see https://info.arxiv.org/help/api/user-manual.html#query_details)
+# and the fields of a record (see harvest.Mirror) they search
+fields = {"ti": ["title"], "au": ["authors"], "abs": ["abstract"], "co": ["comments"], "jr": ["journal_ref"],
+          "cat": ["categories"], "id": ["id"],
+          "all": ["title", "authors", "abstract", "comments", "journal_ref", "categories"]}
+operators = ["AND", "OR", "ANDNOT"]
+token_regex = re.compile("[a-z]+:\"[^\"]*\"|\"[^\"]*\"|\\(|\\)|[^\\s()]+")
+
+
+class QueryError(ValueError):
+    """Raised for queries that are not understood (or can not be evaluated locally)"""
+
+
+def words_regex(value):
+    """The regular expression matching the words of value (* matches the rest of a word) in lower case text"""
+    words = re.findall("[\\w*]+", value.lower())
+    if len(words) == 0:
+        raise QueryError("no words in "+value)
+    return re.compile("\\b"+"\\W+".join(re.escape(w).replace("\\*", "\\w*") for w in words)+"\\b")
+
+
+def text(value):
+    return ", ".join(value) if isinstance(value, list) else value
+
+
+def term(token):
+    """The predicate of a single term, e.g. cat:cond-mat*, ti:"quantum dot" or qubit (in all fields)"""
+    field, _, value = token.partition(":") if re.match("[a-z]+:", token) else ("all", "", token)
+    if field not in fields:
+        raise QueryError("unknown field "+field)
+    value = value.strip("\"")
+    if field in ("cat", "id"):
+        # categories and ids are matched as a whole, only the wildcard matches several
+        pattern = value.lower()
+        return lambda record: any(fnmatch.fnmatchcase(v.lower(), pattern) for v in record[fields[field][0]].split())
+    if field == "au" and "_" in value:
+        # Smith_A is an author with the last name Smith and a first name starting with A
+        last, _, initial = value.partition("_")
+        regex = words_regex(last)
+        initial = initial[:1].lower()
+        return lambda record: any(regex.search(author.lower()) and
+                                  any(w.startswith(initial) for w in author.lower().split()[:-1])
+                                  for author in record["authors"])
+    regex = words_regex(value)
+    # the authors are a list
+    return lambda record: any(regex.search(text(record[f]).lower()) for f in fields[field])
+
+
+def tokenize(query):
+    """The tokens of a query (as in the API url, e.g. with + for spaces and %22 for quotes)"""
+    return token_regex.findall(unquote_plus(query))
+
+
+def parse(tokens):
+    """
+    The predicate of the tokens of a query,
+    ANDNOT and AND (also implied between two terms) bind stronger than OR, parentheses group.
+    """
+    position = 0
+
+    def peek():
+        return tokens[position] if position < len(tokens) else None
+
+    def take():
+        nonlocal position
+        position += 1
+        return tokens[position-1]
+
+    def alternatives():
+        predicates = [conjunction()]
+        while peek() == "OR":
+            take()
+            predicates.append(conjunction())
+        if len(predicates) == 1:
+            return predicates[0]
+        return lambda record: any(p(record) for p in predicates)
+
+    def conjunction():
+        predicates = [(True, operand())]
+        while peek() not in (None, "OR", ")"):
+            include = peek() != "ANDNOT"
+            if peek() in ("AND", "ANDNOT"):
+                take()
+            predicates.append((include, operand()))
+        if len(predicates) == 1:
+            return predicates[0][1]
+        return lambda record: all(p(record) == include for include, p in predicates)
+
+    def operand():
+        token = peek()
+        if token is None or token in operators or token == ")":
+            raise QueryError("expected a term instead of "+str(token))
+        take()
+        if token == "(":
+            predicate = alternatives()
+            if peek() != ")":
+                raise QueryError("unbalanced parentheses")
+            take()
+            return predicate
+        return term(token)
+
+    predicate = alternatives()
+    if peek() is not None:
+        raise QueryError("unexpected "+peek())
+    return predicate
+
+
+def matcher(query):
+    """
+    The predicate of an arXiv API search query (e.g. cat:cond-mat*+OR+cat:quant-ph),
+    that tells whether a record (a dict with the fields of harvest.Mirror) matches.
+    Words are matched case insensitively as whole words (or phrases) and without stemming, the API may match more.
+    """
+    return parse(tokenize(query))
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+import random
+import threading
+import time
+import requests
+
+
+class DeadlineExceeded(requests.Timeout):
+    """Raised instead of starting a request (or waiting for a source) after the deadline"""
+
+
+class CircuitOpen(requests.ConnectionError):
+    """Raised instead of a request to a host that failed repeatedly"""
+
+
+class StaleResponse(requests.RequestException):
+    """Recorded for a source (see failed) that was served an old cached response as its request failed"""
+
+
+def backoff(attempt, base=1., cap=30., rng=random.random):
+    """Seconds to wait before retry attempt (0 based): exponential backoff with full jitter"""
+    return rng() * min(cap, base * 2**attempt)
+
+
+class Deadline:
+    """A point in time (monotonic clock) seconds from now, None means no limit"""
+    def __init__(self, seconds=None):
+        self.end = None if seconds is None else time.monotonic() + seconds
+
+    def remaining(self):
+        """Seconds left (at least 0) or None if there is no limit"""
+        if self.end is None:
+            return None
+        return max(0., self.end - time.monotonic())
+
+    def expired(self):
+        return self.end is not None and time.monotonic() >= self.end
+
+    def sub(self, seconds):
+        """A deadline seconds from now, but not after this one"""
+        remaining = self.remaining()
+        if seconds is None:
+            seconds = remaining
+        elif remaining is not None:
+            seconds = min(seconds, remaining)
+        return Deadline(seconds)
+
+
+class CircuitBreaker:
+    """
+    Fail fast for hosts that failed (connection errors, timeouts, 429 and 5xx responses) failures times in a row.
+    After reset_after seconds one request is let through again, if it succeeds the host is closed again.
+    """
+    def __init__(self, failures=3, reset_after=300.):
+        self.failures = failures
+        self.reset_after = reset_after
+        self.lock = threading.Lock()
+        self.hosts = {}  # host -> [consecutive failures, time of opening or None]
+
+    def allow(self, host):
+        with self.lock:
+            state = self.hosts.get(host)
+            if state is None or state[1] is None:
+                return True
+            if time.monotonic() - state[1] >= self.reset_after:
+                # half open, the next failure opens the circuit again
+                state[0] = self.failures - 1
+                state[1] = None
+                return True
+            return False
+
+    def success(self, host):
+        with self.lock:
+            self.hosts.pop(host, None)
+
+    def failure(self, host):
+        with self.lock:
+            state = self.hosts.setdefault(host, [0, None])
+            state[0] += 1
+            if state[0] >= self.failures and state[1] is None:
+                state[1] = time.monotonic()
+
+    def is_open(self, host):
+        with self.lock:
+            state = self.hosts.get(host)
+            return state is not None and state[1] is not None
+
+
+class Failures:
+    """
+    The first error of every source with a failed request that was skipped (e.g. an empty feed is returned instead),
+    such that the source is still marked as incomplete (see fetch.result).
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.errors = {}
+
+    def add(self, source, error):
+        with self.lock:
+            self.errors.setdefault(source, error)
+
+    def pop(self, source):
+        """The first error of source since the last pop or None"""
+        with self.lock:
+            return self.errors.pop(source, None)
+
+
+# shared by all requests of a run (see client.Client.get)
+default_breaker = CircuitBreaker()
+default_failures = Failures()
+run_deadline = Deadline()
+
+def set_deadline(seconds):
+    """Limit all further requests to the next seconds (None for no limit)"""
+    global run_deadline
+    run_deadline = Deadline(seconds)
+
+def failed(source, error):
+    """Record that a request of source failed, although the source went on (see Failures)"""
+    default_failures.add(source, error)
+
+def check(host):
+    """Raise DeadlineExceeded or CircuitOpen if no request to host should be made"""
+    if run_deadline.expired():
+        raise DeadlineExceeded("the deadline of the run has passed")
+    if not default_breaker.allow(host):
+        raise CircuitOpen(host+" failed repeatedly")
+
+def timeout(timeout):
+    """The (connect, read) timeout of a request, shortened to the time left until the deadline"""
+    remaining = run_deadline.remaining()
+    if remaining is None:
+        return timeout
+    # requests does not accept a timeout of 0
+    remaining = max(remaining, 0.001)
+    if isinstance(timeout, tuple):
+        return tuple(min(t, remaining) for t in timeout)
+    return min(timeout, remaining)
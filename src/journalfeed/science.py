@@ -1,8 +1,9 @@
 #!/usr/bin/env python3
 import datetime
-import feedparser as fp
 from .Article import Article
-from .helpers import parsed_datetime, abstract_from_doi
+from .helpers import parsed_datetime, parallel_map, parse_feed
+from .doi import resolve_abstracts
+from . import metrics
 
 
 def get_articles(enddate = datetime.date.today(),
@@ -13,13 +14,9 @@ def get_articles(enddate = datetime.date.today(),
 
     Unsupported kwargs are passed on to the article contructor.
     """
-    feeds = []
-    for j in journals:
-        feeds.append(fp.parse("https://www.science.org/action/showFeed?type=etoc&feed=rss&jc="+j))
-
-    articles = []
-
-    for feed in feeds:
+    def journal_entries(j):
+        feed = parse_feed("https://www.science.org/action/showFeed?type=etoc&feed=rss&jc="+j, "science", j)
+        entries = []
         for e in feed.entries:
             published = parsed_datetime(e.updated_parsed)
             if startdate <= published <= enddate and ( "research article" in e.dc_type.lower() or "review" in e.dc_type.lower() ):
@@ -34,11 +31,22 @@ def get_articles(enddate = datetime.date.today(),
                 except AttributeError:
                     authors.append("No authors found")
                     continue
-                url = e.link
-                journal = e.prism_publicationname.strip()
-                try:
-                    summary = abstract_from_doi(e.prism_doi)
-                except:
-                    summary = "No summary or abstract found"
-                articles.append(Article(e.title.replace("\n", "").strip(), url, published, authors, summary, journal, **kwargs))
+                entries.append((e.title.replace("\n", "").strip(), e.link, published, authors,
+                                e.get("prism_doi"), e.prism_publicationname.strip()))
+        return entries
+
+    entries = []
+    for jentries in parallel_map(journal_entries, journals):
+        entries += jentries
+    # the abstracts are not part of the feed, resolve the dois of all journals at once
+    with metrics.span("fetch", "doi"):
+        abstracts = resolve_abstracts([e[4] for e in entries if e[4] is not None])
+
+    articles = []
+    for title, url, published, authors, doi, journal in entries:
+        if doi is None:
+            summary = "No summary or abstract found"
+        else:
+            summary = abstracts.get(doi, "no abstract found for doi:"+doi)
+        articles.append(Article(title, url, published, authors, summary, journal, doi=doi, **kwargs))
     return articles
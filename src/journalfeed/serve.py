@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+import datetime
+import http.server
+import json
+import os
+import signal
+import socketserver
+import stat
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+from .Article import sanitize_articles
+from .config import load_config
+from .dedup import Deduplicator
+from .fetch import describe, fetch_source
+from .state import ArticleIndex
+from .writer import write_digest
+from . import cache
+from . import metrics
+
+# the schedule of sources without one in sources.json (arXiv announces at 20:00 New York time)
+default_refresh = {"aps": 3600, "nature": 7*24*3600, "science": 7*24*3600, "arxiv": "01:30"}
+# an incomplete source is refreshed again after at most retry_after seconds
+retry_after = 900
+
+
+def next_refresh(schedule, now):
+    """
+    The time (seconds since the epoch) of the next refresh after now,
+    schedule is either the seconds between two refreshes or a daily time "HH:MM" (UTC).
+    """
+    if isinstance(schedule, str):
+        hours, minutes = schedule.split(":")
+        at = now - now % (24*3600) + int(hours)*3600 + int(minutes)*60
+        return at if at > now else at + 24*3600
+    return now + schedule
+
+
+def utc(seconds):
+    return None if seconds is None else \
+        datetime.datetime.fromtimestamp(seconds, datetime.timezone.utc).isoformat(timespec="seconds")
+
+
+class Digests:
+    """
+    The sanitized articles of all sources kept in memory, every source is refreshed by its own thread on its schedule
+    (sources["refresh"], see next_refresh) and the digest is only rendered again if an article (or the day) changed.
+    sections lists the (name, source, show_journal) of the digest in order,
+    fetch(source, enddate, startdate) returns the articles and the reason if the source is incomplete (else None),
+    by default with fetch.fetch_source. render_options are passed on to write_digest.
+    """
+    def __init__(self, sources, sections, _filter, preamble, days=7, fetch=None, workers=None, **render_options):
+        self.sources = sources
+        self.sections = sections
+        self.filter = _filter
+        self.preamble = preamble
+        self.days = days
+        self.fetch = fetch or (lambda source, enddate, startdate: fetch_source(sources, source, enddate, startdate))
+        self.workers = workers
+        self.render_options = render_options
+        self.lock = threading.Lock()
+        self.articles = {source: [] for _, source, _ in sections}
+        self.notes = {source: "the source was not fetched yet" for _, source, _ in sections}
+        self.refreshed = {}
+        self.due = {}
+        self.version = 0
+        self.rendered = None
+        self.wake = {source: threading.Event() for _, source, _ in sections}
+        self.stopped = threading.Event()
+        self.threads = []
+
+    def refresh(self, source):
+        """Fetch and sanitize the articles of source, returns whether the source is complete"""
+        enddate = datetime.date.today()
+        # like a single run arxiv looks a day further back, not all articles are announced on the day they are submitted
+        startdate = enddate - datetime.timedelta(days=self.days + (1 if source == "arxiv" else 0))
+        try:
+            with metrics.span("refresh", source):
+                articles, note = self.fetch(source, enddate, startdate)
+                # known articles are not sanitized again
+                index = ArticleIndex()
+                articles = list(index.prepare(articles))
+                sanitize_articles(articles, workers=self.workers)
+                for article in articles:
+                    index.add(article)
+                index.commit()
+                index.prune()
+        except Exception as e:
+            articles, note = [], describe(e)
+            print("Warning "+source+" is incomplete: "+note)
+        metrics.count("refreshes", source=source, complete=note is None)
+        with self.lock:
+            # a refresh that brought nothing keeps the previous articles, the section is still marked as incomplete
+            if note is None or len(articles) > 0:
+                self.articles[source] = articles
+            self.notes[source] = note
+            self.refreshed[source] = time.time()
+            self.version += 1
+        cache.default_cache.prune()
+        return note is None
+
+    def run(self, source):
+        """Refresh source on its schedule (or when woken) until stop"""
+        schedule = self.sources.get("refresh", {}).get(source, default_refresh[source])
+        while not self.stopped.is_set():
+            complete = self.refresh(source)
+            now = time.time()
+            due = next_refresh(schedule, now) if complete else min(next_refresh(schedule, now), now + retry_after)
+            with self.lock:
+                self.due[source] = due
+            self.wake[source].wait(max(0, due - time.time()))
+            self.wake[source].clear()
+
+    def start(self):
+        for _, source, _ in self.sections:
+            thread = threading.Thread(target=self.run, args=(source,), name="refresh-"+source, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self):
+        self.stopped.set()
+        for event in self.wake.values():
+            event.set()
+
+    def refresh_now(self, sources):
+        for source in sources:
+            self.wake[source].set()
+
+    def deduplicated(self):
+        """The sections (name, articles, show_journal), an article of several feeds is only shown once (in the first section)"""
+        for articles in self.articles.values():
+            for article in articles:
+                article.duplicate_of = None
+                article.related = ()
+        dedup = Deduplicator()
+        return [(name, list(dedup.filter(self.articles[source])), show_journal)
+                for name, source, show_journal in self.sections]
+
+    def render(self):
+        """The tex of the digest of the current articles"""
+        enddate = datetime.date.today()
+        with self.lock:
+            if self.rendered is not None and self.rendered[:2] == (self.version, enddate):
+                return self.rendered[2]
+            with metrics.span("render"):
+                notes = {name: self.notes[source] for name, source, _ in self.sections if self.notes[source] is not None}
+                with tempfile.TemporaryDirectory() as tmp:
+                    fname = os.path.join(tmp, "digest.tex")
+                    write_digest(fname, self.deduplicated(), self.filter, self.preamble,
+                                 enddate - datetime.timedelta(days=self.days), enddate, notes=notes,
+                                 **self.render_options)
+                    with open(fname, "r") as f:
+                        tex = f.read()
+            self.rendered = (self.version, enddate, tex)
+            return tex
+
+    def status(self):
+        """The amount of articles, the reason if incomplete and the time of the last and next refresh of every source"""
+        with self.lock:
+            return {source: {"articles": len(self.articles[source]), "incomplete": self.notes[source],
+                             "refreshed": utc(self.refreshed.get(source)), "next_refresh": utc(self.due.get(source))}
+                    for _, source, _ in self.sections}
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    """
+    GET / (or /digest.tex) the digest, /status the state of the sources (json) and /metrics the metrics (Prometheus),
+    POST /refresh (or /refresh/SOURCE) refreshes all sources (or SOURCE) now.
+    """
+    def reply(self, code, body, content_type="text/plain; charset=utf-8"):
+        body = body.encode()
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        digests = self.server.digests
+        path = urlsplit(self.path).path
+        if path in ("/", "/digest.tex"):
+            self.reply(200, digests.render(), "application/x-tex; charset=utf-8")
+        elif path == "/status":
+            self.reply(200, json.dumps(digests.status(), indent=1)+"\n", "application/json")
+        elif path == "/metrics":
+            self.reply(200, metrics.default_metrics.prometheus(), "text/plain; version=0.0.4")
+        else:
+            self.reply(404, "not found\n")
+
+    def do_POST(self):
+        digests = self.server.digests
+        path = urlsplit(self.path).path.rstrip("/")
+        if path == "/refresh":
+            sources = list(digests.wake)
+        elif path.startswith("/refresh/") and path[len("/refresh/"):] in digests.wake:
+            sources = [path[len("/refresh/"):]]
+        else:
+            self.reply(404, "not found\n")
+            return
+        digests.refresh_now(sources)
+        self.reply(202, "refreshing "+", ".join(sources)+"\n")
+
+    def address_string(self):
+        # the clients of a unix socket have no address
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "local"
+
+
+class TCPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+
+class UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(digests, host="127.0.0.1", port=8017, path=None):
+    """The http server of the digests, on the unix socket path if given (a stale socket is replaced)"""
+    if path is not None:
+        if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode):
+            os.unlink(path)
+        server = UnixServer(path, Handler)
+    else:
+        server = TCPServer((host, port), Handler)
+    server.digests = digests
+    return server
+
+
+def serve(args, sections):
+    """Serve the digest of the sections (name, source, show_journal) until interrupted, see journalfeed2tex serve -h"""
+    sources, _filter, preamble = load_config()
+    if args.offline:
+        cache.default_cache.offline = True
+    digests = Digests(sources, sections, _filter, preamble, days=args.timedelta, workers=args.workers,
+                      explain=args.explain, unmatched=args.unmatched, max_unmatched=args.max_unmatched)
+    server = make_server(digests, args.host, args.port, args.socket)
+    digests.start()
+    if args.socket is not None:
+        print("Serving the digest on "+args.socket)
+    else:
+        print("Serving the digest on http://{}:{}/".format(*server.server_address[:2]))
+    # stop cleanly (e.g. remove the socket) on SIGTERM as well
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        digests.stop()
+        server.server_close()
+        if args.socket is not None:
+            os.unlink(args.socket)
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+import datetime
+import gzip
+import json
+import os
+from .Article import Article
+
+format_name = "journalfeed-snapshot"
+format_version = 1
+
+
+def _open(path, mode, compressed):
+    if compressed:
+        return gzip.open(path, mode+"t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def write_snapshot(path, sections, startdate, enddate, notes=None):
+    """
+    Write the sections (name, articles) as JSON Lines (gzip compressed if path ends with .gz).
+    The first line describes the snapshot (format, version, dates, notes on incomplete sections),
+    every further line is an article
+    (see Article.as_dict) with its section and the key of the article it duplicates.
+    The articles may be iterators, the last line repeats the notes, which may have changed while they were consumed.
+    """
+    tmp = str(path)+".tmp"
+    with _open(tmp, "w", str(path).endswith(".gz")) as f:
+        f.write(json.dumps({"format": format_name, "version": format_version,
+                            "startdate": startdate.isoformat(), "enddate": enddate.isoformat(),
+                            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+                            "sections": [name for name, _ in sections], "notes": notes or {}})+"\n")
+        for name, articles in sections:
+            for article in articles:
+                d = article.as_dict()
+                d["section"] = name
+                d["duplicate_of"] = None if article.duplicate_of is None else article.duplicate_of.key
+                f.write(json.dumps(d, ensure_ascii=False)+"\n")
+        f.write(json.dumps({"notes": notes or {}})+"\n")
+    os.replace(tmp, path)
+
+
+def read_snapshot(path):
+    """
+    Read a snapshot written by write_snapshot.
+    Returns the start date, the end date, the sections (name, articles), with the duplicates linked again,
+    and the notes on incomplete sections.
+    """
+    with _open(path, "r", str(path).endswith(".gz")) as f:
+        header = json.loads(f.readline())
+        if header.get("format") != format_name or header.get("version") != format_version:
+            raise ValueError(str(path)+" is not a journalfeed snapshot (version "+str(format_version)+")")
+        sections = {name: [] for name in header["sections"]}
+        notes = header.get("notes", {})
+        articles = {}
+        for line in f:
+            d = json.loads(line)
+            if "section" not in d:
+                # the trailer
+                notes = d["notes"]
+                continue
+            article = Article.from_dict(d)
+            original = articles.get(d["duplicate_of"])
+            if original is not None:
+                article.duplicate_of = original
+                original.add_related(article)
+            articles.setdefault(article.key, article)
+            sections[d["section"]].append(article)
+    return (datetime.date.fromisoformat(header["startdate"]), datetime.date.fromisoformat(header["enddate"]),
+            list(sections.items()), notes)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+import datetime
+import hashlib
+import json
+import sqlite3
+from .config import data_dir
+from . import metrics
+
+
+def raw_hash(article):
+    """The hash of the raw fields of article, e.g. a new arXiv version with a changed abstract has another hash"""
+    raw = json.dumps([article.raw_title, article.raw_authors, article.raw_summary, article.raw_journal])
+    return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+
+class ArticleIndex:
+    """
+    Local index (sqlite in XDG_DATA_HOME/journalfeed) of all articles of previous runs.
+    The articles are stored by Article.key with the hash of their raw fields (see raw_hash), their sanitized fields
+    and the date they were first seen, such that known articles do not need to be sanitized again
+    (or can be skipped entirely). Articles whose raw fields changed since are not known.
+    Articles first seen (and runs) more than max_age days ago are removed by prune.
+    """
+    def __init__(self, path=None, max_age=90):
+        self.max_age = max_age
+        if path is None:
+            path = data_dir() / "articles.sqlite"
+            path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(path))
+        self.db.execute("CREATE TABLE IF NOT EXISTS articles (key TEXT PRIMARY KEY, title TEXT, authors TEXT, "
+                        "summary TEXT, journal TEXT, date TEXT, first_seen TEXT, raw_hash TEXT)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS runs (date TEXT)")
+
+    def last_run(self):
+        """The date of the last recorded run or None"""
+        row = self.db.execute("SELECT max(date) FROM runs").fetchone()
+        return None if row[0] is None else datetime.date.fromisoformat(row[0])
+
+    def record_run(self, date=None):
+        """Record a complete run until date (default today), every date is only recorded once"""
+        date = (date or datetime.date.today()).isoformat()
+        self.db.execute("INSERT INTO runs SELECT ? WHERE NOT EXISTS (SELECT 1 FROM runs WHERE date = ?)", (date, date))
+        self.db.commit()
+
+    def prune(self, today=None):
+        """Remove the articles first seen and the runs (but the last) more than max_age days before today"""
+        cutoff = ((today or datetime.date.today()) - datetime.timedelta(days=self.max_age)).isoformat()
+        pruned = self.db.execute("DELETE FROM articles WHERE first_seen < ?", (cutoff,)).rowcount
+        self.db.execute("DELETE FROM runs WHERE date < ? AND date < (SELECT max(date) FROM runs)", (cutoff,))
+        self.db.commit()
+        metrics.count("articles_pruned", pruned)
+
+    def restore(self, article):
+        """Set the sanitized fields of a known (and unchanged) article, returns whether the article was known."""
+        row = self.db.execute("SELECT title, authors, summary, journal, raw_hash FROM articles WHERE key = ?",
+                              (article.key,)).fetchone()
+        if row is None or row[4] != raw_hash(article):
+            return False
+        if article.ensure_latex:
+            article._title, authors, article._summary, article._journal, _ = row
+            article._authors = None if authors is None else tuple(json.loads(authors))
+        return True
+
+    def prepare(self, articles, skip_known=False):
+        """Restore the sanitized fields of all known articles, or skip them if skip_known"""
+        for article in articles:
+            if not self.restore(article):
+                yield article
+            elif skip_known:
+                metrics.count("articles_dropped", reason="known")
+            else:
+                metrics.count("articles_restored")
+                yield article
+
+    def add(self, article, first_seen=None):
+        """
+        Add the article (with its sanitized fields) if it is not known yet or changed, call commit afterwards.
+        Fields that were not sanitized (e.g. the summary of a duplicate) are not sanitized for the index either,
+        they are sanitized when they are used after restore.
+        """
+        if not article.ensure_latex:
+            return
+        h = raw_hash(article)
+        row = self.db.execute("SELECT raw_hash FROM articles WHERE key = ?", (article.key,)).fetchone()
+        if row is not None and row[0] == h:
+            return
+        authors = None if article._authors is None else json.dumps(article._authors)
+        # a changed article (e.g. a new version) replaces the old one
+        self.db.execute("INSERT OR REPLACE INTO articles VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (article.key, article._title, authors, article._summary,
+                         article._journal, article.date.isoformat(),
+                         (first_seen or datetime.date.today()).isoformat(), h))
+
+    def commit(self):
+        self.db.commit()
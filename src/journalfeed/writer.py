@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+import tempfile
+from pathlib import Path
+from .LaTeX import escape
+from .helpers import batched, parallel_map
+from . import metrics
+
+
+def write_header(file, preamble, startdate, enddate, title="In the Journals", standalone=True):
+    """Write the preamble (if standalone), the title and the date range of a digest"""
+    if standalone:
+        file.write(preamble)
+        file.write("\\begin{document}")
+    file.write("\\title{"+title+"}\n")
+    if startdate.month == enddate.month:
+        file.write("\\newcommand{{\\thedate}}{{{0:%d} to {1:%d %b. %Y}}}\n".format(startdate, enddate))
+    elif startdate.year == enddate.year:
+        file.write("\\newcommand{{\\thedate}}{{{0:%d %b.} to {1:%d %b. %Y}}}\n".format(startdate, enddate))
+    else:
+        file.write("\\newcommand{{\\thedate}}{{{0:%d %b. %Y} to {1:%d %b. %Y}}}\n".format(startdate, enddate))
+    file.write("\\date{\\thedate}\n\n")
+    file.write("\\maketitle\n\n")
+
+
+def copy_spool(spool, file):
+    """Copy the content of spool (see tempfile.SpooledTemporaryFile) to file and close the spool"""
+    spool.seek(0)
+    while True:
+        chunk = spool.read(2**16)
+        if chunk == "":
+            break
+        file.write(chunk)
+    spool.close()
+
+
+class UnmatchedSection:
+    """
+    The entries of the unmatched articles, written at the end of the digest.
+    Articles of the last section are rendered right away into a spool (in memory up to spool_size bytes,
+    afterwards in a temporary file). The articles of earlier sections are kept until the end, as
+    duplicates in a later section still add links to them (see dedup).
+    At most max_articles entries are written, with show_summary=False only title, authors and date.
+    """
+    def __init__(self, max_articles=None, show_summary=True, spool_size=2**20):
+        self.max_articles = max_articles
+        self.show_summary = show_summary
+        self.pending = []
+        self.spool = tempfile.SpooledTemporaryFile(max_size=spool_size, mode="w+", encoding="utf-8")
+        self.spooled = 0
+        self.omitted = 0
+
+    def full(self):
+        return self.max_articles is not None and len(self.pending) + self.spooled >= self.max_articles
+
+    def add(self, article, final=False):
+        """Add an unmatched article, final if no later article can be a duplicate of it (i.e. in the last section)"""
+        if self.full():
+            self.omitted += 1
+        elif not final:
+            self.pending.append(article)
+        else:
+            with metrics.span("write", "Unmatched"):
+                self.spool.write(article.latex(show_journal=True, show_summary=self.show_summary))
+            self.spooled += 1
+
+    def __len__(self):
+        return len(self.pending) + self.spooled + self.omitted
+
+    def write(self, file):
+        """Write the entries (the pending articles and the spool) to file"""
+        with metrics.span("write", "Unmatched"):
+            for article in self.pending:
+                file.write(article.latex(show_journal=True, show_summary=self.show_summary))
+            copy_spool(self.spool, file)
+            if self.omitted > 0:
+                file.write("\\par{\\itshape "+str(self.omitted)+" more unmatched articles are not shown.}\n")
+        metrics.count("articles_omitted", self.omitted)
+
+
+class Digest:
+    """
+    A digest that is being written to fname, see write_digests for the arguments.
+    The sections are started and ended one after the other and their articles are added in batches,
+    such that several digests can be written in a single pass over the articles.
+    Like the unmatched articles (see UnmatchedSection) the entries of the last section are rendered right away
+    into a spool, those of earlier sections are kept until close, as later duplicates still add links to them.
+    """
+    def __init__(self, fname, _filter, preamble, startdate, enddate, explain=False, unmatched="full",
+                 max_unmatched=None, standalone=True, profile="", spool_size=2**20):
+        self.filter = _filter
+        self.preamble = preamble
+        self.startdate = startdate
+        self.enddate = enddate
+        self.explain = explain
+        self.unmatched = unmatched
+        self.standalone = standalone
+        self.profile = profile
+        self.files = [fname]
+        self.unmatched_fname = None
+        if unmatched == "separate":
+            self.unmatched_fname = str(Path(fname).with_name(Path(fname).stem+"-unmatched.tex"))
+            self.files.append(self.unmatched_fname)
+        self.file = open(fname, "w")
+        write_header(self.file, preamble, startdate, enddate, standalone=standalone)
+        # the text and the (article, show_journal, reason) entries of the earlier sections
+        self.pending = []
+        self.spool = tempfile.SpooledTemporaryFile(max_size=spool_size, mode="w+", encoding="utf-8")
+        self.final = False
+        # the unmatched articles are spooled (or dropped) while the sections are written
+        self.unmatched_section = UnmatchedSection(max_articles=0 if unmatched == "omit" else max_unmatched,
+                                                  show_summary=unmatched != "titles", spool_size=spool_size)
+
+    def write(self, entry):
+        """Write a text or an (article, show_journal, reason) entry of the current section"""
+        if not self.final:
+            self.pending.append(entry)
+        elif isinstance(entry, str):
+            self.spool.write(entry)
+        else:
+            self.spool.write(entry[0].latex(show_journal=entry[1], reason=entry[2]))
+
+    def note(self, reason):
+        self.write("\\par{\\itshape This section is incomplete, "+escape(reason)+".}\n")
+
+    def start_section(self, name, reason=None, final=False):
+        """Start the section name, final if it is the last section (no later article can be a duplicate)"""
+        self.final = final
+        self.write("\\section{"+name+"}\n")
+        if reason is not None:
+            self.note(reason)
+
+    def add(self, name, articles, show_journal):
+        """Add the articles of section name"""
+        for article in articles:
+            with metrics.span("filter", name):
+                reason = self.filter.match(article)
+            if reason is not None:
+                metrics.count("articles_matched", section=name, profile=self.profile)
+                with metrics.span("write", name):
+                    self.write((article, show_journal(article), reason if self.explain else None))
+            else:
+                metrics.count("articles_unmatched", section=name, profile=self.profile)
+                self.unmatched_section.add(article, final=self.final)
+
+    def end_section(self, reason=None):
+        """End the section, reason is shown if the section became incomplete while it was written"""
+        if reason is not None:
+            self.note(reason)
+        self.write("\\clearpage\n")
+
+    def close(self):
+        """Write the sections and the unmatched articles and close the digest, returns the list of written files"""
+        with self.file as file:
+            with metrics.span("write", "Sections"):
+                for entry in self.pending:
+                    file.write(entry if isinstance(entry, str) else
+                               entry[0].latex(show_journal=entry[1], reason=entry[2]))
+                copy_spool(self.spool, file)
+            if self.unmatched_fname is not None:
+                file.write("\\section{Unmatched Articles}\n")
+                file.write(str(len(self.unmatched_section))+" articles, see \\texttt{"
+                           +escape(Path(self.unmatched_fname).name)+"}.\n")
+                with open(self.unmatched_fname, "w") as unmatched_file:
+                    write_header(unmatched_file, self.preamble, self.startdate, self.enddate,
+                                 title="Unmatched Articles", standalone=self.standalone)
+                    self.unmatched_section.write(unmatched_file)
+                    if self.standalone:
+                        unmatched_file.write("\\end{document}")
+            elif self.unmatched != "omit":
+                file.write("\\section{Unmatched Articles}\n")
+                self.unmatched_section.write(file)
+            else:
+                self.unmatched_section.spool.close()
+            if self.standalone:
+                file.write("\\end{document}")
+        return self.files
+
+
+def write_digests(digests, sections, notes=None, batch_size=256):
+    """
+    Write the sections (name, articles, show_journal) to all digests (see Digest) in a single pass,
+    the articles of a section may be an iterator (e.g. the arxiv articles while they are fetched)
+    and are passed to the digests (in parallel threads) in batches of batch_size.
+    The articles should be deduplicated and sanitized already (they are shared by the digests),
+    the matched articles are shown in their section (with the reason if explain) and the others at the end,
+    depending on unmatched: "full", "titles", "separate" (in fname-unmatched.tex) or "omit".
+    notes maps the names of incomplete sections to the reason, which is shown at the start of the section,
+    or at its end if the section became incomplete while it was written.
+    Returns the list of written files.
+    """
+    notes = {} if notes is None else notes
+    for i, (name, articles, show_journal) in enumerate(sections):
+        reason = notes.get(name)
+        for digest in digests:
+            digest.start_section(name, reason, final=i == len(sections) - 1)
+        for batch in batched(articles, batch_size):
+            parallel_map(lambda digest: digest.add(name, batch, show_journal), digests)
+        late = notes.get(name) if reason is None else None
+        for digest in digests:
+            digest.end_section(late)
+    return [f for digest in digests for f in digest.close()]
+
+
+def write_digest(fname, sections, _filter, preamble, startdate, enddate, explain=False, unmatched="full",
+                 max_unmatched=None, standalone=True, profile="", notes=None):
+    """Write the digest of the sections to fname, see write_digests, returns the list of written files"""
+    return write_digests([Digest(fname, _filter, preamble, startdate, enddate, explain=explain, unmatched=unmatched,
+                                 max_unmatched=max_unmatched, standalone=standalone, profile=profile)],
+                         sections, notes)
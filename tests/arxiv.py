@@ -0,0 +1,105 @@
+import pytest
+# run with pytest -q ./tests/arxiv.py from project dir
+# NOTE test functions must start with test, class with Test to be detected
+
+# incase the module is not in the loadpath try to load it
+try:
+    import sys
+    sys.path.append("..")
+    from src import *
+except ImportError:
+    print("Could not load local module, continuing")
+
+import journalfeed.arxiv as arxiv
+import journalfeed.cache as cache
+import journalfeed.client as client
+import journalfeed.resilience as resilience
+import datetime
+import requests
+import types
+from urllib.parse import urlsplit, parse_qs
+
+enddate = datetime.date(2024, 1, 15)
+startdate = datetime.date(2024, 1, 7)
+
+def page(total, start, dates):
+    """An Atom page of the arXiv API with total results and one entry per date"""
+    entries = "".join("""
+  <entry>
+    <id>http://arxiv.org/abs/2401.{0:05d}v1</id>
+    <published>{1}T12:00:00Z</published>
+    <title>Article {0}</title>
+    <summary>A summary</summary>
+    <author><name>Alice Smith</name></author>
+    <link href="http://arxiv.org/abs/2401.{0:05d}v1" rel="alternate" type="text/html"/>
+  </entry>""".format(start+i, date.isoformat()) for i, date in enumerate(dates))
+    return ("""<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom">
+  <title>ArXiv Query</title>
+  <opensearch:totalResults xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/">{}</opensearch:totalResults>{}
+</feed>""".format(total, entries)).encode()
+
+class API():
+    """Answers the queries with the pages of responses[start], one after the other (the last one is repeated)"""
+    def __init__(self, responses):
+        self.responses = responses
+        self.starts = []
+    def __call__(self, url, headers=None, timeout=None):
+        start = int(parse_qs(urlsplit(url).query)["start"][0])
+        self.starts.append(start)
+        responses = self.responses[start]
+        content = responses.pop(0) if len(responses) > 1 else responses[0]
+        if isinstance(content, Exception):
+            raise content
+        return types.SimpleNamespace(status_code=200, content=content, headers={}, raise_for_status=lambda: None)
+
+@pytest.fixture
+def api(monkeypatch, tmp_path):
+    """Patch client.get with an API of the given responses, without pauses between the requests and retries"""
+    monkeypatch.setattr(cache, "default_cache", cache.HTTPCache(tmp_path / "http"))
+    monkeypatch.setattr(cache, "_host_slots", {})
+    monkeypatch.setattr(cache, "host_limits", {})
+    monkeypatch.setattr(resilience, "default_breaker", resilience.CircuitBreaker())
+    monkeypatch.setattr(arxiv, "jittered_backoff", lambda *args: 0.)
+    resilience.default_failures.pop("arxiv")
+    def patch(responses):
+        api = API(responses)
+        monkeypatch.setattr(client, "get", api)
+        return api
+    return patch
+
+class TestIterArticles():
+    def test_paging(self, api):
+        days = [enddate - datetime.timedelta(days=1+i//40) for i in range(250)]
+        patched = api({0: [page(250, 0, days[:100])], 100: [page(250, 100, days[100:200])],
+                       200: [page(250, 200, days[200:])]})
+        articles = list(arxiv.iter_articles(enddate, startdate, query="cat:quant-ph"))
+        assert [a.raw_title for a in articles] == ["Article {}".format(i) for i in range(250)]
+        # the pages are planned from the total results of the first page
+        assert patched.starts == [0, 100, 200]
+    def test_stop_at_startdate(self, api):
+        # the articles are sorted by date, the third page reaches before startdate
+        days = [enddate - datetime.timedelta(days=1+i//30) for i in range(300)]
+        patched = api({0: [page(1000, 0, days[:100])], 100: [page(1000, 100, days[100:200])],
+                       200: [page(1000, 200, days[200:])], 300: [page(1000, 300, days[:100])]})
+        articles = list(arxiv.iter_articles(enddate, startdate, query="cat:quant-ph"))
+        assert all(a.date >= startdate for a in articles) and len(articles) == 240
+        assert patched.starts == [0, 100, 200]
+    def test_retry_empty_pages(self, api):
+        days = [enddate - datetime.timedelta(days=1)]*100
+        # the api sometimes answers with an empty page
+        patched = api({0: [page(0, 0, []), page(0, 0, []), page(120, 0, days)],
+                       100: [page(120, 100, []), page(120, 100, days[:20])]})
+        articles = list(arxiv.iter_articles(enddate, startdate, query="cat:quant-ph"))
+        assert len(articles) == 120
+        assert patched.starts == [0, 0, 0, 100, 100]
+    def test_retries_exhausted(self, api):
+        patched = api({0: [page(0, 0, [])]})
+        # there really are no results
+        assert list(arxiv.iter_articles(enddate, startdate, query="cat:quant-ph", retries=2)) == []
+        assert patched.starts == [0, 0, 0]
+        patched = api({0: [requests.ConnectionError("unreachable")]})
+        # the error of the last request is raised (a query that is not cached)
+        with pytest.raises(requests.ConnectionError):
+            list(arxiv.iter_articles(enddate, startdate, query="cat:cond-mat*", retries=2))
+        assert patched.starts == [0, 0, 0]
@@ -0,0 +1,161 @@
+import pytest
+# run with pytest -q ./tests/cache.py from project dir
+# NOTE test functions must start with test, class with Test to be detected
+
+# incase the module is not in the loadpath try to load it
+try:
+    import sys
+    sys.path.append("..")
+    from src import *
+except ImportError:
+    print("Could not load local module, continuing")
+
+import journalfeed.cache as cache
+import journalfeed.fetch as fetch
+import journalfeed.resilience as resilience
+from journalfeed.cache import CacheMiss, HostSlot, HTTPCache
+import http.server
+import requests
+import socketserver
+import threading
+import time
+import types
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    """
+    Serves /etag (with an ETag) and /modified (with Last-Modified), answers conditional requests with 304,
+    /down is unavailable (503)
+    """
+    protocol_version = "HTTP/1.1"
+    requests = []
+    def do_GET(self):
+        Handler.requests.append((self.path, self.headers.get("If-None-Match"), self.headers.get("If-Modified-Since")))
+        if self.path == "/down":
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.path == "/etag" and self.headers.get("If-None-Match") == '"v1"' or \
+           self.path == "/modified" and self.headers.get("If-Modified-Since") == "Mon, 01 Jan 2024 00:00:00 GMT":
+            self.send_response(304)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = ("body of "+self.path).encode()
+        self.send_response(200)
+        if self.path == "/etag":
+            self.send_header("ETag", '"v1"')
+        elif self.path == "/modified":
+            self.send_header("Last-Modified", "Mon, 01 Jan 2024 00:00:00 GMT")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    def log_message(self, *args):
+        pass
+
+class Server(socketserver.ThreadingTCPServer):
+    # the shared client keeps its connections open
+    daemon_threads = True
+    block_on_close = False
+
+@pytest.fixture
+def server(monkeypatch):
+    Handler.requests = []
+    # the failures of other tests do not open the circuit
+    monkeypatch.setattr(resilience, "default_breaker", resilience.CircuitBreaker())
+    with Server(("127.0.0.1", 0), Handler) as s:
+        threading.Thread(target=s.serve_forever, daemon=True).start()
+        yield "http://127.0.0.1:{}".format(s.server_address[1])
+        s.shutdown()
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A fake clock for the cache module, sleeping advances it at once"""
+    now = [1000.]
+    def sleep(seconds):
+        now[0] += seconds
+    clock = types.SimpleNamespace(monotonic=lambda: now[0], time=lambda: now[0], sleep=sleep, now=now)
+    monkeypatch.setattr(cache, "time", clock)
+    return clock
+
+class TestHTTPCache():
+    @pytest.mark.parametrize("path", ["/etag", "/modified"])
+    def test_conditional_requests(self, tmp_path, server, path):
+        http_cache = HTTPCache(tmp_path)
+        assert http_cache.get(server+path) == ("body of "+path).encode()
+        # the second request is answered with 304 and the cached body is used
+        assert http_cache.get(server+path) == ("body of "+path).encode()
+        first, second = Handler.requests
+        assert first[1:] == (None, None)
+        if path == "/etag":
+            assert second[1:] == ('"v1"', None)
+        else:
+            assert second[1:] == (None, "Mon, 01 Jan 2024 00:00:00 GMT")
+    def test_fresh_entries_are_not_revalidated(self, tmp_path, server):
+        http_cache = HTTPCache(tmp_path)
+        http_cache.get(server+"/etag")
+        assert http_cache.get(server+"/etag", max_stale=60) == b"body of /etag"
+        assert len(Handler.requests) == 1
+    def test_offline(self, tmp_path, server):
+        http_cache = HTTPCache(tmp_path)
+        http_cache.get(server+"/etag")
+        http_cache.offline = True
+        assert http_cache.get(server+"/etag") == b"body of /etag"
+        with pytest.raises(CacheMiss):
+            http_cache.get(server+"/other")
+        # neither request reached the server
+        assert len(Handler.requests) == 1
+    def test_stale_on_server_error(self, tmp_path, server):
+        http_cache = HTTPCache(tmp_path)
+        resilience.default_failures.pop("aps")
+        with pytest.raises(requests.HTTPError):
+            http_cache.get(server+"/down", source="aps")
+        # an old response is served (and the source marked) while the server is down
+        http_cache._store(server+"/down", {}, {"url": server+"/down", "stored": 0}, b"old body")
+        assert http_cache.get(server+"/down", source="aps") == b"old body"
+        error = resilience.default_failures.pop("aps")
+        assert isinstance(error, resilience.StaleResponse) and "status 503" in str(error)
+        assert fetch.describe(error) == "the source failed, older cached responses are shown"
+        assert len(Handler.requests) == 2
+    def test_prune(self, tmp_path, clock):
+        http_cache = HTTPCache(tmp_path, max_size=250, max_age=100)
+        for i, stored in enumerate([850., 950., 960., 970.]):
+            http_cache._store("https://example.org/{}".format(i), {}, {"stored": stored}, b"x"*100)
+        http_cache.prune()
+        # the first entry is too old, the second is evicted as the cache is too large
+        assert [http_cache._load("https://example.org/{}".format(i), {})[1] is not None for i in range(4)] == \
+            [False, False, True, True]
+        assert len(list(tmp_path.glob("*.body"))) == 2
+
+class TestHostSlot():
+    def test_connections(self):
+        slot = HostSlot(2, 0.)
+        active = []
+        most = []
+        lock = threading.Lock()
+        def request():
+            with slot:
+                with lock:
+                    active.append(1)
+                    most.append(len(active))
+                time.sleep(0.05)
+                with lock:
+                    active.pop()
+        threads = [threading.Thread(target=request) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert max(most) == 2
+    def test_arxiv_pacing(self, monkeypatch, clock):
+        monkeypatch.setattr(cache, "_host_slots", {})
+        slot = cache.host_slot("http://export.arxiv.org/api/query?search_query=all")
+        assert slot is cache.host_slot("http://export.arxiv.org/api/query?start=100")
+        assert cache.host_slot("https://journals.aps.org/rss/recent/prb.xml").interval == 0
+        starts = []
+        for _ in range(3):
+            with slot:
+                starts.append(clock.now[0])
+                clock.now[0] += 0.5
+        # every request starts 3 seconds after the previous one ended
+        assert starts == [1000., 1003.5, 1007.]
@@ -0,0 +1,61 @@
+import pytest
+# run with pytest -q ./tests/client.py from project dir
+# NOTE test functions must start with test, class with Test to be detected
+
+# incase the module is not in the loadpath try to load it
+try:
+    import sys
+    sys.path.append("..")
+    from src import *
+except ImportError:
+    print("Could not load local module, continuing")
+
+from journalfeed.client import Client
+import gzip
+import http.server
+import requests
+import socketserver
+import threading
+import time
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    connections = set()
+    def do_GET(self):
+        Handler.connections.add(self.client_address)
+        if self.path == "/slow":
+            time.sleep(1)
+        body = gzip.compress(b"<rss/>")
+        self.send_response(200)
+        self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except BrokenPipeError:
+            pass
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    Handler.connections = set()
+    with socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler) as s:
+        threading.Thread(target=s.serve_forever, daemon=True).start()
+        yield "http://127.0.0.1:{}/".format(s.server_address[1])
+        s.shutdown()
+
+class TestClient():
+    def test_keep_alive_and_compression(self, server):
+        client = Client()
+        for _ in range(3):
+            response = client.get(server)
+            assert response.content == b"<rss/>"
+        assert "gzip" in response.request.headers["Accept-Encoding"]
+        assert len(Handler.connections) == 1
+        client.close()
+    def test_timeout(self, server):
+        client = Client(timeout=(1, 0.2))
+        with pytest.raises(requests.Timeout):
+            client.get(server+"slow")
+        client.close()
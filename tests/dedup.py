@@ -0,0 +1,68 @@
+import pytest
+# run with pytest -q ./tests/dedup.py from project dir
+# NOTE test functions must start with test, class with Test to be detected
+
+# incase the module is not in the loadpath try to load it
+try:
+    import sys
+    sys.path.append("..")
+    from src import *
+except ImportError:
+    print("Could not load local module, continuing")
+
+from journalfeed.Article import Article
+from journalfeed.dedup import Deduplicator, author_names, normalized_title
+import datetime
+
+def article(title, url, journal="arXiv", authors=("Alice Smith", "Bob Jones"), doi=None):
+    return Article(title, url, datetime.date(2024, 1, 1), list(authors), "A summary", journal, doi=doi)
+
+class TestDeduplicator():
+    def test_normalized(self):
+        assert normalized_title("Spin <i>qubits</i> in \\emph{silicon}!") == "spinqubitsinemphsilicon"
+        # the greek letters are part of the title
+        assert normalized_title("Phase of $\\alpha$-RuCl3") == "phaseofalpharucl3"
+        assert normalized_title("Phase of $\\alpha$-RuCl3") != normalized_title("Phase of $\\beta$-RuCl3")
+        assert author_names(["A. Smith", "Bob Jones-Miller", ""]) == frozenset(["smith", "jones-miller"])
+    def test_doi(self):
+        dedup = Deduplicator()
+        weekly = article("Spin qubits", "https://www.nature.com/articles/x", "Nature Physics", doi="10.1038/X")
+        monthly = article("Spin qubits (monthly)", "https://www.nature.com/articles/x?monthly", "Nature Physics",
+                          doi="10.1038/x")
+        # the same doi (case insensitive) is dropped
+        assert list(dedup.filter([weekly, monthly])) == [weekly]
+    def test_arxiv_versions(self):
+        dedup = Deduplicator()
+        v1 = article("Spin qubits", "http://arxiv.org/abs/2401.00001v1")
+        v2 = article("Spin qubits, revised", "http://export.arxiv.org/abs/2401.00001v2")
+        assert list(dedup.filter([v1, v2])) == [v1]
+    def test_title_and_names(self):
+        dedup = Deduplicator()
+        published = article("Spin $\\alpha$ qubits", "https://journals.aps.org/prl/x", "PRL", doi="10.1103/X")
+        preprint = article("Spin $\\alpha$ Qubits.", "http://arxiv.org/abs/2401.00001v2", authors=["B. Jones", "A. Smith"])
+        other_authors = article("Spin $\\alpha$ qubits", "http://arxiv.org/abs/2401.00002v1", authors=["Carol White"])
+        assert list(dedup.filter([published])) == [published]
+        assert list(dedup.filter([preprint, other_authors])) == [preprint, other_authors]
+        # the preprint is shown once (with the published version) and linked from the published version
+        assert preprint.duplicate_of is published and other_authors.duplicate_of is None
+        assert published.related == (preprint,)
+        assert dedup.title_key(preprint) == ("spinalphaqubits", frozenset(["smith", "jones"]))
+    def test_different_commands(self):
+        dedup = Deduplicator()
+        alpha = article("Phase of $\\alpha$-RuCl3", "http://arxiv.org/abs/2401.00001v1")
+        beta = article("Phase of $\\beta$-RuCl3", "http://arxiv.org/abs/2401.00002v1")
+        assert list(dedup.filter([alpha, beta])) == [alpha, beta]
+    def test_related(self):
+        dedup = Deduplicator()
+        published = article("Spin qubits", "https://journals.aps.org/prl/x", "PRL")
+        preprint = article("Spin qubits", "http://arxiv.org/abs/2401.00001v1")
+        other = article("Spin qubits", "https://www.science.org/doi/x", "Science")
+        assert list(dedup.filter([published, preprint, other])) == [published, preprint, other]
+        assert published.related == (preprint, other)
+        assert "Also in" in published.latex(show_journal=True)
+    def test_no_title_key(self):
+        dedup = Deduplicator()
+        anonymous = [article("Editorial", "https://example.org/{}".format(i), authors=[]) for i in range(2)]
+        # without authors articles are only deduplicated by their key
+        assert list(dedup.filter(anonymous)) == anonymous
+        assert all(a.duplicate_of is None for a in anonymous)
@@ -0,0 +1,82 @@
+import pytest
+# run with pytest -q ./tests/doi.py from project dir
+# NOTE test functions must start with test, class with Test to be detected
+
+# incase the module is not in the loadpath try to load it
+try:
+    import sys
+    sys.path.append("..")
+    from src import *
+except ImportError:
+    print("Could not load local module, continuing")
+
+import journalfeed.cache as cache
+import journalfeed.doi as doi
+import journalfeed.resilience as resilience
+from journalfeed.doi import AbstractStore, resolve_abstracts
+import requests
+import types
+
+class DOIs():
+    """Stands in for fetch_abstract, counts the requests per doi"""
+    def __init__(self, abstracts):
+        self.abstracts = abstracts
+        self.requests = []
+    def __call__(self, d, session=None):
+        self.requests.append(d)
+        abstract = self.abstracts.get(d)
+        if isinstance(abstract, Exception):
+            raise abstract
+        return abstract
+
+@pytest.fixture
+def fetched(monkeypatch):
+    monkeypatch.setattr(doi, "default_cache", cache.HTTPCache(offline=False))
+    resilience.default_failures.pop("science")
+    def patch(abstracts):
+        dois = DOIs(abstracts)
+        monkeypatch.setattr(doi, "fetch_abstract", dois)
+        return dois
+    return patch
+
+class TestAbstracts():
+    def test_store_hit(self, tmp_path, fetched):
+        dois = fetched({})
+        AbstractStore(tmp_path / "abstracts.json").update({"10.1/a": "Known"})
+        # the store is read from disk again
+        assert resolve_abstracts(["10.1/a"], store=AbstractStore(tmp_path / "abstracts.json")) == {"10.1/a": "Known"}
+        assert dois.requests == []
+    def test_miss(self, tmp_path, fetched):
+        dois = fetched({"10.1/a": "Fetched"})
+        store = AbstractStore(tmp_path / "abstracts.json")
+        assert resolve_abstracts(["10.1/a", "10.1/a"], store=store) == {"10.1/a": "Fetched"}
+        assert resolve_abstracts(["10.1/a"], store=store) == {"10.1/a": "Fetched"}
+        assert dois.requests == ["10.1/a"]
+        assert AbstractStore(tmp_path / "abstracts.json").get("10.1/a") == "Fetched"
+    def test_negative_entries(self, tmp_path, fetched):
+        dois = fetched({"10.1/a": None, "10.1/b": requests.ConnectionError("unreachable")})
+        store = AbstractStore(tmp_path / "abstracts.json")
+        assert resolve_abstracts(["10.1/a", "10.1/b"], store=store) == {}
+        # the doi without abstract is not fetched again, the failed request is
+        assert resolve_abstracts(["10.1/a", "10.1/b"], store=AbstractStore(tmp_path / "abstracts.json")) == {}
+        assert sorted(dois.requests) == ["10.1/a", "10.1/b", "10.1/b"]
+        assert store.get("10.1/a") is None and store.missing("10.1/a") and not store.missing("10.1/b")
+        # the science section is marked as incomplete
+        assert isinstance(resilience.default_failures.pop("science"), requests.ConnectionError)
+        # until the negative entry expires
+        expired = AbstractStore(tmp_path / "abstracts.json", missing_ttl=0)
+        assert not expired.missing("10.1/a")
+        dois.abstracts["10.1/a"] = "Added later"
+        assert resolve_abstracts(["10.1/a"], store=expired) == {"10.1/a": "Added later"}
+        assert AbstractStore(tmp_path / "abstracts.json").get("10.1/a") == "Added later"
+    @pytest.mark.parametrize("status", [404, 410])
+    def test_unknown_doi(self, status):
+        response = types.SimpleNamespace(status_code=status, content=b"", json=lambda: {})
+        def raise_for_status():
+            raise requests.HTTPError(str(status))
+        response.raise_for_status = raise_for_status
+        # like a record without abstract, not a failed request
+        assert doi.fetch_abstract("10.1/unknown", types.SimpleNamespace(get=lambda url, headers: response)) is None
+        response.status_code = 503
+        with pytest.raises(requests.HTTPError):
+            doi.fetch_abstract("10.1/unknown", types.SimpleNamespace(get=lambda url, headers: response))
@@ -1,6 +1,8 @@
 import pytest
 import time
 # run with pytest -q ./tests/elc.py from project dir
+# the arXiv tests read responses of the API from tests/fixtures/arxiv and run offline,
+# the abstracts are shortened to the part a test checks
 # NOTE test functions must start with test, class with Test to be detected
 
 # incase the module is not in the loadpath try to load it
@@ -8,16 +10,38 @@ try:
     import sys
     sys.path.append("..")
     from src import *
-except:
+except ImportError:
     print("Could not load local module, continuing")
 
 from journalfeed.LaTeX import *
 from journalfeed.config import load_config
+from journalfeed.Article import Article, sanitize_articles
+from journalfeed.dedup import Deduplicator
+import journalfeed.Article as article_module
+import journalfeed.LaTeX as LaTeX
 import journalfeed.arxiv as arxiv
+import journalfeed.cache as cache
 import journalfeed.nature as nature
 import journalfeed.science as science
 import journalfeed.aps as aps
 import datetime
+import json
+import random
+import re
+from pathlib import Path
+
+@pytest.fixture(autouse=True)
+def recorded_arxiv(tmp_path, monkeypatch):
+    """Answer the queries of the arXiv API from tests/fixtures/arxiv (<id>.atom), no request is made"""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    monkeypatch.setenv("XDG_DATA_HOME", str(tmp_path / "data"))
+    http_cache = cache.HTTPCache(tmp_path / "http", offline=True)
+    for path in (Path(__file__).parent / "fixtures" / "arxiv").glob("*.atom"):
+        # the dates are not part of queries by id
+        url = arxiv.query_url(0, None, None, "", path.stem)
+        http_cache._store(url, {}, {"url": url, "etag": None, "last_modified": None, "stored": time.time()},
+                          path.read_bytes())
+    monkeypatch.setattr(cache, "default_cache", http_cache)
 
 def arxiv_article(aid, el=True):
     return arxiv.get_articles(query="", id_list=aid, ensure_latex=el)[0]
@@ -83,6 +107,99 @@ class TestMathEnvironment():
         assert "^{\\frac{2(1-γ)}γ}" in summary
 
 
+class TestReferenceCorpus():
+    def test_output_unchanged(self):
+        # outputs of elc before the rule tables were precompiled in the Sanitizer
+        with (Path(__file__).parent / "fixtures" / "elc_corpus.json").open("r") as f:
+            corpus = json.load(f)
+        for entry in corpus:
+            assert elc(entry["input"]) == entry["output"]
+    def test_custom_tables(self):
+        assert elc("a cite{x} b", general_sub=[]) == "a cite{x} b"
+        assert elc("a cite{x} b") == "a [x] b"
+    def test_batch(self):
+        with (Path(__file__).parent / "fixtures" / "elc_corpus.json").open("r") as f:
+            corpus = json.load(f)
+        strings = [entry["input"] for entry in corpus]
+        expected = [entry["output"] for entry in corpus]
+        assert elc_batch(strings, workers=1) == expected
+        assert elc_batch(strings, workers=2, chunksize=5, min_batch=0) == expected
+    def test_shared_pool(self):
+        with (Path(__file__).parent / "fixtures" / "elc_corpus.json").open("r") as f:
+            corpus = json.load(f)
+        strings = [entry["input"] for entry in corpus]
+        pool = process_pool(2)
+        assert pool._mp_context.get_start_method() == "forkserver"
+        # all batches of a run are sanitized by the same processes
+        assert elc_batch(strings[:20], chunksize=5, min_batch=0, pool=pool) == [entry["output"] for entry in corpus[:20]]
+        processes = set(pool._processes)
+        assert elc_batch(strings[20:], chunksize=5, min_batch=0, pool=pool) == [entry["output"] for entry in corpus[20:]]
+        assert set(pool._processes) == processes
+        pool.shutdown()
+        assert process_pool(1) is None
+    def test_sanitize_articles(self):
+        articles = [Article(entry["input"], "https://example.org", datetime.date(2024, 1, 1), [entry["input"], "A. Smith"],
+                            entry["input"], "arXiv") for entry in json.load((Path(__file__).parent / "fixtures" / "elc_corpus.json").open("r"))]
+        sanitize_articles(articles, workers=2, min_batch=0)
+        for article in articles:
+            assert article.title == article.summary == article.authors[0] == elc(article.raw_title)
+    def test_lazy_sanitization(self, monkeypatch):
+        calls = []
+        def counting(s):
+            calls.append(s)
+            return s.upper()
+        # both the single strings and the batches are sanitized by the patched sanitizer
+        monkeypatch.setattr(article_module, "elc", counting)
+        monkeypatch.setattr(LaTeX, "default_sanitizer", counting)
+        def article(title, url, journal):
+            return Article(title, url, datetime.date(2024, 1, 1), ["A. Smith"], "summary of "+title, journal)
+        published = article("Spin qubits", "https://journals.aps.org/prl/x", "PRL")
+        preprint = article("Spin qubits", "http://arxiv.org/abs/2401.00001v1", "arXiv")
+        other = article("Other", "http://arxiv.org/abs/2401.00002v1", "arXiv")
+        articles = list(Deduplicator().filter([published, preprint, other]))
+        assert calls == []
+        # on first access, once
+        assert published.title == published.title == "SPIN QUBITS"
+        assert calls == ["Spin qubits"]
+        sanitize_articles(articles, workers=1)
+        # the title of the published article is kept, the summary of the duplicate is never shown
+        assert sorted(calls) == sorted(["Spin qubits", "A. Smith", "summary of Spin qubits", "PRL",
+                                        "Spin qubits", "A. Smith", "arXiv",
+                                        "Other", "A. Smith", "summary of Other", "arXiv"])
+        published.latex(show_journal=True)
+        assert preprint._summary is None and calls.count("summary of Spin qubits") == 1
+
+class TestMathScanner():
+    # the regular expression find_all_math replaced, it backtracks on unclosed environments
+    legacy_regex = re.compile("("+"|".join([
+        "(\\\\begin\\{(?P<env>equation|align)\\*?\\})(.+?)(\\\\end\\{(?P=env)\\*?\\})",
+        "(\\\\\\[)((?:.(?!\\\\\\]))*.)(\\\\\\])", "(\\\\\\()((?:.(?!\\\\\\)))*.)(\\\\\\))",
+        "(\\$\\$)([^\\$]+)(\\$\\$)", "(\\$)([^\\$]+)(\\$)"])+")", flags=re.DOTALL)
+    def legacy_find_all_math(self, s):
+        return [[j for j in m if j != ""][:2]+[j for j in m if j != ""][-2:] for m in self.legacy_regex.findall(s)]
+    def test_same_as_regex(self):
+        random.seed(0)
+        tokens = ["$", "$$", "\\[", "\\]", "\\(", "\\)", "{", "}", "a", " ", "\n", "\\begin{equation}",
+                  "\\end{equation}", "\\begin{align*}", "\\end{align}", "\\end{align*}", "\\end{equation*}"]
+        for _ in range(5000):
+            s = "".join(random.choice(tokens) for _ in range(random.randint(0, 20)))
+            assert find_all_math(s) == self.legacy_find_all_math(s), s
+    def test_environments(self):
+        s = "$a$ $$b$$ \\[c\\] \\(d\\) \\begin{align*}e\\end{align} $$ $f"
+        assert find_all_math(s) == [["$a$", "$", "a", "$"], ["$$b$$", "$$", "b", "$$"], ["\\[c\\]", "\\[", "c", "\\]"],
+                                    ["\\(d\\)", "\\(", "d", "\\)"],
+                                    ["\\begin{align*}e\\end{align}", "\\begin{align*}", "e", "\\end{align}"], ["$ $", "$", " ", "$"]]
+    def test_unclosed(self):
+        s = "\\[ a " * 20000 + "$x$"
+        start = time.perf_counter()
+        assert find_all_math(s) == [["$x$", "$", "x", "$"]]
+        # the regex needs seconds for this
+        assert time.perf_counter() - start < 0.5
+    def test_curly_brace_balance(self):
+        assert curly_brace_balance("{a{b}c}\\{d\\}") and curly_brace_balance("no braces")
+        assert not curly_brace_balance("}{") and not curly_brace_balance("{{}")
+        assert not curly_brace_balance("\\{{}")
+
 class TestOutsideMathEnvironment():
     def test_hat_outside_math(self):
         assert "\\textasciicircum" in elc('chirality $\\stackrel{^}{\\mathbf{n}}⋅(\\…')
@@ -0,0 +1,62 @@
+import pytest
+# run with pytest -q ./tests/feeds.py from project dir
+# NOTE test functions must start with test, class with Test to be detected
+
+# incase the module is not in the loadpath try to load it
+try:
+    import sys
+    sys.path.append("..")
+    from src import *
+except ImportError:
+    print("Could not load local module, continuing")
+
+from journalfeed import feeds
+from journalfeed.helpers import parse_feed
+import journalfeed.cache as cache
+import journalfeed.metrics as metrics
+import feedparser as fp
+from pathlib import Path
+
+fixtures = Path(__file__).parent / "fixtures"
+# the keys of the entries used by arxiv, aps and science
+keys = ["title", "link", "summary", "authors", "published_parsed", "updated_parsed",
+        "dc_type", "prism_doi", "prism_publicationname"]
+
+class TestFeeds():
+    @pytest.mark.parametrize("name", ["arxiv_page.atom", "aps_recent.xml", "science_etoc.xml"])
+    def test_same_as_feedparser(self, name):
+        content = (fixtures / name).read_bytes()
+        url = "http://feeds.aps.org/rss/recent/prb.xml"
+        expected = fp.parse(content, response_headers={"content-location": url})
+        parsed = feeds.parse(content, base=url)
+        assert len(parsed.entries) == len(expected.entries) == 2
+        assert parsed.feed.get("opensearch_totalresults") == expected.feed.get("opensearch_totalresults")
+        for a, b in zip(parsed.entries, expected.entries):
+            for key in keys:
+                if key == "summary" and "science" in name:
+                    continue
+                assert a.get(key) == b.get(key), key
+            assert a.summary_detail["base"] == b.summary_detail["base"]
+    def test_timezone(self):
+        entries = feeds.parse((fixtures / "aps_recent.xml").read_bytes()).entries
+        # like feedparser the dates are in UTC
+        assert entries[1].updated_parsed[:3] == (2024, 1, 11)
+        with pytest.raises(AttributeError):
+            entries[1].dc_type
+    def test_unknown_feeds(self):
+        rss2 = b'<rss version="2.0"><channel><item><title>A</title></item></channel></rss>'
+        with pytest.raises(feeds.UnknownFeed):
+            feeds.parse(rss2)
+        with pytest.raises(feeds.UnknownFeed):
+            feeds.parse(b'<feed xmlns="http://www.w3.org/2005/Atom"><entry><title>unclosed</entry></feed>')
+        with pytest.raises(feeds.UnknownFeed):
+            feeds.parse(b'<feed xmlns="http://www.w3.org/2005/Atom"><entry><title type="xhtml"><div>A</div></title></entry></feed>')
+    def test_fallback(self, monkeypatch):
+        rss2 = b'<rss version="2.0"><channel><item><title>A &amp; B</title><link>http://example.org</link></item></channel></rss>'
+        monkeypatch.setattr(cache, "get", lambda url, source=None: rss2)
+        before = metrics.default_metrics.counters.get(("parser_fallbacks", (("journal", "x"), ("source", "test"))), 0)
+        feed = parse_feed("http://example.org/feed.xml", "test", "x")
+        assert [e.title for e in feed.entries] == ["A & B"]
+        assert metrics.default_metrics.counters[("parser_fallbacks", (("journal", "x"), ("source", "test")))] == before+1
+        monkeypatch.setattr(cache, "get", lambda url, source=None: b"")
+        assert parse_feed("http://example.org/feed.xml").entries == []
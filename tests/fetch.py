@@ -0,0 +1,81 @@
+import pytest
+# run with pytest -q ./tests/fetch.py from project dir
+# NOTE test functions must start with test, class with Test to be detected
+
+# incase the module is not in the loadpath try to load it
+try:
+    import sys
+    sys.path.append("..")
+    from src import *
+except ImportError:
+    print("Could not load local module, continuing")
+
+from journalfeed.Article import Article
+from journalfeed.__main__ import parse_args, fetch as fetch_run, section_sources
+import journalfeed.aps as aps
+import journalfeed.arxiv as arxiv
+import journalfeed.cache as cache
+import journalfeed.fetch as fetch
+import journalfeed.nature as nature
+import journalfeed.science as science
+import datetime
+import time
+
+enddate = datetime.date(2024, 1, 4)
+sources = {"arxiv_query": "", "aps_journals": ["prb"], "nature": {"weekly": ["nature"], "monthly": ["nphys"]},
+           "science": ["science"], "time_budgets": {}}
+
+def article(title, journal):
+    return Article(title, "https://example.org/"+title.replace(" ", "-"), enddate, ["Alice Smith"], "A summary", journal)
+
+def stub(delay, titles, journal):
+    """A source that answers after delay seconds"""
+    def get_articles(journals=None, **kwargs):
+        time.sleep(delay)
+        if isinstance(titles, Exception):
+            raise titles
+        return [article(title+" "+" ".join(journals), journal) for title in titles]
+    return get_articles
+
+def arxiv_pages(delay, titles):
+    def iter_articles(deadline=None, **kwargs):
+        for title in titles:
+            time.sleep(delay)
+            yield article(title, "arXiv")
+    return iter_articles
+
+@pytest.fixture
+def stubs(monkeypatch, tmp_path):
+    monkeypatch.setenv("XDG_DATA_HOME", str(tmp_path / "data"))
+    monkeypatch.setattr(cache, "default_cache", cache.HTTPCache(tmp_path / "http"))
+    monkeypatch.setattr(science, "get_articles", stub(0.3, ["Science"], "Science"))
+    # the monthly nature journals answer before the weekly ones
+    monkeypatch.setattr(nature, "get_articles", lambda journals, **kwargs:
+                        stub(0.3 if journals == ["nature"] else 0.1, ["Nature"], "Nature")(journals, **kwargs))
+    monkeypatch.setattr(arxiv, "iter_articles", arxiv_pages(0.1, ["First", "Second", "Third"]))
+
+class TestFetchSources():
+    def test_concurrent_and_ordered(self, stubs, monkeypatch):
+        monkeypatch.setattr(aps, "get_articles", stub(0.3, ["APS"], "PRB"))
+        start = time.monotonic()
+        articles = fetch.fetch_sources(sources, enddate, enddate - datetime.timedelta(days=7))
+        # the sources are fetched at the same time (one after the other takes 1.2 seconds)
+        assert time.monotonic() - start < 0.8
+        assert [a.raw_title for a in articles["nature"]] == ["Nature nature", "Nature nphys"]
+        assert [a.raw_title for a in articles["arxiv"]] == ["First", "Second", "Third"]
+        assert articles["status"] == {}
+    def test_failing_source(self, stubs, monkeypatch):
+        monkeypatch.setattr(aps, "get_articles", stub(0, ValueError("broken feed"), "PRB"))
+        articles = fetch.fetch_sources(sources, enddate, enddate - datetime.timedelta(days=7))
+        assert articles["aps"] == []
+        assert [a.raw_title for a in articles["science"]] == ["Science science"]
+        assert len(list(articles["arxiv"])) == 3
+        assert articles["status"] == {"aps": "the source failed (ValueError)"}
+    def test_sections(self, stubs, monkeypatch):
+        # the slowest source is the first section
+        monkeypatch.setattr(aps, "get_articles", stub(0.5, ["APS"], "PRB"))
+        _, _, sections, notes = fetch_run(parse_args(["fetch", "snapshot.jsonl", enddate.isoformat(), "--workers", "1"]))
+        assert [name for name, _ in sections] == [name for name, _ in section_sources]
+        assert [[a.raw_journal for a in articles] for _, articles in sections] == \
+            [["PRB"], ["Nature", "Nature"], ["Science"], ["arXiv"]*3]
+        assert notes == {}
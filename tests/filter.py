@@ -0,0 +1,52 @@
+import pytest
+# run with pytest -q ./tests/filter.py from project dir
+# NOTE test functions must start with test, class with Test to be detected
+
+# incase the module is not in the loadpath try to load it
+try:
+    import sys
+    sys.path.append("..")
+    from src import *
+except ImportError:
+    print("Could not load local module, continuing")
+
+from journalfeed.Article import Article
+from journalfeed.Filter import Filter
+from journalfeed.config import load_filter
+import datetime
+
+def article(title="A title", authors=["Alice Smith"], summary="A summary", journal="arXiv"):
+    return Article(title, "https://example.org", datetime.date(2024, 1, 1), authors, summary, journal)
+
+rules = (["prl", "nature"], [("Bob", "Jones"), ("Carol", "Müller-Lee")], ["majorana", "spin[\\s]qubit"], ["spin[\\s]qubit"])
+_filter = Filter(*rules)
+
+class TestFilter():
+    def test_journal(self):
+        assert _filter.match(article(journal="PRL")) == "journal PRL"
+        assert _filter.match(article()) is None
+    def test_authors(self):
+        assert _filter.match(article(authors=["A. Smith", "B. Jones"])) == "author Bob Jones"
+        assert _filter.match(article(authors=["Jones, B."])) == "author Bob Jones"
+        assert _filter.match(article(authors=["C. Müller-Lee"])) == "author Carol Müller-Lee"
+        # the first letter of the first name is required
+        assert _filter.match(article(authors=["A. Jones"])) is None
+    def test_keywords(self):
+        assert _filter.match(article(title="Braiding MAJORANA modes")) == "title keyword majorana"
+        assert _filter.match(article(summary="a spin qubit in silicon")) == "summary keyword spin[\\s]qubit"
+        assert _filter.match(article(summary="majorana")) is None
+    def test_backreferences(self):
+        f = Filter([], [], ["(ab)\\1"], [])
+        assert f.match(article(title="xababx")) == "title keyword (ab)\\1"
+        assert f.match(article(title="xabx")) is None
+    def test_same_as_article_match(self):
+        articles = [article(journal="nature"), article(authors=["B. Jones"]), article(title="Majorana"),
+                    article(summary="spin qubit"), article(summary="majorana"), article()]
+        for a in articles:
+            assert a.match(*rules) == a.match(_filter)
+    def test_profile_dir(self, tmp_path):
+        (tmp_path / "filter.json").write_text('{"journals": ["PRB"], "authors": ["Bob Jones"], "title": [], "summary": []}')
+        profile = load_filter(tmp_path)
+        assert profile.match(article(journal="prb")) == "journal prb"
+        assert profile.match(article(authors=["B. Jones"])) == "author Bob Jones"
+        assert profile.match(article(journal="PRL")) is None
@@ -0,0 +1,148 @@
+import pytest
+# run with pytest -q ./tests/harvest.py from project dir
+# NOTE test functions must start with test, class with Test to be detected
+
+# incase the module is not in the loadpath try to load it
+try:
+    import sys
+    sys.path.append("..")
+    from src import *
+except ImportError:
+    print("Could not load local module, continuing")
+
+import journalfeed.arxiv as arxiv
+import journalfeed.cache as cache
+import journalfeed.fetch as fetch
+import journalfeed.harvest as harvest
+from journalfeed.query import matcher, QueryError
+import datetime
+import http.server
+import socketserver
+import threading
+from pathlib import Path
+from urllib.parse import urlsplit, parse_qs
+
+fixtures = Path(__file__).parent / "fixtures"
+
+def record(title="A title", authors=("Alice Smith",), abstract="", categories="cond-mat.str-el"):
+    return {"id": "2401.00001", "title": title, "authors": list(authors), "abstract": abstract,
+            "categories": categories, "comments": "", "journal_ref": ""}
+
+class StandIn(http.server.BaseHTTPRequestHandler):
+    """Replays the recorded OAI-PMH responses: the first page (once after a 503), the page of the token or no records"""
+    requests = []
+    busy = True
+    def do_GET(self):
+        query = parse_qs(urlsplit(self.path).query)
+        StandIn.requests.append(query)
+        if StandIn.busy:
+            StandIn.busy = False
+            self.reply(503, b"", {"Retry-After": "0"})
+        elif "resumptionToken" in query:
+            assert query["resumptionToken"] == ["6960524|1001"]
+            self.reply(200, (fixtures / "oai_page2.xml").read_bytes())
+        elif query["from"] == ["2024-01-08"]:
+            self.reply(200, (fixtures / "oai_page1.xml").read_bytes())
+        else:
+            self.reply(200, (fixtures / "oai_empty.xml").read_bytes())
+    def reply(self, code, body, headers={}):
+        self.send_response(code)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server(monkeypatch, tmp_path):
+    StandIn.requests = []
+    StandIn.busy = True
+    monkeypatch.setenv("XDG_DATA_HOME", str(tmp_path / "data"))
+    with socketserver.ThreadingTCPServer(("127.0.0.1", 0), StandIn) as s:
+        threading.Thread(target=s.serve_forever, daemon=True).start()
+        monkeypatch.setattr(harvest, "base_url", "http://127.0.0.1:{}/oai".format(s.server_address[1]))
+        yield
+        s.shutdown()
+
+class TestQuery():
+    def test_categories(self):
+        matches = matcher("cat:cond-mat*+OR+cat:quant-ph")
+        assert matches(record(categories="cond-mat.str-el"))
+        assert matches(record(categories="hep-th quant-ph"))
+        assert not matches(record(categories="quant-phys hep-th"))
+        assert not matcher("cat:cond-mat")(record(categories="cond-mat.str-el"))
+    def test_operators(self):
+        r = record(title="Spin liquids in $\\alpha$-RuCl$_3$", authors=["Alice Smith", "Gábor Kovács"],
+                   abstract="The Kitaev model.")
+        assert matcher("ti:spin+AND+au:kovács")(r)
+        assert matcher("ti:%22spin liquids%22 ANDNOT abs:qubit")(r)
+        assert not matcher("ti:%22liquids spin%22")(r)
+        assert matcher("(ti:qubit+OR+abs:kitaev)+AND+cat:cond-mat*")(r)
+        assert not matcher("ti:qubit+OR+abs:kitaev+AND+cat:quant-ph")(r)
+        assert matcher("liq* kitaev")(r) and not matcher("spins")(r)
+        assert matcher("au:Smith_A")(r) and not matcher("au:Smith_G")(r) and matcher("au:kovacs+OR+au:Kovács_G")(r)
+    def test_colon_in_phrase(self):
+        # the field ends at the first colon
+        r = record(title="Ratio 3:2 resonances in a Floquet system")
+        assert matcher('ti:"3:2 resonances"')(r) and matcher("ti:%223:2 resonances%22")(r)
+        assert not matcher('ti:"2:3 resonances"')(r)
+    def test_errors(self):
+        for query in ["xx:spin", "(ti:spin", "ti:spin)", "ti:spin+AND", "OR", "ti:%22%22"]:
+            with pytest.raises(QueryError):
+                matcher(query)
+
+class TestHarvest():
+    def test_sync(self, server, tmp_path):
+        mirror = harvest.Mirror(tmp_path / "arxiv.sqlite")
+        articles = list(harvest.iter_articles(datetime.date(2024, 1, 16), datetime.date(2024, 1, 8),
+                                              sets=["physics:cond-mat"], mirror=mirror))
+        # the old preprint, the withdrawn one and the one that does not match are not shown
+        assert [a.key for a in articles] == ["arxiv:2401.07001", "arxiv:2401.07002"]
+        assert [q.get("from") for q in StandIn.requests] == [["2024-01-08"], ["2024-01-08"], None]
+        assert StandIn.requests[0]["set"] == ["physics:cond-mat"] and StandIn.requests[0]["metadataPrefix"] == ["arXiv"]
+        assert [r[0] for r in mirror.db.execute("SELECT id FROM records ORDER BY id")] == \
+            ["2312.00001", "2401.07001", "2401.07002", "2401.07004"]
+        # only the changes since the last harvest are fetched
+        today = datetime.datetime.now(datetime.timezone.utc).date()
+        assert mirror.coverage("physics:cond-mat") == (datetime.date(2024, 1, 8), today)
+        assert harvest.sync(mirror, ["physics:cond-mat"], datetime.date(2024, 1, 10)) == 0
+        assert StandIn.requests[-1]["from"] == [today.isoformat()]
+        # an earlier start is harvested again
+        assert harvest.sync(mirror, ["physics:cond-mat"], datetime.date(2024, 1, 8)) == 0
+        assert harvest.sync(mirror, ["physics:cond-mat"], datetime.date(2024, 1, 1)) == 0
+        assert StandIn.requests[-1]["from"] == ["2024-01-01"]
+    def test_same_as_api(self, server, tmp_path, monkeypatch):
+        monkeypatch.setattr(cache, "get", lambda url, source=None: (fixtures / "arxiv_page.atom").read_bytes())
+        expected = list(arxiv.iter_articles(datetime.date(2024, 1, 16), datetime.date(2024, 1, 8), max_pages=1))
+        articles = list(harvest.iter_articles(datetime.date(2024, 1, 16), datetime.date(2024, 1, 8),
+                                              sets=["physics:cond-mat"], mirror=harvest.Mirror(tmp_path / "arxiv.sqlite")))
+        assert len(articles) == len(expected) == 2
+        for a, b in zip(articles, expected):
+            assert (a.key, a.raw_title, a.raw_authors, a.raw_summary, a.date) == \
+                (b.key, b.raw_title, b.raw_authors, b.raw_summary, b.date)
+            assert (a.title, a.authors, a.summary, a.journal) == (b.title, b.authors, b.summary, b.journal)
+    def test_offline(self, server, tmp_path, monkeypatch):
+        mirror = harvest.Mirror(tmp_path / "arxiv.sqlite")
+        harvest.sync(mirror, ["physics:cond-mat"], datetime.date(2024, 1, 8))
+        requests = len(StandIn.requests)
+        monkeypatch.setattr(cache.default_cache, "offline", True)
+        articles = list(harvest.iter_articles(datetime.date(2024, 1, 16), datetime.date(2024, 1, 8),
+                                              query="ti:single", sets=["physics:cond-mat"], mirror=mirror))
+        assert [a.raw_title for a in articles] == ["A single author"]
+        assert len(StandIn.requests) == requests
+    def test_fetch_source(self, server):
+        sources = {"arxiv_query": "cat:cond-mat*+OR+cat:quant-ph", "arxiv_sets": ["physics:cond-mat"],
+                   "arxiv_harvest": True}
+        articles, note = fetch.fetch_source(sources, "arxiv", datetime.date(2024, 1, 16), datetime.date(2024, 1, 8))
+        assert note is None and [a.raw_title for a in articles] == ["Spin liquids in $\\alpha$-RuCl$_3$ with  $T < T_N$ & beyond",
+                                                                     "A single author"]
+        articles, note = fetch.fetch_source(dict(sources, arxiv_sets=[]), "arxiv", datetime.date(2024, 1, 16),
+                                            datetime.date(2024, 1, 8))
+        assert articles == [] and note == "the source failed (HarvestError)"
+    def test_errors(self):
+        with pytest.raises(harvest.HarvestError):
+            harvest.parse_records(b'<OAI-PMH xmlns="http://www.openarchives.org/OAI/2.0/">'
+                                  b'<error code="badResumptionToken">expired</error></OAI-PMH>')
+        assert harvest.parse_records((fixtures / "oai_empty.xml").read_bytes()) == ([], None)
@@ -0,0 +1,52 @@
+import pytest
+# run with pytest -q ./tests/imports.py from project dir
+# NOTE test functions must start with test, class with Test to be detected
+
+# incase the module is not in the loadpath try to load it
+try:
+    import sys
+    sys.path.append("..")
+    from src import *
+except ImportError:
+    print("Could not load local module, continuing")
+
+from journalfeed.Article import Article
+from journalfeed.snapshot import write_snapshot
+import datetime
+import os
+import subprocess
+import sys
+
+# only needed to fetch (or to sanitize html)
+network_modules = ["requests", "urllib3", "bs4", "feedparser", "dateutil"]
+
+def imported(args, env):
+    """The modules imported (with python -X importtime) by running python with args, except those imported at startup"""
+    def modules(args):
+        stderr = subprocess.run([sys.executable, "-X", "importtime"] + args, env=env, stdout=subprocess.DEVNULL,
+                                stderr=subprocess.PIPE, text=True, check=True).stderr
+        return {line.split("|")[-1].strip() for line in stderr.splitlines() if line.startswith("import time:")}
+    return modules(args) - modules(["-c", "pass"])
+
+@pytest.fixture
+def env(tmp_path):
+    return dict(os.environ, XDG_CONFIG_HOME=str(tmp_path / "config"), XDG_CACHE_HOME=str(tmp_path / "cache"),
+                XDG_DATA_HOME=str(tmp_path / "data"))
+
+class TestImports():
+    def test_help(self, env):
+        modules = imported(["-m", "journalfeed", "--help"], env)
+        assert "journalfeed.config" in modules
+        for name in network_modules + ["journalfeed.fetch", "multiprocessing", "cProfile"]:
+            assert name not in modules
+    def test_render(self, env, tmp_path):
+        article = Article("A title", "http://arxiv.org/abs/2401.00001v1", datetime.date(2024, 1, 1), ["Alice Smith"],
+                          "A summary with $x^2$", "arXiv")
+        article.title, article.authors, article.summary, article.journal
+        write_snapshot(tmp_path / "snapshot.jsonl", [("arXiv", [article])], datetime.date(2024, 1, 1),
+                       datetime.date(2024, 1, 8))
+        modules = imported(["-m", "journalfeed", "render", str(tmp_path / "snapshot.jsonl"), str(tmp_path / "out.tex")], env)
+        assert "journalfeed.writer" in modules and "journalfeed.snapshot" in modules
+        for name in network_modules + ["journalfeed.fetch", "journalfeed.cache", "journalfeed.arxiv", "journalfeed.nature"]:
+            assert name not in modules
+        assert "A title" in (tmp_path / "out.tex").read_text()
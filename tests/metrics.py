@@ -0,0 +1,46 @@
+import pytest
+# run with pytest -q ./tests/metrics.py from project dir
+# NOTE test functions must start with test, class with Test to be detected
+
+# incase the module is not in the loadpath try to load it
+try:
+    import sys
+    sys.path.append("..")
+    from src import *
+except ImportError:
+    print("Could not load local module, continuing")
+
+from journalfeed.metrics import Metrics
+import json
+
+class TestMetrics():
+    def test_spans(self):
+        m = Metrics()
+        for _ in range(3):
+            with m.span("parse", "aps", "prl"):
+                pass
+        with pytest.raises(ValueError):
+            with m.span("parse", "aps", "prb"):
+                raise ValueError
+        spans = {(s["stage"], s["source"], s["journal"]): s["count"] for s in m.as_dict()["spans"]}
+        assert spans == {("parse", "aps", "prl"): 3, ("parse", "aps", "prb"): 1}
+    def test_counters(self):
+        m = Metrics()
+        m.count("bytes_downloaded", 100, host="a.org")
+        m.count("bytes_downloaded", 20, host="a.org")
+        m.count("retries", source="arxiv")
+        counters = m.as_dict()["counters"]
+        assert {"name": "bytes_downloaded", "labels": {"host": "a.org"}, "value": 120} in counters
+        assert "retries{source=arxiv}" in m.summary()
+    def test_prometheus(self, tmp_path):
+        m = Metrics()
+        m.count("cache_hits", host='a"b', kind="offline")
+        with m.span("fetch", "nature", "nature"):
+            pass
+        text = m.prometheus()
+        assert 'journalfeed_cache_hits_total{host="a\\"b",kind="offline"} 1' in text
+        assert 'journalfeed_span_calls_total{stage="fetch",source="nature",journal="nature"} 1' in text
+        m.write(tmp_path / "metrics.prom")
+        assert 'journalfeed_cache_hits_total{host="a\\"b",kind="offline"} 1' in (tmp_path / "metrics.prom").read_text()
+        m.write(tmp_path / "metrics.json")
+        assert json.loads((tmp_path / "metrics.json").read_text())["counters"][0]["value"] == 1
@@ -0,0 +1,32 @@
+import pytest
+# run with pytest -q ./tests/nature.py from project dir
+# NOTE test functions must start with test, class with Test to be detected
+
+# incase the module is not in the loadpath try to load it
+try:
+    import sys
+    sys.path.append("..")
+    from src import *
+except ImportError:
+    print("Could not load local module, continuing")
+
+from journalfeed.nature import parse_issue
+import datetime
+import pathlib
+
+fixture = pathlib.Path(__file__).parent / "fixtures" / "nature_current_issue.html"
+
+class TestNatureIssue():
+    def test_research_articles(self):
+        articles = parse_issue(fixture.read_bytes(), "nature", ensure_latex=False)
+        urls = [a.url for a in articles]
+        assert len(urls) == len(set(urls))
+        assert len(articles) == 9
+        assert all(a.url.startswith("https://www.nature.com/articles/") for a in articles)
+        assert all(isinstance(a.date, datetime.date) for a in articles)
+        assert articles[-1].summary != "" and all(len(a.authors) > 0 for a in articles)
+    def test_missing_abstract(self):
+        articles = parse_issue(fixture.read_bytes(), "nature", ensure_latex=False)
+        assert sum(a.summary == "No Abstract found" for a in articles) == 1
+    def test_no_research(self):
+        assert parse_issue(b"<html><body><p>No issue</p></body></html>", "nature") == []
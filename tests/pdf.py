@@ -0,0 +1,114 @@
+import pytest
+# run with pytest -q ./tests/pdf.py from project dir
+# NOTE test functions must start with test, class with Test to be detected
+
+# incase the module is not in the loadpath try to load it
+try:
+    import sys
+    sys.path.append("..")
+    from src import *
+except ImportError:
+    print("Could not load local module, continuing")
+
+from journalfeed.pdf import build_pdf, LatexError, needs_rerun, preamble_format, sha256
+import json
+import os
+import stat
+import threading
+import time
+
+preamble = "\\documentclass{article}"
+
+# a LaTeX engine that fails with a format, and also without one if the document contains "broken"
+fake_engine = """#!/usr/bin/env python3
+import sys
+tex = sys.argv[-1]
+with open("calls", "a") as f:
+    f.write(" ".join(sys.argv[1:])+"\\n")
+with open(tex[:-len(".tex")]+".log", "w") as f:
+    f.write("Output written")
+if any(a.startswith("-fmt=") for a in sys.argv) or "broken" in open(tex).read():
+    sys.exit(1)
+open(tex[:-len(".tex")]+".pdf", "w").write("pdf")
+"""
+
+# an engine that dumps a format (slowly) into the working directory, kpsewhich finds mylatexformat
+fake_ini_engine = """#!/usr/bin/env python3
+import sys, time
+name = [a for a in sys.argv if a.startswith("-jobname=")][0][len("-jobname="):]
+with open(name+".fmt", "w") as f:
+    f.write("partial")
+    f.flush()
+    time.sleep(0.2)
+    f.write(" format")
+"""
+
+def fake_format(tmp_path, monkeypatch):
+    """A cached format of the preamble for the fake engine pdflatex on PATH, returns the path of its .broken mark"""
+    (tmp_path / "bin").mkdir()
+    engine = tmp_path / "bin" / "pdflatex"
+    engine.write_text(fake_engine)
+    engine.chmod(engine.stat().st_mode | stat.S_IXUSR)
+    monkeypatch.setenv("PATH", str(tmp_path / "bin")+os.pathsep+os.environ["PATH"])
+    name = "journalfeed-"+sha256("pdflatex\n"+preamble)[:16]
+    (tmp_path / "formats").mkdir()
+    (tmp_path / "formats" / (name+".fmt")).touch()
+    return tmp_path / "formats" / (name+".broken")
+
+class TestPDF():
+    def test_needs_rerun(self):
+        assert needs_rerun("Package hyperref Warning: Rerun to get /PageLabels entry.")
+        assert needs_rerun("LaTeX Warning: Label(s) may have changed. Rerun to get cross-references right.")
+        assert not needs_rerun("Output written on main.pdf (3 pages, 4096 bytes).")
+    def test_broken_format(self, tmp_path):
+        name = "journalfeed-"+sha256("lualatex\n"+preamble)[:16]
+        (tmp_path / (name+".broken")).touch()
+        assert preamble_format(preamble, "lualatex", tmp_path) is None
+    def test_concurrent_format(self, tmp_path, monkeypatch):
+        (tmp_path / "bin").mkdir()
+        for tool, script in [("pdflatex", fake_ini_engine), ("kpsewhich", "#!/bin/sh\n")]:
+            (tmp_path / "bin" / tool).write_text(script)
+            (tmp_path / "bin" / tool).chmod(0o755)
+        monkeypatch.setenv("PATH", str(tmp_path / "bin")+os.pathsep+os.environ["PATH"])
+        results = []
+        def build():
+            fmt = preamble_format(preamble, "pdflatex", tmp_path / "formats")
+            # a format that is found is complete
+            results.append((fmt, (fmt[1] / (fmt[0]+".fmt")).read_text()))
+        threads = [threading.Thread(target=build) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+            time.sleep(0.05)
+        for thread in threads:
+            thread.join()
+        name = "journalfeed-"+sha256("pdflatex\n"+preamble)[:16]
+        assert results == [((name, tmp_path / "formats"), "partial format")]*3
+        # the build directories are removed
+        assert [p.name for p in (tmp_path / "formats").iterdir()] == [name+".fmt"]
+    def test_unchanged_tex_is_skipped(self, tmp_path):
+        name = "journalfeed-"+sha256("lualatex\n"+preamble)[:16]
+        (tmp_path / (name+".broken")).touch()
+        tex = tmp_path / "main.tex"
+        tex.write_text(preamble+"\\begin{document}x\\end{document}")
+        (tmp_path / "main.pdf").write_text("pdf")
+        (tmp_path / "main.build.json").write_text(json.dumps({"tex": sha256(tex.read_text()), "engine": "lualatex",
+                                                              "format": None}))
+        # the engine is not called (it does not even need to exist)
+        assert build_pdf(tex, preamble, engine="lualatex", format_path=tmp_path) == (tmp_path / "main.pdf").resolve()
+    def test_format_fallback(self, tmp_path, monkeypatch):
+        broken = fake_format(tmp_path, monkeypatch)
+        tex = tmp_path / "main.tex"
+        tex.write_text(preamble+"\\begin{document}x\\end{document}")
+        assert build_pdf(tex, preamble, engine="pdflatex", format_path=tmp_path / "formats") == \
+            (tmp_path / "main.pdf").resolve()
+        # the document compiles without the format, which is not used again
+        assert broken.exists()
+        assert [call.startswith("-fmt=") for call in (tmp_path / "calls").read_text().splitlines()] == [True, False]
+    def test_broken_document_keeps_format(self, tmp_path, monkeypatch):
+        broken = fake_format(tmp_path, monkeypatch)
+        tex = tmp_path / "main.tex"
+        tex.write_text(preamble+"\\begin{document}broken\\end{document}")
+        with pytest.raises(LatexError):
+            build_pdf(tex, preamble, engine="pdflatex", format_path=tmp_path / "formats")
+        # the document failed without the format as well, the format is not to blame
+        assert not broken.exists()
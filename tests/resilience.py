@@ -0,0 +1,160 @@
+import pytest
+# run with pytest -q ./tests/resilience.py from project dir
+# NOTE test functions must start with test, class with Test to be detected
+
+# incase the module is not in the loadpath try to load it
+try:
+    import sys
+    sys.path.append("..")
+    from src import *
+except ImportError:
+    print("Could not load local module, continuing")
+
+from journalfeed.Article import Article
+from journalfeed.Filter import Filter
+from journalfeed.client import Client
+from journalfeed.writer import write_digest
+import journalfeed.arxiv as arxiv
+import journalfeed.aps as aps
+import journalfeed.cache as cache
+import journalfeed.client as client
+import journalfeed.fetch as fetch
+import journalfeed.nature as nature
+import journalfeed.resilience as resilience
+import journalfeed.science as science
+from journalfeed.__main__ import parse_args, fetch as fetch_run
+from journalfeed.snapshot import write_snapshot, read_snapshot
+from journalfeed.state import ArticleIndex
+import datetime
+import requests
+import http.server
+import socketserver
+import threading
+import time
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    requests = 0
+    def do_GET(self):
+        Handler.requests += 1
+        self.send_response(503)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    Handler.requests = 0
+    with socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler) as s:
+        threading.Thread(target=s.serve_forever, daemon=True).start()
+        yield "http://127.0.0.1:{}/".format(s.server_address[1])
+        s.shutdown()
+
+@pytest.fixture
+def breaker(monkeypatch):
+    breaker = resilience.CircuitBreaker(failures=3, reset_after=0.2)
+    monkeypatch.setattr(resilience, "default_breaker", breaker)
+    yield breaker
+    resilience.set_deadline(None)
+
+def article(title, journal="arXiv"):
+    return Article(title, "https://example.org/"+title, datetime.date(2024, 1, 1), ["Alice Smith"], "A summary", journal)
+
+class TestResilience():
+    def test_backoff(self):
+        assert resilience.backoff(0, 3., 30., rng=lambda: 1.) == 3.
+        assert resilience.backoff(2, 3., 30., rng=lambda: 0.5) == 6.
+        assert resilience.backoff(10, 3., 30., rng=lambda: 1.) == 30.
+        assert all(0 <= resilience.backoff(3) <= 8 for _ in range(100))
+    def test_circuit_breaker(self):
+        breaker = resilience.CircuitBreaker(failures=2, reset_after=0.1)
+        breaker.failure("a")
+        assert breaker.allow("a")
+        breaker.failure("a")
+        assert not breaker.allow("a") and breaker.allow("b")
+        time.sleep(0.1)
+        # half open: one failure opens the circuit again, a success closes it
+        assert breaker.allow("a")
+        breaker.failure("a")
+        assert not breaker.allow("a")
+        time.sleep(0.1)
+        assert breaker.allow("a")
+        breaker.success("a")
+        breaker.failure("a")
+        assert breaker.allow("a")
+    def test_client_fails_fast(self, server, breaker):
+        client = Client()
+        for _ in range(3):
+            assert client.get(server).status_code == 503
+        with pytest.raises(resilience.CircuitOpen):
+            client.get(server)
+        assert Handler.requests == 3
+        time.sleep(0.2)
+        assert client.get(server).status_code == 503
+        assert Handler.requests == 4
+        client.close()
+    def test_client_deadline(self, server, breaker):
+        resilience.set_deadline(0)
+        with pytest.raises(resilience.DeadlineExceeded):
+            Client().get(server)
+        assert Handler.requests == 0
+    def test_arxiv_deadline(self):
+        with pytest.raises(resilience.DeadlineExceeded):
+            next(arxiv.iter_articles(deadline=resilience.Deadline(0)))
+    def test_partial_results(self, monkeypatch):
+        def slow(**kwargs):
+            time.sleep(1)
+            return [article("Late", "PRL")]
+        def failing(**kwargs):
+            raise ValueError("broken page")
+        def arxiv_pages(deadline, **kwargs):
+            yield article("First")
+            time.sleep(1)
+            yield article("Second")
+        monkeypatch.setattr(aps, "get_articles", slow)
+        monkeypatch.setattr(nature, "get_articles", failing)
+        monkeypatch.setattr(science, "get_articles", lambda **kwargs: [article("Science", "Science")])
+        monkeypatch.setattr(arxiv, "iter_articles", arxiv_pages)
+        sources = {"arxiv_query": "", "aps_journals": [], "nature": {"weekly": [], "monthly": []}, "science": [],
+                   "time_budgets": {"aps": 0.2}}
+        start = time.monotonic()
+        articles = fetch.fetch_sources(sources, datetime.date(2024, 1, 15), datetime.date(2024, 1, 8),
+                                       deadline=resilience.Deadline(0.5))
+        assert [a.raw_title for a in articles["arxiv"]] == ["First"]
+        assert time.monotonic() - start < 0.9
+        assert articles["aps"] == [] and articles["nature"] == []
+        assert [a.raw_title for a in articles["science"]] == ["Science"]
+        assert articles["status"] == {"aps": "the source did not respond in time",
+                                      "nature": "the source failed (ValueError)",
+                                      "arxiv": "the source did not respond in time"}
+    def test_marked_sections(self, tmp_path):
+        sections = [("APS Journals", [], lambda article: True), ("arXiv", [article("First")], lambda article: False)]
+        write_digest(tmp_path / "digest.tex", sections, Filter([], [], [], []), "", datetime.date(2024, 1, 8),
+                     datetime.date(2024, 1, 15), standalone=False, notes={"APS Journals": "the source failed (ValueError)"})
+        digest = (tmp_path / "digest.tex").read_text()
+        assert "\\section{APS Journals}\n\\par{\\itshape This section is incomplete, the source failed (ValueError).}" in digest
+        assert digest.count("incomplete") == 1
+    def test_failed_requests(self, monkeypatch, tmp_path):
+        def unreachable(url, headers=None, timeout=None):
+            raise requests.ConnectionError("unreachable")
+        monkeypatch.setenv("XDG_DATA_HOME", str(tmp_path / "data"))
+        monkeypatch.setattr(cache, "default_cache", cache.HTTPCache(tmp_path / "http"))
+        monkeypatch.setattr(cache, "_host_slots", {})
+        monkeypatch.setattr(cache, "host_limits", {})
+        monkeypatch.setattr(client, "get", unreachable)
+        monkeypatch.setattr(arxiv, "jittered_backoff", lambda *args: 0.)
+        sources = {"arxiv_query": "cat:quant-ph", "aps_journals": ["prl", "prb"],
+                   "nature": {"weekly": ["nature"], "monthly": []}, "science": ["science"], "time_budgets": {}}
+        articles = fetch.fetch_sources(sources, datetime.date(2024, 1, 15), datetime.date(2024, 1, 8))
+        assert list(articles["arxiv"]) == []
+        assert articles["status"] == {source: "the source failed (ConnectionError)"
+                                      for source in ["aps", "nature", "science", "arxiv"]}
+        # the run is not recorded, the next --since-last-run fetches the window again
+        args = parse_args(["fetch", str(tmp_path / "snapshot.jsonl"), "2024-01-15", "--since-last-run", "--deadline", "0"])
+        startdate, enddate, sections, notes = fetch_run(args)
+        # the sections are consumed while the snapshot is written, the arxiv note is only known at the end
+        write_snapshot(args.snapshot, sections, startdate, enddate, notes)
+        assert set(notes) == {"APS Journals", "Nature", "Science", "arXiv"}
+        assert read_snapshot(args.snapshot)[3] == notes
+        assert ArticleIndex().last_run() is None
@@ -0,0 +1,189 @@
+import pytest
+# run with pytest -q ./tests/serve.py from project dir
+# NOTE test functions must start with test, class with Test to be detected
+
+# incase the module is not in the loadpath try to load it
+try:
+    import sys
+    sys.path.append("..")
+    from src import *
+except ImportError:
+    print("Could not load local module, continuing")
+
+from journalfeed.Article import Article
+from journalfeed.Filter import Filter
+import journalfeed.cache as cache
+import journalfeed.serve as serve
+import datetime
+import http.client
+import http.server
+import json
+import re
+import socket
+import socketserver
+import threading
+import time
+import urllib.request
+from pathlib import Path
+
+fixtures = Path(__file__).parent / "fixtures"
+sections = [("APS Journals", "aps", lambda article: True), ("arXiv", "arxiv", lambda article: False)]
+
+def article(title, journal="arXiv", url=None):
+    return Article(title, url or "https://example.org/"+title.replace(" ", "-"), datetime.date.today(), ["Alice Smith"],
+                   "A summary with $x^2$", journal)
+
+class Stub():
+    """The articles of the sources, counts the fetches"""
+    def __init__(self, articles):
+        self.articles = articles
+        self.fetches = {source: 0 for source in articles}
+    def __call__(self, source, enddate, startdate):
+        self.fetches[source] += 1
+        result = self.articles[source]
+        if isinstance(result, Exception):
+            raise result
+        return list(result), None
+
+@pytest.fixture(autouse=True)
+def dirs(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_DATA_HOME", str(tmp_path / "data"))
+    monkeypatch.setattr(cache, "default_cache", cache.HTTPCache(tmp_path / "http"))
+
+def digests(fetch, refresh=None):
+    return serve.Digests({"refresh": refresh or {}}, sections, Filter(["PRB"], [], [], []), "", fetch=fetch, workers=1)
+
+class TestServe():
+    def test_next_refresh(self):
+        now = datetime.datetime(2024, 1, 15, 12, 0, tzinfo=datetime.timezone.utc).timestamp()
+        assert serve.next_refresh(3600, now) == now + 3600
+        assert serve.next_refresh("13:30", now) == now + 1.5*3600
+        assert serve.next_refresh("01:30", now) == now + 13.5*3600
+        assert serve.next_refresh("12:00", now) == now + 24*3600
+    def test_render(self):
+        stub = Stub({"aps": [article("Magnons", "prb", "https://example.org/same")],
+                     "arxiv": [article("Magnons", url="https://example.org/same"), article("Qubits")]})
+        d = digests(stub)
+        assert "This section is incomplete, the source was not fetched yet." in d.render()
+        assert d.refresh("aps") and d.refresh("arxiv")
+        tex = d.render()
+        assert "incomplete" not in tex
+        # shown once, in the first section
+        assert tex.count("Magnons") == 1 and "Qubits" in tex
+        # rendered only once per change
+        assert d.render() is tex
+        assert d.refresh("arxiv")
+        assert d.render() is not tex and d.render() == tex
+        assert stub.fetches == {"aps": 1, "arxiv": 2}
+    def test_failed_refresh(self):
+        stub = Stub({"aps": [article("Magnons", "prb")], "arxiv": []})
+        d = digests(stub)
+        assert d.refresh("aps")
+        stub.articles["aps"] = ValueError("broken feed")
+        assert not d.refresh("aps")
+        tex = d.render()
+        # the previous articles are kept
+        assert "This section is incomplete, the source failed (ValueError)." in tex and "Magnons" in tex
+        assert d.status()["aps"]["articles"] == 1
+    def test_schedule(self):
+        stub = Stub({"aps": [article("Magnons", "prb")], "arxiv": [article("Qubits")]})
+        d = digests(stub, refresh={"aps": 0.05, "arxiv": 3600})
+        d.start()
+        time.sleep(0.5)
+        d.refresh_now(["arxiv"])
+        time.sleep(0.1)
+        d.stop()
+        assert stub.fetches["aps"] >= 5 and stub.fetches["arxiv"] == 2
+        assert d.status()["arxiv"]["next_refresh"] is not None
+
+class FixtureHandler(http.server.BaseHTTPRequestHandler):
+    """Serves the APS fixture (published yesterday) for every url, used as proxy of the plain http feeds"""
+    requests = []
+    def do_GET(self):
+        FixtureHandler.requests.append(self.path)
+        yesterday = (datetime.date.today() - datetime.timedelta(days=1)).isoformat()
+        body = re.sub("<dc:date>[^<]*</dc:date>", "<dc:date>"+yesterday+"T10:00:00+00:00</dc:date>",
+                      (fixtures / "aps_recent.xml").read_text()).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def proxy(monkeypatch):
+    FixtureHandler.requests = []
+    with socketserver.ThreadingTCPServer(("127.0.0.1", 0), FixtureHandler) as s:
+        threading.Thread(target=s.serve_forever, daemon=True).start()
+        monkeypatch.setenv("http_proxy", "http://127.0.0.1:{}".format(s.server_address[1]))
+        monkeypatch.delenv("no_proxy", raising=False)
+        monkeypatch.delenv("NO_PROXY", raising=False)
+        yield
+        s.shutdown()
+
+@pytest.fixture
+def server():
+    stub = Stub({"aps": [article("Magnons", "prb")], "arxiv": [article("Qubits")]})
+    d = digests(stub, refresh={"aps": 3600, "arxiv": 3600})
+    s = serve.make_server(d, port=0)
+    threading.Thread(target=s.serve_forever, daemon=True).start()
+    d.start()
+    yield "http://127.0.0.1:{}".format(s.server_address[1]), d, stub
+    d.stop()
+    s.shutdown()
+    s.server_close()
+
+class TestDaemon():
+    def test_fixture_server(self, proxy):
+        d = serve.Digests({"aps_journals": ["prb"], "time_budgets": {}}, sections[:1], Filter([], [], [], []), "",
+                          workers=1)
+        assert d.refresh("aps")
+        assert FixtureHandler.requests == ["http://feeds.aps.org/rss/recent/prb.xml"]
+        tex = d.render()
+        assert "Magnon bands in $\\mathrm{CrI}_3$ \\& friends" in tex and "Late at night" in tex
+    def test_http(self, server):
+        url, d, stub = server
+        for _ in range(100):
+            if all(n > 0 for n in stub.fetches.values()):
+                break
+            time.sleep(0.01)
+        time.sleep(0.05)
+        with urllib.request.urlopen(url+"/digest.tex") as response:
+            assert response.headers["Content-Type"].startswith("application/x-tex")
+            tex = response.read().decode()
+        assert "Magnons" in tex and "Qubits" in tex
+        start = time.perf_counter()
+        with urllib.request.urlopen(url+"/") as response:
+            assert response.read().decode() == tex
+        assert time.perf_counter() - start < 0.5
+        with urllib.request.urlopen(url+"/status") as response:
+            status = json.load(response)
+        assert status["aps"]["articles"] == 1 and status["aps"]["incomplete"] is None
+        with urllib.request.urlopen(urllib.request.Request(url+"/refresh/aps", method="POST")) as response:
+            assert response.status == 202
+        time.sleep(0.1)
+        assert stub.fetches["aps"] == 2 and stub.fetches["arxiv"] == 1
+        with urllib.request.urlopen(url+"/metrics") as response:
+            assert 'journalfeed_refreshes_total{complete="True",source="aps"}' in response.read().decode()
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(url+"/refresh/nature", data=b"")
+    def test_unix_socket(self, tmp_path):
+        stub = Stub({"aps": [article("Magnons", "prb")], "arxiv": []})
+        d = digests(stub)
+        d.refresh("aps")
+        s = serve.make_server(d, path=str(tmp_path / "journalfeed.sock"))
+        threading.Thread(target=s.serve_forever, daemon=True).start()
+        client = socket.socket(socket.AF_UNIX)
+        client.connect(str(tmp_path / "journalfeed.sock"))
+        client.sendall(b"GET /digest.tex HTTP/1.0\r\n\r\n")
+        response = b""
+        while True:
+            data = client.recv(65536)
+            if not data:
+                break
+            response += data
+        client.close()
+        s.shutdown()
+        s.server_close()
+        assert response.startswith(b"HTTP/1.0 200") and b"Magnons" in response
@@ -0,0 +1,60 @@
+import pytest
+# run with pytest -q ./tests/snapshot.py from project dir
+# NOTE test functions must start with test, class with Test to be detected
+
+# incase the module is not in the loadpath try to load it
+try:
+    import sys
+    sys.path.append("..")
+    from src import *
+except ImportError:
+    print("Could not load local module, continuing")
+
+from journalfeed.Article import Article
+from journalfeed.dedup import Deduplicator
+from journalfeed.snapshot import write_snapshot, read_snapshot
+import datetime
+
+def sections():
+    published = Article("Spin $\\alpha$ qubits", "https://journals.aps.org/prl/x", datetime.date(2024, 1, 2),
+                        ["Alice Smith", "Bob Jones"], "A summary with $x^2$", "PRL", doi="10.1103/X")
+    preprint = Article("Spin $\\alpha$ qubits", "http://arxiv.org/abs/2401.00001v2", datetime.date(2024, 1, 1),
+                       ["A. Smith", "B. Jones"], "A summary with $x^2$", "arXiv")
+    raw = Article("Raw & title", "http://arxiv.org/abs/2401.00002v1", datetime.date(2024, 1, 1),
+                  ["Carol"], "Raw summary", "arXiv", ensure_latex=False)
+    dedup = Deduplicator()
+    return [("APS Journals", list(dedup.filter([published]))), ("arXiv", list(dedup.filter([preprint, raw])))]
+
+class TestSnapshot():
+    @pytest.mark.parametrize("name", ["snapshot.jsonl", "snapshot.jsonl.gz"])
+    def test_round_trip(self, tmp_path, name):
+        original = sections()
+        for _, articles in original:
+            for article in articles[:1]:
+                # sanitize only some of the fields
+                article.title
+        write_snapshot(tmp_path / name, original, datetime.date(2024, 1, 1), datetime.date(2024, 1, 8),
+                       {"arXiv": "the source did not respond in time"})
+        startdate, enddate, restored, notes = read_snapshot(tmp_path / name)
+        assert notes == {"arXiv": "the source did not respond in time"}
+        assert (startdate, enddate) == (datetime.date(2024, 1, 1), datetime.date(2024, 1, 8))
+        assert [name for name, _ in restored] == ["APS Journals", "arXiv"]
+        for (_, a), (_, b) in zip(original, restored):
+            assert [x.latex(show_journal=True) for x in a] == [x.latex(show_journal=True) for x in b]
+            assert [x.as_dict() for x in a] == [x.as_dict() for x in b]
+        assert restored[1][1][0].duplicate_of is restored[0][1][0]
+        assert restored[0][1][0].related == (restored[1][1][0],)
+    def test_not_a_snapshot(self, tmp_path):
+        (tmp_path / "other.jsonl").write_text('{"format": "something else"}\n')
+        with pytest.raises(ValueError):
+            read_snapshot(tmp_path / "other.jsonl")
+    def test_late_notes(self, tmp_path):
+        notes = {}
+        def arxiv():
+            yield from sections()[1][1]
+            notes["arXiv"] = "the source did not respond in time"
+        write_snapshot(tmp_path / "snapshot.jsonl", [("arXiv", arxiv())], datetime.date(2024, 1, 1),
+                       datetime.date(2024, 1, 8), notes)
+        _, _, restored, restored_notes = read_snapshot(tmp_path / "snapshot.jsonl")
+        assert len(restored[0][1]) == 2
+        assert restored_notes == {"arXiv": "the source did not respond in time"}
@@ -0,0 +1,109 @@
+import pytest
+# run with pytest -q ./tests/state.py from project dir
+# NOTE test functions must start with test, class with Test to be detected
+
+# incase the module is not in the loadpath try to load it
+try:
+    import sys
+    sys.path.append("..")
+    from src import *
+except ImportError:
+    print("Could not load local module, continuing")
+
+from journalfeed.Article import Article, sanitize_articles
+from journalfeed.__main__ import parse_args, fetch as fetch_run
+from journalfeed.state import ArticleIndex
+import journalfeed.cache as cache
+import journalfeed.fetch as fetch
+import datetime
+
+def article(title, url=None, journal="arXiv"):
+    return Article(title, url or "https://example.org/"+title.replace(" ", "-"), datetime.date(2024, 1, 10),
+                   ["Alice Smith"], "A summary with $x^2$ & more", journal)
+
+@pytest.fixture
+def index(tmp_path):
+    return ArticleIndex(tmp_path / "articles.sqlite")
+
+class TestArticleIndex():
+    def test_prepare_restores_known_articles(self, index):
+        known = article("Known $\\alpha$")
+        sanitize_articles([known], workers=1)
+        index.add(known)
+        index.commit()
+        again, new = article("Known $\\alpha$"), article("New")
+        assert list(index.prepare([again, new])) == [again, new]
+        # the sanitized fields are restored, not sanitized again
+        assert (again._title, again._authors, again._summary, again._journal) == \
+            (known.title, known.authors, known.summary, known.journal)
+        assert new._title is None
+        assert list(index.prepare([article("Known $\\alpha$"), new], skip_known=True)) == [new]
+    def test_add_does_not_sanitize(self, index):
+        published = article("Spin qubits", journal="PRL")
+        duplicate = article("Spin qubits", "https://example.org/preprint")
+        duplicate.duplicate_of = published
+        sanitize_articles([duplicate], workers=1)
+        index.add(duplicate)
+        index.commit()
+        # the summary of the duplicate is not shown, so it is neither sanitized nor stored
+        assert duplicate._summary is None
+        restored = article("Spin qubits", "https://example.org/preprint")
+        assert index.restore(restored)
+        assert restored._title == duplicate.title and restored._summary is None
+        assert restored.summary == duplicate.summary
+    def test_new_version(self, index):
+        v1 = Article("Spin qubits", "http://arxiv.org/abs/2401.00001v1", datetime.date(2024, 1, 10), ["Alice Smith"],
+                     "A first summary", "arXiv")
+        sanitize_articles([v1], workers=1)
+        index.add(v1)
+        index.commit()
+        # the revised abstract is sanitized (and matched) again, not restored from the first version
+        v2 = Article("Spin qubits", "http://arxiv.org/abs/2401.00001v2", datetime.date(2024, 1, 10), ["Alice Smith"],
+                     "A revised summary", "arXiv")
+        assert v1.key == v2.key and not index.restore(v2)
+        assert list(index.prepare([v2], skip_known=True)) == [v2] and v2._summary is None
+        sanitize_articles([v2], workers=1)
+        index.add(v2)
+        index.commit()
+        restored = Article("Spin qubits", "http://arxiv.org/abs/2401.00001v2", datetime.date(2024, 1, 10),
+                           ["Alice Smith"], "A revised summary", "arXiv")
+        assert index.restore(restored) and restored._summary == "A revised summary"
+        assert index.db.execute("SELECT count(*) FROM articles").fetchone()[0] == 1
+    def test_record_run(self, index):
+        assert index.last_run() is None
+        index.record_run(datetime.date(2024, 1, 8))
+        index.record_run(datetime.date(2024, 1, 15))
+        index.record_run(datetime.date(2024, 1, 15))
+        assert index.last_run() == datetime.date(2024, 1, 15)
+        assert index.db.execute("SELECT count(*) FROM runs").fetchone()[0] == 2
+    def test_prune(self, tmp_path):
+        index = ArticleIndex(tmp_path / "articles.sqlite", max_age=30)
+        for title, first_seen in [("Old", datetime.date(2023, 11, 1)), ("Recent", datetime.date(2024, 1, 1))]:
+            index.add(article(title), first_seen=first_seen)
+        index.record_run(datetime.date(2023, 11, 1))
+        index.record_run(datetime.date(2023, 11, 8))
+        index.prune(datetime.date(2024, 1, 15))
+        assert not index.restore(article("Old")) and index.restore(article("Recent"))
+        # the last run is kept for --since-last-run
+        assert index.db.execute("SELECT date FROM runs").fetchall() == [("2023-11-08",)]
+    def test_since_last_run(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("XDG_DATA_HOME", str(tmp_path / "data"))
+        monkeypatch.setattr(cache, "default_cache", cache.HTTPCache(tmp_path / "http"))
+        index = ArticleIndex()
+        index.add(article("Known", journal="PRB"), first_seen=datetime.date(2024, 1, 10))
+        index.record_run(datetime.date(2024, 1, 10))
+        index.commit()
+        calls = []
+        def fetch_sources(sources, enddate, startdate, arxiv_startdate=None, deadline=None):
+            calls.append((startdate, arxiv_startdate))
+            return {"aps": [article("Known", journal="PRB"), article("New", journal="PRB")], "nature": [],
+                    "science": [], "arxiv": iter([article("Preprint")]), "status": {}}
+        monkeypatch.setattr(fetch, "fetch_sources", fetch_sources)
+        startdate, enddate, sections, notes = fetch_run(parse_args(["fetch", str(tmp_path / "snapshot.jsonl"),
+                                                                    "2024-01-15", "--since-last-run"]))
+        # only the time since the last run is fetched, including arxiv
+        assert calls == [(datetime.date(2024, 1, 10), datetime.date(2024, 1, 10))]
+        assert [[a.raw_title for a in articles] for _, articles in sections] == [["New"], [], [], ["Preprint"]]
+        # the run is recorded once all sections are consumed
+        assert notes == {} and ArticleIndex().last_run() == datetime.date(2024, 1, 15)
+        assert ArticleIndex().restore(article("Preprint"))
@@ -0,0 +1,94 @@
+import pytest
+# run with pytest -q ./tests/writer.py from project dir
+# NOTE test functions must start with test, class with Test to be detected
+
+# incase the module is not in the loadpath try to load it
+try:
+    import sys
+    sys.path.append("..")
+    from src import *
+except ImportError:
+    print("Could not load local module, continuing")
+
+from journalfeed.Article import Article
+from journalfeed.dedup import Deduplicator
+from journalfeed.Filter import Filter
+from journalfeed.writer import Digest, UnmatchedSection, write_digests
+from journalfeed.__main__ import parse_args
+import datetime
+import io
+
+def article(title, url="https://example.org", journal="arXiv"):
+    return Article(title, url, datetime.date(2024, 1, 1), ["Alice Smith"], "A summary", journal)
+
+class TestUnmatchedSection():
+    def test_order_and_spool(self):
+        articles = [article("First", journal="PRB"), article("Second"), article("Third")]
+        unmatched = UnmatchedSection(spool_size=10)
+        unmatched.add(articles[0])
+        # later duplicates still show up in the entries of earlier sections
+        articles[0].add_related(article("Other", "https://example.org/other", "PRL"))
+        unmatched.add(articles[1], final=True)
+        unmatched.add(articles[2], final=True)
+        out = io.StringIO()
+        unmatched.write(out)
+        assert out.getvalue() == "".join(a.latex(show_journal=True) for a in articles)
+        assert "Also in" in out.getvalue()
+    def test_cap_and_titles(self):
+        unmatched = UnmatchedSection(max_articles=2, show_summary=False)
+        for i in range(5):
+            unmatched.add(article("Title {}".format(i)), final=i > 0)
+        out = io.StringIO()
+        unmatched.write(out)
+        assert len(unmatched) == 5
+        assert out.getvalue().count("\\subsection*") == 2
+        assert "A summary" not in out.getvalue()
+        assert "3 more unmatched articles are not shown." in out.getvalue()
+
+class TestWriteDigests():
+    def test_single_pass(self, tmp_path):
+        events = []
+        notes = {}
+        def arxiv_articles():
+            # the preprint of a published article
+            yield article("Published", "https://example.org/preprint")
+            for i in range(600):
+                events.append("fetched")
+                yield article("Preprint {}".format(i), "https://example.org/{}".format(i))
+            # e.g. the next page did not arrive in time
+            notes["arXiv"] = "the source did not respond in time"
+        class Recording(Filter):
+            def match(self, a):
+                events.append("written")
+                return super().match(a)
+        first, second = [Digest(tmp_path / (name+".tex"), f, "", datetime.date(2024, 1, 1), datetime.date(2024, 1, 8),
+                                standalone=False) for name, f in [("a", Recording(["PRB"], [], [], [])),
+                                                                  ("b", Filter([], [], ["Preprint 1\\b"], []))]]
+        dedup = Deduplicator()
+        sections = [("APS Journals", list(dedup.filter([article("Published", "https://example.org/p", "PRB")])),
+                     lambda a: True),
+                    ("arXiv", dedup.filter(arxiv_articles()), lambda a: False)]
+        files = write_digests([first, second], sections, notes, batch_size=256)
+        assert [str(f) for f in files] == [str(tmp_path / "a.tex"), str(tmp_path / "b.tex")]
+        # the articles are written while they are fetched
+        assert events.index("written", 2) < events.index("fetched", 256+2)
+        a, b = (tmp_path / "a.tex").read_text(), (tmp_path / "b.tex").read_text()
+        assert a.count("Preprint") == b.count("Preprint") == 600
+        assert b.index("Preprint 1}") < b.index("Unmatched Articles") < b.index("Published")
+        # the note on the arxiv section is shown at its end
+        note = "This section is incomplete, the source did not respond in time."
+        assert "\\section{arXiv}\n\\clearpage" not in a
+        # the published article was written after its preprint was seen
+        assert a.index("Published") < a.index("Also in \\href{https://example.org/preprint}{arXiv}") \
+            < a.index("\\section{arXiv}")
+        assert b.index("Preprint 1}") < b.index(note) < b.index("Unmatched Articles")
+    def test_duplicate_profile_names(self, tmp_path, capsys):
+        (tmp_path / "a" / "physics").mkdir(parents=True)
+        (tmp_path / "b" / "physics").mkdir(parents=True)
+        # both digests would be written to digest-physics.tex
+        with pytest.raises(SystemExit):
+            parse_args(["render", "snapshot.jsonl", "digest.tex", "--profile-dirs",
+                        str(tmp_path / "a" / "physics"), str(tmp_path / "b" / "physics")])
+        assert "physics would overwrite each other" in capsys.readouterr().err
+        args = parse_args(["digest.tex", "--profile-dirs", str(tmp_path / "a" / "physics"), str(tmp_path / "b")])
+        assert len(args.profile_dirs) == 2